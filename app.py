@@ -1,6 +1,7 @@
-from flask import Flask, request, render_template, redirect, url_for, flash, session
-from werkzeug.security import check_password_hash, generate_password_hash
-import json, os
+from flask import (Flask, request, render_template, redirect, url_for, flash, session, jsonify, has_request_context,
+                   send_from_directory)
+from hashing import HashOverloaded, HashRateLimited, PasswordHasher
+import hashlib, json, os, threading, time
 from markupsafe import Markup  # al inicio del archivo
 from datetime import datetime, timezone
 
@@ -8,47 +9,94 @@ app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False
 app.secret_key = 'clave-secreta-para-flask'  # cámbiala en producción
 
+# Métricas (/metrics) con METRICS=1; antes que la compresión para que su tiempo cuente en la ruta
+import metrics
+metrics.init_metrics(app)
+
+# Perfilado de peticiones bajo demanda (?_profile=1 de un admin) con PROFILING=1
+from profiling import init_profiling, profile_mode
+profiler = init_profiling(app, is_admin=lambda: bool(session.get('user')) and is_admin_user(session['user']))
+
+# Compresión gzip/brotli de HTML y JSON; los estáticos usan los .gz/.br de python compression.py
+from compression import init_compression
+init_compression(app)
+
+# Detrás de proxies (router de Heroku, nginx) la IP del cliente y el esquema vienen en
+# X-Forwarded-*: solo se creen los de los PROXY_HOPS proxies de confianza (0 = conexión directa)
+from werkzeug.middleware.proxy_fix import ProxyFix
+PROXY_HOPS = int(os.environ.get('PROXY_HOPS', '0'))
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS, x_proto=PROXY_HOPS)
+
 def now_iso_utc():
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 # -------- Datos de equipos --------
-with open('soccerWiki.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
-    club_data = data.get('ClubData', [])
-    international_data = data.get('InternationalData', [])
+# Catálogo compilado (python build_catalog.py) si está al día; si no, el JSON
+from compiled_catalog import load_catalog
+team_catalog = load_catalog('soccerWiki.json', os.environ.get('TEAM_CATALOG', 'teams.bin'))
+
+# Índice de búsqueda (viene ya construido en el catálogo compilado)
+from team_search import TeamSearchIndex
+team_index = TeamSearchIndex.for_catalog(team_catalog)
+TEAMS_PAGE_SIZE = 20
+TEAMS_MAX_PAGE_SIZE = 100
+
+# Logos optimizados (python build_logos.py); sin manifest se usan los PNG originales
+from logo_assets import LogoAssets
+ASSETS_DIR = os.path.join(app.static_folder, 'build')
+ASSET_MAX_AGE = 365 * 24 * 3600
+logo_assets = LogoAssets.load(os.path.join(ASSETS_DIR, 'manifest.json'))
+
+def team_logo(team_id: str) -> dict:
+    """URLs del logo del equipo: {'png', 'webp', 'sprite'} (webp/sprite pueden ser None)."""
+    files = logo_assets.files_of(team_id)
+    if not files:
+        return {"png": url_for('static', filename=f"images/club_logos/{team_id}.png"), "webp": None, "sprite": None}
+    sprite = logo_assets.sprite_of(team_id)
+    return {
+        "png": url_for('logo_asset', filename=files['png'].split('/', 1)[1]),
+        "webp": url_for('logo_asset', filename=files['webp'].split('/', 1)[1]),
+        "sprite": dict(sprite, sheet=url_for('logo_asset', filename=sprite['sheet'].split('/', 1)[1])) if sprite else None,
+    }
+
+app.jinja_env.globals['team_logo'] = team_logo
+
+# -------- Almacenamiento (JSON por defecto, SQLite con STORAGE_BACKEND=sqlite) --------
+from storage import open_storage, TeamTakenError
+USERS_FILE = 'users.json'
+DATA_FILE = 'selected_teams.json'
+DRAW_FILE = 'draw.json'
+storage = open_storage(users_file=USERS_FILE, selections_file=DATA_FILE, draw_file=DRAW_FILE)
 
-for nation in international_data:
-    nation['Name'] = f"Selección: {nation['Name']}"
-    nation['ID'] = str(nation['ID'])
-for club in club_data:
-    club['ID'] = str(club['ID'])
+# -------- Grupos (cada uno con sus usuarios, admin, selecciones y sorteo) --------
+from groups import DEFAULT_GROUP, GroupRegistry, draw_groups_parallel, repair_stored_draw
+from draw_history import DEFAULT_EXCLUDE_YEARS, current_year
+group_registry = GroupRegistry(os.environ.get('GROUPS_DIR', 'groups'), default=storage)
 
-all_teams = club_data + international_data
+def current_group() -> str:
+    return session.get('group', DEFAULT_GROUP) if has_request_context() else DEFAULT_GROUP
 
-# -------- Usuarios (hash en JSON) --------
-USERS_FILE = 'users.json'
-if not os.path.exists(USERS_FILE):
-    # Arranque mínimo (vacío). Rellena con tus usuarios y hashes.
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump([], f)
+def current_storage():
+    """Almacenamiento del grupo de la sesión (el de siempre si no hay grupo)."""
+    return group_registry.get(current_group())
 
+# -------- Usuarios --------
 def cargar_usuarios():
-    with open(USERS_FILE, 'r', encoding='utf-8') as f:
-        return {u['username']: u['password_hash'] for u in json.load(f)}
+    return {u['username']: u['password_hash'] for u in current_storage().load_users()}
+
+def cargar_nombres_usuarios() -> list[str]:
+    return current_storage().usernames()
 
 # --- Users helpers (lista completa) ---
+@metrics.timed('cargar_usuarios_lista')
 def cargar_usuarios_lista():
     """Devuelve la lista cruda [{'username':..., 'password_hash':...}, ...]."""
-    try:
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data if isinstance(data, list) else []
-    except Exception:
-        return []
+    return current_storage().load_users()
 
+@metrics.timed('guardar_usuarios_lista')
 def guardar_usuarios_lista(users_list):
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users_list, f, ensure_ascii=False, indent=2)
+    current_storage().save_users(users_list)
 
 def buscar_usuario_en_lista(users_list, username):
     for u in users_list:
@@ -57,80 +105,124 @@ def buscar_usuario_en_lista(users_list, username):
     return None
 
 # -------- Persistencia de selecciones --------
-DATA_FILE = 'selected_teams.json'
-if not os.path.exists(DATA_FILE):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump([], f, ensure_ascii=False)
-
-# --- Helpers de selección ---
 def id_to_name(equipo_id: str) -> str:
-    for t in all_teams:
-        if t['ID'] == str(equipo_id):
-            return t['Name']
-    return equipo_id  # fallback
+    return team_catalog.name_of(equipo_id)
 
+@metrics.timed('cargar_items')
 def cargar_items():
-    with open(DATA_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return current_storage().selections()
 
+@metrics.timed('guardar_items')
 def guardar_items(items):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(items, f, ensure_ascii=False, indent=2)
+    current_storage().replace_selections(items)
+    prev, version = taken_teams().reload(items)
+    if version != prev:
+        event_broker.publish(current_group(), 'selection', {"reload": True, "version": version})
 
+@metrics.timed('obtener_seleccion_de_usuario')
 def obtener_seleccion_de_usuario(username: str):
-    for item in cargar_items():
-        if item.get('user') == username:
-            return item
-    return None
+    return current_storage().selection_by_user(username)
 
+@metrics.timed('obtener_seleccion_por_equipo')
 def obtener_seleccion_por_equipo(equipo_id: str):
-    for item in cargar_items():
-        if item.get('equipo_id') == str(equipo_id):
-            return item
-    return None
+    return current_storage().selection_by_team(equipo_id)
 
+@metrics.timed('actualizar_seleccion')
 def actualizar_seleccion(username: str, nuevo_equipo_id: str):
-    items = cargar_items()
-    found = False
-    for it in items:
-        if it.get('user') == username:
-            it['equipo_id'] = str(nuevo_equipo_id)
-            it['timestamp'] = now_iso_utc()
-            found = True
-            break
-    if not found:
-        items.append({
-            "user": username,
-            "equipo_id": str(nuevo_equipo_id),
-            "timestamp": now_iso_utc()
-        })
-    guardar_items(items)
+    """Lanza TeamTakenError si otro usuario ya tiene ese equipo."""
+    st = current_storage()
+    anterior = st.selection_by_user(username)
+    anterior_id = str(anterior['equipo_id']) if anterior else None
+    st.set_selection(username, nuevo_equipo_id, now_iso_utc())
+    # Sin el usuario: los demás solo necesitan saber qué equipo se ocupa y cuál queda libre
+    released = anterior_id if anterior_id != str(nuevo_equipo_id) else None
+    prev, version = taken_teams().update(str(nuevo_equipo_id), released)
+    event_broker.publish(current_group(), 'selection', {
+        "team": str(nuevo_equipo_id), "released": released,
+        "pos": _team_pos(nuevo_equipo_id), "released_pos": _team_pos(released),
+        "prev": prev, "version": version,
+    })
+
+# Bitset de equipos ocupados por grupo (/api/taken), al día con cada selección
+from taken_teams import TakenTeamsRegistry
+taken_registry = TakenTeamsRegistry(team_catalog)
+
+def taken_teams():
+    st = current_storage()
+    return taken_registry.get(current_group(), st.selections)
+
+def _team_pos(equipo_id) -> int | None:
+    rec = team_catalog.get(equipo_id) if equipo_id is not None else None
+    return rec.pos if rec else None
 
 # -------- Estado del sorteo --------
-DRAW_FILE = 'draw.json'
-
-def _ensure_draw_file():
-    if not os.path.exists(DRAW_FILE):
-        with open(DRAW_FILE, 'w', encoding='utf-8') as f:
-            json.dump({"done": False, "assignments": {}, "forbidden_pairs": []}, f, ensure_ascii=False, indent=2)
-_ensure_draw_file()
-
+@metrics.timed('load_draw')
 def load_draw():
-    _ensure_draw_file()
-    with open(DRAW_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return current_storage().load_draw()
 
+@metrics.timed('save_draw')
 def save_draw(state: dict):
-    import tempfile
-    dir_ = os.path.dirname(os.path.abspath(DRAW_FILE)) or "."
-    with tempfile.NamedTemporaryFile("w", delete=False, dir=dir_, encoding="utf-8") as tmp:
-        json.dump(state, tmp, ensure_ascii=False, indent=2)
-        tmp_path = tmp.name
-    os.replace(tmp_path, DRAW_FILE)
+    current_storage().save_draw(state)
+    publish_draw(current_group(), state)
+
+# -------- Eventos en vivo (/events) --------
+from events import Event, EventBroker
+event_broker = EventBroker()
+SSE_KEEPALIVE_S = 15
+
+def publish_draw(group: str, state: dict):
+    # Sin asignaciones: cada usuario consulta la suya en /espera
+    event_broker.publish(group, 'draw', {"done": bool(state.get('done'))})
+    # Guardado por este proceso: la sincronización no debe volver a anunciarlo
+    _sync_state.setdefault(group, {})['draw'] = group_registry.get(group).draw_version()
+
+# -------- Varios workers (gunicorn -w N) --------
+# Cada proceso tiene su broker y su bitset en memoria. Lo que guarda otro proceso se
+# detecta por la versión de los datos y se reenvía a las conexiones de este como un
+# cambio más, como mucho una vez por segundo y grupo.
+SYNC_INTERVAL_S = 1.0
+_sync_state: dict[str, dict] = {}
+_sync_lock = threading.Lock()
+_sync_thread = None
+
+def sync_other_processes(group: str):
+    st = group_registry.get(group)
+    now = time.monotonic()
+    with _sync_lock:
+        seen = _sync_state.setdefault(group, {})
+        if now - seen.get('t', -SYNC_INTERVAL_S) < SYNC_INTERVAL_S:
+            return
+        seen['t'] = now
+    version = st.selections_version()
+    if seen.get('selections') != version:
+        seen['selections'] = version
+        prev, new = taken_registry.get(group, st.selections).reload(st.selections())
+        if new != prev:
+            event_broker.publish(group, 'selection', {"reload": True, "version": new})
+    version = st.draw_version()
+    if seen.setdefault('draw', version) != version:
+        publish_draw(group, st.load_draw())
+
+def _sync_loop():
+    while True:
+        time.sleep(SYNC_INTERVAL_S)
+        for group in event_broker.active_channels():
+            try:
+                sync_other_processes(group)
+            except Exception:
+                app.logger.exception("No se pudo sincronizar el grupo %r", group)
+
+def start_sync_thread():
+    """Arranca (una vez por proceso) la sincronización de los grupos con conexiones /events."""
+    global _sync_thread
+    with _sync_lock:
+        if _sync_thread is None:
+            _sync_thread = threading.Thread(target=_sync_loop, name='sync-procesos', daemon=True)
+            _sync_thread.start()
 
 def get_admin_username():
-    users = cargar_usuarios_lista()
-    return users[0]['username'] if users else None
+    # Precalculado en la caché de usuarios (no recorre la lista)
+    return current_storage().admin_username()
 
 def is_admin_user(username: str) -> bool:
     return username == get_admin_username()
@@ -140,7 +232,12 @@ def inject_roles():
     def is_admin():
         u = session.get('user')
         return is_admin_user(u) if u else False
-    return dict(is_admin=is_admin)
+    return dict(is_admin=is_admin, is_global_admin=is_global_admin, current_group=current_group)
+
+def is_global_admin() -> bool:
+    """El admin del grupo por defecto gestiona todos los grupos."""
+    u = session.get('user')
+    return current_group() == DEFAULT_GROUP and bool(u) and is_admin_user(u)
 
 def get_assigned_to(username: str):
     d = load_draw()
@@ -174,72 +271,29 @@ def _parse_forbidden_pairs(text: str) -> list[tuple[str, str]]:
             continue
     return pairs
 
-def _build_forbidden_lookup(forbidden_pairs: list[tuple[str, str]]) -> dict[str, set[str]]:
-    d: dict[str, set[str]] = {}
-    for a, b in forbidden_pairs:
-        d.setdefault(a, set()).add(b)
-    return d
+from draw_engine import (DRAW_ENGINES, DEFAULT_DRAW_ENGINE, DrawCancelled, DrawControl, _build_forbidden_lookup,
+                         _backtracking_assignment, compute_draw)
+from draw_jobs import DrawJobBusy, DrawJobManager
 
-def _backtracking_assignment(users: list[str], forbidden: dict[str, set[str]]) -> dict[str, str] | None:
-    """
-    Encuentra asignación tal que:
-      - nadie se asigna a sí mismo
-      - respeta forbidden[a] (conjunto de receptores prohibidos para a)
-      - evita parejas de 2 ciclos (A->B y B->A)
-    Estrategia: backtracking ordenando por el que menos opciones tiene.
-    """
-    U = list(users)
-    # mapa de opciones válidas
-    options: dict[str, set[str]] = {}
-    for u in U:
-        opts = set(U) - {u} - forbidden.get(u, set())
-        options[u] = opts
-
-    # si alguien no tiene opciones, imposible
-    if any(len(opts) == 0 for opts in options.values()):
-        return None
-
-    # ordena por menor dominio (heurística MRV)
-    order = sorted(U, key=lambda x: len(options[x]))
-
-    assigned: dict[str, str] = {}
-    used_recipients: set[str] = set()
-
-    def dfs(i: int) -> bool:
-        if i == len(order):
-            return True
-        giver = order[i]
-        # Probar en orden aleatorio para diversificar soluciones
-        candidates = list(options[giver] - used_recipients)
-        random.shuffle(candidates)
-        for rec in candidates:
-            # Evita 2-ciclos: si ya hemos asignado rec->giver, no permitir giver->rec
-            if assigned.get(rec) == giver:
-                continue
-            assigned[giver] = rec
-            used_recipients.add(rec)
-            if dfs(i + 1):
-                return True
-            # backtrack
-            used_recipients.remove(rec)
-            del assigned[giver]
-        return False
-
-    ok = dfs(0)
-    return assigned if ok else None
-
-def compute_draw(users: list[str], forbidden_pairs: list[tuple[str, str]]) -> dict[str, str] | None:
-    """
-    Intenta varias veces con aleatoriedad para encontrar una asignación válida.
-    """
-    forbidden = _build_forbidden_lookup(forbidden_pairs)
-    # pequeños N: unos cuantos intentos aleatorios por si el orden inicial bloquea
-    for _ in range(200):
-        random.shuffle(users)
-        result = _backtracking_assignment(users, forbidden)
-        if result:
-            return result
-    return None
+# Los sorteos se calculan en segundo plano (con plazo máximo) para no bloquear peticiones;
+# el estado de los trabajos se comparte entre workers en DRAW_JOBS_FILE
+draw_jobs = DrawJobManager(os.environ.get('DRAW_JOBS_FILE', 'draw_jobs.json'),
+                           max_workers=int(os.environ.get('DRAW_JOB_WORKERS', 2)),
+                           deadline_s=float(os.environ.get('DRAW_JOB_DEADLINE', 60)))
+
+
+# Los hashes de contraseña van a un pool acotado con control de admisión
+hasher = PasswordHasher(max_workers=int(os.environ.get('HASH_WORKERS', 0)) or None,
+                        max_queue=int(os.environ.get('HASH_MAX_QUEUE', 32)),
+                        per_ip=int(os.environ.get('HASH_PER_IP', 0)),  # 0 = sin límite por IP (ver PROXY_HOPS)
+                        queue_timeout=float(os.environ.get('HASH_QUEUE_TIMEOUT', 10)))
+
+def _hash_busy_response(template: str, e: HashOverloaded):
+    # 429 si es la misma IP insistiendo; 503 si el servicio entero está saturado
+    flash('Demasiados intentos, espera unos segundos y vuelve a probar.' if isinstance(e, HashRateLimited)
+          else 'Hay muchos accesos a la vez, vuelve a intentarlo en unos segundos.', 'error')
+    status = 429 if isinstance(e, HashRateLimited) else 503
+    return render_template(template), status, {'Retry-After': str(e.retry_after)}
 
 
 # -------- Utilidad: requisito de login --------
@@ -257,11 +311,21 @@ def login_required(view_func):
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        users = cargar_usuarios()
+        group = request.form.get('group', '').strip()
+        if not group_registry.exists(group):
+            flash('Usuario o contraseña incorrectos.', 'error')
+            return render_template('login.html')
+        session['group'] = group
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '')
-
-        if username in users and check_password_hash(users[username], password):
+        user = current_storage().get_user(username)
+        try:
+            ok = bool(user) and hasher.check(user.get('password_hash', ''), password, ip=request.remote_addr)
+        except HashOverloaded as e:
+            session.pop('group', None)
+            return _hash_busy_response('login.html', e)
+
+        if ok:
             session['user'] = username
             d = load_draw()
             # Antes del sorteo: admin va a panel; resto a espera
@@ -272,6 +336,7 @@ def login():
             # Después del sorteo: todos ven la pantalla con su asignación y botón a "Elegir equipo"
             return redirect(url_for('espera'))
         else:
+            session.pop('group', None)
             flash('Usuario o contraseña incorrectos.', 'error')
             return render_template('login.html')
 
@@ -283,6 +348,7 @@ def login():
 @login_required
 def logout():
     session.pop('user', None)
+    session.pop('group', None)
     flash('Sesión cerrada.', 'success')
     return redirect(url_for('login'))
 
@@ -303,7 +369,119 @@ def index():
     username = session['user']
     actual = obtener_seleccion_de_usuario(username)
     selected_team = id_to_name(actual['equipo_id']) if actual else None
-    return render_template('index.html', club_data=all_teams, selected_team=selected_team)
+    version, team_list_html, static_modified = team_list_fragment()
+
+    # Validadores: lo único que cambia entre usuarios es la cabecera (usuario, rol y equipo).
+    # Del equipo, el ID: hay nombres repetidos y la página lleva el ID (OWN_TEAM)
+    admin = is_admin_user(username)
+    own_team_id = str(actual['equipo_id']) if actual else ''
+    etag = hashlib.sha256(f"{version}|{current_group()}|{username}|{admin}|{own_team_id}".encode('utf-8')).hexdigest()[:32]
+    last_modified = max(static_modified, _parse_iso(actual.get('timestamp'))) if actual else static_modified
+    # Con mensajes flash pendientes hay que renderizar (y consumirlos)
+    conditional = not session.get('_flashes')
+    # Comparación débil: la versión comprimida lleva el mismo ETag marcado como débil (W/)
+    if conditional and (request.if_none_match.contains_weak(etag) or
+                        (not request.if_none_match and request.if_modified_since
+                         and last_modified <= request.if_modified_since)):
+        resp = app.response_class(status=304)
+    else:
+        resp = app.make_response(render_template('index.html', team_list_html=team_list_html,
+                                                 selected_team=selected_team, page_size=TEAMS_PAGE_SIZE,
+                                                 own_team_id=own_team_id))
+    if conditional:
+        resp.set_etag(etag)
+        resp.last_modified = last_modified
+    # Página por usuario: el navegador la guarda pero revalida siempre
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+# -------- Fragmento cacheado de la lista de equipos --------
+# La primera página de equipos no cambia mientras no cambien el catálogo, los logos o las plantillas
+_team_list_cache: dict[str, Markup] = {}
+_BOOT_TIME = int(datetime.now(timezone.utc).timestamp())
+_TEAM_PAGE_FILES = [os.path.join(app.root_path, app.template_folder, t) for t in ('index.html', '_team_list.html')]
+
+def team_list_fragment() -> tuple[str, Markup, datetime]:
+    """(versión, HTML, última modificación) de la primera página de la lista, renderizada una vez por versión."""
+    mtimes = [os.stat(p).st_mtime_ns for p in _TEAM_PAGE_FILES]
+    version = f"{team_catalog.version}|{logo_assets.version}|{TEAMS_PAGE_SIZE}|{mtimes}"
+    html = _team_list_cache.get(version)
+    if html is None:
+        first_page, total = team_index.search('', limit=TEAMS_PAGE_SIZE)
+        next_cursor = str(TEAMS_PAGE_SIZE) if total > TEAMS_PAGE_SIZE else None
+        html = Markup(render_template('_team_list.html', club_data=first_page, next_cursor=next_cursor))
+        _team_list_cache.clear()
+        _team_list_cache[version] = html
+    # El catálogo y los logos se cargan al arrancar: su fecha es la de arranque o la de las plantillas
+    modified = datetime.fromtimestamp(max(max(mtimes) // 10**9, _BOOT_TIME), timezone.utc)
+    return version, html, modified
+
+def _parse_iso(ts: str | None) -> datetime:
+    try:
+        return datetime.fromisoformat(ts.replace('Z', '+00:00')).replace(microsecond=0)
+    except (AttributeError, ValueError):
+        return datetime.fromtimestamp(0, timezone.utc)
+
+def _team_to_json(team) -> dict:
+    logo = team_logo(team.id)
+    return {
+        "id": team.id,
+        "pos": team.pos,
+        "name": team.name,
+        "short_name": team.short_name,
+        "logo": logo['png'],
+        "logo_webp": logo['webp'],
+        "sprite": logo['sprite'],
+    }
+
+@app.route('/assets/logos/<path:filename>')
+def logo_asset(filename):
+    # Nombres con hash del contenido: el navegador puede guardarlos para siempre
+    resp = send_from_directory(os.path.join(ASSETS_DIR, 'logos'), filename, max_age=ASSET_MAX_AGE)
+    resp.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return resp
+
+@app.route('/api/teams')
+@login_required
+def api_teams():
+    q = request.args.get('q', '')
+    limit = request.args.get('limit', TEAMS_PAGE_SIZE, type=int)
+    offset = request.args.get('cursor', 0, type=int)
+    limit = max(1, min(limit, TEAMS_MAX_PAGE_SIZE))
+    offset = max(0, offset)
+
+    page, total = team_index.search(q, limit=limit, offset=offset)
+    end = offset + len(page)
+    return jsonify({
+        "items": [_team_to_json(t) for t in page],
+        "total": total,
+        "next_cursor": str(end) if end < total else None,
+    })
+
+@app.route('/api/taken')
+@login_required
+def api_taken():
+    """Bitset de equipos ocupados en el orden del catálogo (base64) con su versión."""
+    sync_other_processes(current_group())
+    snap = taken_teams().snapshot()
+    if request.if_none_match.contains_weak(snap['version']):
+        resp = app.response_class(status=304)
+    else:
+        resp = jsonify(snap)
+    resp.set_etag(snap['version'])
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp
+
+@app.route('/api/taken/delta')
+@login_required
+def api_taken_delta():
+    """Cambios desde ?since=<versión>; si esa versión ya no sirve, el bitset completo (con 'bits')."""
+    sync_other_processes(current_group())
+    taken = taken_teams()
+    delta = taken.delta(request.args.get('since', ''))
+    resp = jsonify(delta if delta is not None else taken.snapshot())
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
 
 @app.route('/espera')
 @login_required
@@ -313,6 +491,37 @@ def espera():
     assigned = d.get('assignments', {}).get(username)
     return render_template('waiting.html', draw_done=bool(d.get('done')), assigned_to=assigned)
 
+@app.route('/events')
+@login_required
+def events():
+    """Server-Sent Events del grupo: 'draw' (sorteo hecho/deshecho) y 'selection' (equipo ocupado/liberado)."""
+    st, group = current_storage(), current_group()
+    sub = event_broker.subscribe(group, request.headers.get('Last-Event-ID'))
+    start_sync_thread()
+
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            evs = []
+            while True:
+                if sub.resync:
+                    # Eventos perdidos (reinicio o cliente muy atrasado): se manda el estado actual
+                    sub.resync = False
+                    yield Event(sub.last_id, 'resync', {"done": bool(st.load_draw().get('done'))}).encode()
+                    evs = [ev for ev in evs if ev.type != 'draw']
+                for ev in evs:
+                    yield ev.encode()
+                evs = sub.next_events(SSE_KEEPALIVE_S)
+                if not evs and not sub.resync:
+                    yield ': ping\n\n'  # mantiene viva la conexión (y detecta clientes que se fueron)
+        finally:
+            sub.close()
+
+    resp = app.response_class(stream(), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'  # nginx: no acumular el stream
+    return resp
+
 @app.route('/admin')
 @login_required
 def admin_panel():
@@ -320,12 +529,22 @@ def admin_panel():
     if not is_admin_user(username):
         flash('Acceso restringido.', 'error')
         return redirect(url_for('espera'))
-    users_list = [u['username'] for u in cargar_usuarios_lista()]
+    users_list = cargar_nombres_usuarios()
     d = load_draw()
+    job = _group_job(request.args.get('job', '')) or draw_jobs.active_job(current_group())
+    # Altas o bajas después del sorteo: el panel ofrece ajustarlo
+    draw_stale = bool(d.get('done')) and set(d.get('assignments') or {}) != set(users_list)
     return render_template('admin.html',
                            users=users_list,
                            draw_done=bool(d.get('done')),
-                           forbidden_pairs=d.get('forbidden_pairs', []))
+                           draw_stale=draw_stale,
+                           history_years=current_storage().history_years(),
+                           exclude_years=DEFAULT_EXCLUDE_YEARS,
+                           forbidden_pairs=d.get('forbidden_pairs', []),
+                           engines=list(DRAW_ENGINES),
+                           default_engine=DEFAULT_DRAW_ENGINE,
+                           job=job,
+                           profiling=profiler is not None)
 
 @app.route('/admin/draw', methods=['POST'])
 @login_required
@@ -338,34 +557,111 @@ def admin_draw():
     # Textarea con parejas prohibidas (incluye resultado anterior si el admin lo pega)
     forbidden_text = request.form.get('forbidden_text', '').strip()
     extra_pairs = _parse_forbidden_pairs(forbidden_text)
+    engine = request.form.get('engine') or DEFAULT_DRAW_ENGINE
+    if engine not in DRAW_ENGINES:
+        flash('Motor de sorteo desconocido.', 'error')
+        return redirect(url_for('admin_panel'))
+    try:
+        exclude_years = max(0, int(request.form.get('exclude_years', DEFAULT_EXCLUDE_YEARS)))
+    except ValueError:
+        flash('Número de años no válido.', 'error')
+        return redirect(url_for('admin_panel'))
 
     # Prepara lista de usuarios
-    users_list = [u['username'] for u in cargar_usuarios_lista()]
+    users_list = cargar_nombres_usuarios()
     if len(users_list) < 2:
         flash('Se necesitan al menos 2 usuarios para el sorteo.', 'error')
         return redirect(url_for('admin_panel'))
 
-    # Calcula
-    assignment = compute_draw(users_list[:], extra_pairs)
-    if not assignment:
-        # mensaje útil para depurar
-        flash('No fue posible generar un sorteo con las restricciones dadas. Revisa las parejas prohibidas o reduce restricciones.', 'error')
-        return redirect(url_for('admin_panel'))
+    # Calcula en segundo plano; el panel consulta el estado del trabajo
+    single_cycle = request.form.get('single_cycle') == '1'
+    # El resultado se guarda en el grupo que lanzó el sorteo (el hilo no tiene sesión)
+    st, group = current_storage(), current_group()
+    # Lo que ya tocó en los últimos años sale del histórico indexado, una vez por sorteo
+    year = current_year()
+    exclusions = st.history_exclusions(exclude_years, year)
+    # Si se está perfilando la petición, el cálculo (en otro hilo) se perfila aparte
+    wrap = profiler.wrap_task('admin_draw-calculo', profile_mode()) if profiler and profile_mode() else None
+    try:
+        # Solo un sorteo a la vez por grupo (en todos los workers)
+        job = draw_jobs.submit(users_list, extra_pairs, engine=engine, single_cycle=single_cycle, key=group,
+                               on_done=lambda result: _save_draw_result(st, group, result, extra_pairs, year),
+                               wrap=wrap, exclusions=exclusions)
+    except DrawJobBusy as e:
+        flash('Ya hay un sorteo en curso.', 'error')
+        return redirect(url_for('admin_panel', job=e.job['id']))
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(job), 202
+    return redirect(url_for('admin_panel', job=job['id']))
+
+def _save_draw_result(st, group: str, assignment: dict[str, str], extra_pairs: list[tuple[str, str]],
+                      year: int):
+    # Guarda estado (releído con el cerrojo: otro worker pudo tocarlo mientras se calculaba)
+    def apply(d):
+        d['done'] = True
+        d['assignments'] = assignment
+        # Persistimos también las parejas prohibidas que usó el admin como referencia
+        prev_forbidden = d.get('forbidden_pairs', [])
+        merged = prev_forbidden + extra_pairs
+        # normaliza en texto plano para lectura futura
+        d['forbidden_pairs'] = list({f"{a}::{b}" for a, b in merged})
+        return d
+    publish_draw(group, st.update_draw(apply))
+    st.record_draw(year, assignment)
+
+def _group_job(job_id: str):
+    # Cada admin solo ve los trabajos de su grupo
+    job = draw_jobs.get(job_id)
+    return job if job and job['key'] == current_group() else None
+
+@app.route('/admin/draw/jobs/<job_id>')
+@login_required
+def admin_draw_status(job_id):
+    if not is_admin_user(session.get('user')):
+        return jsonify({"error": "Acceso restringido."}), 403
+    job = _group_job(job_id)
+    if not job:
+        return jsonify({"error": "Trabajo no encontrado."}), 404
+    return jsonify(job)
 
-    # Guarda estado
-    d = load_draw()
-    d['done'] = True
-    d['assignments'] = assignment
-    # Persistimos también las parejas prohibidas que usó el admin como referencia
-    prev_forbidden = d.get('forbidden_pairs', [])
-    merged = prev_forbidden + extra_pairs
-    # normaliza en texto plano para lectura futura
-    d['forbidden_pairs'] = list({f"{a}::{b}" for a, b in merged})
-    save_draw(d)
-
-    flash('Sorteo realizado correctamente.', 'success')
-    # Tras el sorteo, redirige a la pantalla de espera que ya muestra el destinatario
-    return redirect(url_for('espera'))
+@app.route('/admin/draw/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def admin_draw_cancel(job_id):
+    if not is_admin_user(session.get('user')):
+        return jsonify({"error": "Acceso restringido."}), 403
+    job = draw_jobs.cancel(job_id) if _group_job(job_id) else None
+    if not job:
+        return jsonify({"error": "El trabajo no existe o ya terminó."}), 409
+    return jsonify(job)
+
+@app.route('/admin/hashing')
+@login_required
+def admin_hashing_stats():
+    # Cola y latencia del pool de hashes (JSON)
+    if not is_admin_user(session.get('user')):
+        return jsonify({"error": "Acceso restringido."}), 403
+    return jsonify(hasher.stats())
+
+@app.route('/admin/profiles')
+@login_required
+def admin_profiles():
+    if profiler is None:
+        return 'Perfilado desactivado (PROFILING=1).', 404
+    if not is_admin_user(session['user']):
+        flash('Acceso restringido.', 'error')
+        return redirect(url_for('espera'))
+    name = request.args.get('name')
+    summary = profiler.summary(name) if name else None
+    return render_template('admin_profiles.html', profiles=profiler.list()[:50], name=name, summary=summary,
+                           sample=profiler.sample)
+
+@app.route('/admin/profiles/<name>')
+@login_required
+def admin_profile_file(name):
+    path = profiler.path_of(name) if profiler and is_admin_user(session['user']) else None
+    if path is None:
+        return 'No encontrado.', 404
+    return send_from_directory(os.path.abspath(profiler.directory), name, as_attachment=True)
 
 @app.route('/admin/reset-draw', methods=['POST'])
 @login_required
@@ -373,11 +669,129 @@ def admin_reset_draw():
     if not is_admin_user(session.get('user')):
         flash('Acceso restringido.', 'error')
         return redirect(url_for('espera'))
-    # Estado inicial del sorteo
+    # Un sorteo en curso ya no tiene sentido
+    running = draw_jobs.active_job(current_group())
+    if running:
+        draw_jobs.cancel(running['id'])
+    # Estado inicial del sorteo; el sorteo deshecho de este año sale del histórico (no excluirá nada)
+    st = current_storage()
     save_draw({"done": False, "assignments": {}, "forbidden_pairs": []})
+    if current_year() in st.history_years():
+        st.record_draw(current_year(), None)
     flash('Sorteo deshecho. Todos vuelven al estado inicial.', 'success')
     return redirect(url_for('admin_panel'))
 
+@app.route('/admin/history')
+@login_required
+def admin_history():
+    # Consulta del histórico (JSON): ?giver=, ?receiver= y ?since=<año>
+    if not is_admin_user(session.get('user')):
+        return jsonify({"error": "Acceso restringido."}), 403
+    since = request.args.get('since', '')
+    if since and not since.isdigit():
+        return jsonify({"error": "Año no válido."}), 400
+    st = current_storage()
+    rows = st.draw_history(giver=request.args.get('giver') or None, receiver=request.args.get('receiver') or None,
+                           since_year=int(since) if since else None)
+    return jsonify({"years": st.history_years(), "assignments": rows})
+
+REPAIR_TIMEOUT_S = 10.0
+
+@app.route('/admin/repair-draw', methods=['POST'])
+@login_required
+def admin_repair_draw():
+    if not is_admin_user(session.get('user')):
+        flash('Acceso restringido.', 'error')
+        return redirect(url_for('espera'))
+    try:
+        result = repair_stored_draw(current_storage(), control=DrawControl(time.monotonic() + REPAIR_TIMEOUT_S))
+    except DrawCancelled:
+        result = {"method": None}
+    if result is None:
+        flash('Todavía no hay sorteo que ajustar.', 'error')
+    elif result['method'] is None:
+        flash('No se pudo ajustar el sorteo a los usuarios actuales. Revisa las parejas prohibidas o repítelo.', 'error')
+    elif result['method'] == 'nada':
+        flash('El sorteo ya estaba al día.', 'success')
+    else:
+        publish_draw(current_group(), load_draw())
+        changed = ', '.join(result['changed']) or 'ninguna'
+        flash(f"Sorteo ajustado: {len(result['added'])} altas, {len(result['removed'])} bajas. "
+              f"Asignaciones existentes cambiadas: {changed}.", 'success')
+    return redirect(url_for('admin_panel'))
+
+# -------- Varios grupos a la vez (solo el admin del grupo por defecto) --------
+GROUPS_JOB_KEY = '*grupos*'
+
+@app.route('/admin/groups')
+@login_required
+def admin_groups():
+    if not is_global_admin():
+        flash('Acceso restringido.', 'error')
+        return redirect(url_for('espera'))
+    groups = []
+    for gid in group_registry.list_groups():
+        st = group_registry.get(gid)
+        names = st.usernames()
+        groups.append({"id": gid, "members": len(names),
+                       "admin": names[0] if names else None,
+                       "done": bool(st.load_draw().get('done'))})
+    job = draw_jobs.get(request.args.get('job', '')) or draw_jobs.active_job(GROUPS_JOB_KEY)
+    if job and job['key'] != GROUPS_JOB_KEY:
+        job = None
+    return render_template('admin_groups.html', groups=groups, engines=list(DRAW_ENGINES),
+                           default_engine=DEFAULT_DRAW_ENGINE, job=job)
+
+@app.route('/admin/groups/draw', methods=['POST'])
+@login_required
+def admin_groups_draw():
+    if not is_global_admin():
+        flash('Acceso restringido.', 'error')
+        return redirect(url_for('espera'))
+    engine = request.form.get('engine') or DEFAULT_DRAW_ENGINE
+    if engine not in DRAW_ENGINES:
+        flash('Motor de sorteo desconocido.', 'error')
+        return redirect(url_for('admin_groups'))
+    group_ids = [g for g in request.form.getlist('group') if group_registry.exists(g) and g != DEFAULT_GROUP]
+    if not group_ids:
+        flash('Selecciona al menos un grupo.', 'error')
+        return redirect(url_for('admin_groups'))
+    # Los grupos se resuelven en paralelo en un pool de procesos
+    single_cycle = request.form.get('single_cycle') == '1'
+    try:
+        job = draw_jobs.submit_task(
+            lambda control: draw_groups_parallel(group_registry, group_ids, engine=engine,
+                                                 single_cycle=single_cycle, control=control,
+                                                 on_drawn=lambda gid: publish_draw(gid, {"done": True})),
+            key=GROUPS_JOB_KEY, participants=len(group_ids), single_cycle=single_cycle, public_result=True)
+    except DrawJobBusy as e:
+        flash('Ya hay un sorteo de grupos en curso.', 'error')
+        return redirect(url_for('admin_groups', job=e.job['id']))
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify(job), 202
+    return redirect(url_for('admin_groups', job=job['id']))
+
+@app.route('/admin/groups/jobs/<job_id>')
+@login_required
+def admin_groups_status(job_id):
+    if not is_global_admin():
+        return jsonify({"error": "Acceso restringido."}), 403
+    job = draw_jobs.get(job_id)
+    if not job or job['key'] != GROUPS_JOB_KEY:
+        return jsonify({"error": "Trabajo no encontrado."}), 404
+    return jsonify(job)
+
+@app.route('/admin/groups/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def admin_groups_cancel(job_id):
+    if not is_global_admin():
+        return jsonify({"error": "Acceso restringido."}), 403
+    job = draw_jobs.get(job_id)
+    job = draw_jobs.cancel(job_id) if job and job['key'] == GROUPS_JOB_KEY else None
+    if not job:
+        return jsonify({"error": "El trabajo no existe o ya terminó."}), 409
+    return jsonify(job)
+
 @app.route('/seleccionar-equipo', methods=['POST'])
 @login_required
 def seleccionar_equipo():
@@ -416,7 +830,11 @@ def seleccionar_equipo():
         return redirect(url_for('index'))
 
     # 3) Primera elección del usuario (equipo libre)
-    actualizar_seleccion(username, equipo_id)  # tu helper que guarda {user, equipo_id, timestamp}
+    try:
+        actualizar_seleccion(username, equipo_id)  # tu helper que guarda {user, equipo_id, timestamp}
+    except TeamTakenError:
+        flash('Este equipo ya ha sido seleccionado. Por favor, elige otro.', 'error')
+        return redirect(url_for('index'))
     flash('¡El equipo ha sido registrado exitosamente!', 'success')
     return redirect(url_for('index'))
 
@@ -435,7 +853,11 @@ def confirmar_cambio():
         flash('Lo sentimos, alguien acaba de elegir ese equipo. Prueba con otro.', 'error')
         return redirect(url_for('index'))
 
-    actualizar_seleccion(username, new_id)
+    try:
+        actualizar_seleccion(username, new_id)
+    except TeamTakenError:
+        flash('Lo sentimos, alguien acaba de elegir ese equipo. Prueba con otro.', 'error')
+        return redirect(url_for('index'))
     flash(f'Has cambiado tu equipo a {id_to_name(new_id)}.', 'success')
     return redirect(url_for('index'))
 
@@ -470,30 +892,45 @@ def change_password():
         flash('La nueva contraseña no puede ser igual a la actual.', 'error')
         return redirect(url_for('change_password'))
 
-    # Cargar usuarios y localizar al actual
-    users_list = cargar_usuarios_lista()
-    user_entry = buscar_usuario_en_lista(users_list, username)
+    # Localizar al usuario actual
+    user_entry = current_storage().get_user(username)
     if not user_entry:
         flash('Usuario no encontrado en el sistema.', 'error')
         return redirect(url_for('change_password'))
 
-    # Verificar contraseña actual
-    if not check_password_hash(user_entry.get('password_hash', ''), current_password):
-        flash('La contraseña actual no es correcta.', 'error')
-        return redirect(url_for('change_password'))
-
-    # Generar y guardar nuevo hash
-    new_hash = generate_password_hash(new_password)
+    try:
+        # Verificar contraseña actual
+        if not hasher.check(user_entry.get('password_hash', ''), current_password, ip=request.remote_addr):
+            flash('La contraseña actual no es correcta.', 'error')
+            return redirect(url_for('change_password'))
+
+        # Generar y guardar nuevo hash
+        new_hash = hasher.generate(new_password, ip=request.remote_addr)
+    except HashOverloaded as e:
+        return _hash_busy_response('change_password.html', e)
     user_entry['password_hash'] = new_hash
 
     user_entry['last_password_change'] = now_iso_utc()
 
-    guardar_usuarios_lista(users_list)
+    current_storage().upsert_user(user_entry)
 
     flash('Contraseña actualizada correctamente.', 'success')
     return redirect(url_for('index'))
 
 
 
+def create_app(config: dict | None = None):
+    """
+    Punto de entrada para servidores WSGI: gunicorn 'app:create_app()' (ver gunicorn.conf.py).
+    La app se monta al importar el módulo; aquí se aplica la configuración del despliegue.
+    """
+    if os.environ.get('SECRET_KEY'):
+        app.secret_key = os.environ['SECRET_KEY']  # la misma en todos los workers
+    if config:
+        app.config.update(config)
+    return app
+
+
 if __name__ == '__main__':
-    app.run(debug=False)
+    # Servidor de desarrollo (un proceso); en producción, gunicorn
+    create_app().run(debug=False)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la reparación incremental del sorteo (altas y bajas después
+de sortear) frente a repetir el sorteo entero: tiempo, asignaciones
+existentes que cambian y cómo se resolvió (empalme, local o completo).
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_repair.py [--sizes 50 500 5000] [--densities 0 0.1 0.3] [--runs 20] [--single-cycle]
+"""
+import argparse, os, random, statistics, sys, time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_single_cycle import random_forbidden
+from draw_engine import compute_draw, repair_draw
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000])
+    p.add_argument('--densities', type=float, nargs='+', default=[0.0, 0.1, 0.3])
+    p.add_argument('--runs', type=int, default=20, help='Altas/bajas por tamaño y densidad')
+    p.add_argument('--single-cycle', action='store_true')
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    print(f"{'n':>6} {'densidad':>9} {'cambio':>7} {'repara p50 (s)':>15} {'sorteo p50 (s)':>15} "
+          f"{'cambiadas máx':>14}  métodos")
+    for n in args.sizes:
+        users = [f"u{i}" for i in range(n)]
+        for d in args.densities:
+            pairs = random_forbidden(users, d, rng)
+            draw = compute_draw(users, pairs, single_cycle=args.single_cycle)
+            if draw is None:
+                print(f"{n:>6} {d:>9.2f}  sin solución inicial")
+                continue
+            for change in ('alta', 'baja'):
+                repair_t, full_t, changed, methods = [], [], [], Counter()
+                for i in range(args.runs):
+                    if change == 'alta':
+                        now = users + [f"nuevo{i}"]
+                        now_pairs = pairs + [(f"nuevo{i}", v) for v in rng.sample(users, round(d * n))]
+                    else:
+                        gone = rng.choice(users)
+                        now = [u for u in users if u != gone]
+                        now_pairs = pairs
+                    t0 = time.perf_counter()
+                    result = repair_draw(draw, now, now_pairs, single_cycle=args.single_cycle)
+                    repair_t.append(time.perf_counter() - t0)
+                    t0 = time.perf_counter()
+                    compute_draw(now, now_pairs, single_cycle=args.single_cycle)
+                    full_t.append(time.perf_counter() - t0)
+                    methods[result['method'] if result else 'sin solución'] += 1
+                    changed.append(len(result['changed']) if result else 0)
+                print(f"{n:>6} {d:>9.2f} {change:>7} {statistics.median(repair_t):>15.5f} "
+                      f"{statistics.median(full_t):>15.5f} {max(changed):>14}  {dict(methods)}")
+
+
+if __name__ == '__main__':
+    main()
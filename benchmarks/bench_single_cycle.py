@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Benchmark del modo "cadena única": tiempo hasta solución para distintos
+tamaños de grupo y densidades de parejas prohibidas.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_single_cycle.py [--sizes 50 500 5000] [--densities 0 0.01 0.1 0.3] [--runs 5]
+"""
+import argparse, os, random, statistics, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from draw_engine import compute_draw
+
+
+def random_forbidden(users, density, rng):
+    """Cada giver tiene prohibida una fracción 'density' del resto."""
+    k = round(density * (len(users) - 1))
+    pairs = []
+    if not k:
+        return pairs
+    for u in users:
+        others = rng.sample(users, min(len(users), k + 1))
+        pairs.extend((u, v) for v in others[:k + 1] if v != u)
+    return pairs
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument('--sizes', type=int, nargs='+', default=[50, 500, 5000])
+    p.add_argument('--densities', type=float, nargs='+', default=[0.0, 0.01, 0.1, 0.3])
+    p.add_argument('--runs', type=int, default=5)
+    p.add_argument('--seed', type=int, default=1)
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    print(f"{'n':>6} {'densidad':>9} {'éxito':>6} {'p50 (s)':>9} {'máx (s)':>9}")
+    for n in args.sizes:
+        users = [f"u{i}" for i in range(n)]
+        for d in args.densities:
+            times, ok = [], 0
+            for _ in range(args.runs):
+                pairs = random_forbidden(users, d, rng)
+                t0 = time.perf_counter()
+                result = compute_draw(users, pairs, single_cycle=True)
+                times.append(time.perf_counter() - t0)
+                ok += result is not None
+            print(f"{n:>6} {d:>9.2f} {ok:>3}/{args.runs:<2} {statistics.median(times):>9.4f} {max(times):>9.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: coste de id_to_name() con el recorrido lineal antiguo
+frente al TeamCatalog (índice hash por ID).
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_team_lookup.py [--repeat 2000]
+"""
+import argparse, json, os, random, sys, timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from team_catalog import TeamCatalog
+
+
+def load_all_teams_old(path):
+    # Réplica de la carga antigua de app.py (lista de dicts)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    club_data = data.get('ClubData', [])
+    international_data = data.get('InternationalData', [])
+    for nation in international_data:
+        nation['Name'] = f"Selección: {nation['Name']}"
+        nation['ID'] = str(nation['ID'])
+    for club in club_data:
+        club['ID'] = str(club['ID'])
+    return club_data + international_data
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument('--repeat', type=int, default=2000, help='Búsquedas por medición')
+    args = p.parse_args()
+
+    path = os.path.join(ROOT, 'soccerWiki.json')
+    all_teams = load_all_teams_old(path)
+    catalog = TeamCatalog.from_soccerwiki(path)
+
+    def id_to_name_old(equipo_id):
+        for t in all_teams:
+            if t['ID'] == str(equipo_id):
+                return t['Name']
+        return equipo_id
+
+    rng = random.Random(42)
+    ids = [rng.choice(all_teams)['ID'] for _ in range(args.repeat)]
+    assert all(id_to_name_old(i) == catalog.name_of(i) for i in ids[:200])
+
+    def run(fn):
+        best = min(timeit.repeat(lambda: [fn(i) for i in ids], number=1, repeat=5))
+        return best / len(ids) * 1e6
+
+    old_us = run(id_to_name_old)
+    new_us = run(catalog.name_of)
+    print(f"equipos en catálogo:     {len(catalog)}")
+    print(f"id_to_name (lineal):     {old_us:10.3f} µs/búsqueda")
+    print(f"TeamCatalog.name_of:     {new_us:10.3f} µs/búsqueda")
+    print(f"mejora:                  {old_us / new_us:10.0f}x")
+
+
+if __name__ == '__main__':
+    main()
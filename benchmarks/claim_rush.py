@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga: avalancha de usuarios eligiendo equipo a la vez.
+
+  - Crea N usuarios sintéticos con `manage_users.py import` (contraseñas
+    aleatorias) en un directorio temporal, con el sorteo ya hecho.
+  - Arranca la app en un puerto libre (servidor de desarrollo multihilo o
+    gunicorn con los workers que se pidan) y hace login real con todos.
+  - A la vez, todos piden equipos de una lista de populares con reparto Zipf
+    (unos pocos equipos se llevan casi todas las peticiones). Quien pierde
+    reintenta; tras --attempts fallos coge uno cualquiera del catálogo.
+    Una parte (--change-rate) pide después cambiar a otro grupo de equipos de
+    moda (también Zipf) y compite por ellos en confirmar-cambio.
+  - Mide elecciones/s y p50/p95/p99 del login y de cada elección (POST y la
+    página a la que redirige, como un navegador).
+  - Al terminar comprueba con los datos guardados que ningún equipo tiene dos
+    dueños y que todo «registrado» que vio un cliente sigue guardado. Si algo
+    falla sale con código 1: sirve también como prueba de regresión.
+
+Uso (desde la raíz del repo):
+    python benchmarks/claim_rush.py [--users 200] [--teams 20] [--skew 1.2] [--attempts 5]
+                                    [--change-rate 0.2] [--concurrency 64]
+                                    [--backend json|sqlite] [--journal]
+                                    [--server werkzeug|gunicorn] [--workers 1] [--worker-class gevent]
+                                    [--out claim_rush.json] [--keep]
+"""
+import argparse, csv, json, os, platform, random, re, shutil, socket, subprocess, sys, tempfile, threading, time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, build_opener
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from run_benchmarks import git_revision, percentiles
+
+_FLASH_RE = re.compile(r'<div class="message (\w+)">')
+# Hash rápido: aquí se mide la elección de equipo, no scrypt
+HASH_METHOD = 'pbkdf2:sha256:1000'
+
+
+# -------- Datos --------
+def seed_workdir(path: str, n_users: int, backend: str, seed: int) -> dict[str, str]:
+    """Usuarios (vía manage_users.py import) y sorteo hecho en 'path'. Devuelve {usuario: contraseña}."""
+    from manage_users import random_password
+    rng = random.Random(seed)
+    for name in ('soccerWiki.json', 'teams.bin'):
+        if os.path.exists(os.path.join(ROOT, name)):
+            os.symlink(os.path.join(ROOT, name), os.path.join(path, name))
+    creds = {f"rush{i:05d}": random_password() for i in range(n_users)}
+    with open(os.path.join(path, 'users.csv'), 'w', encoding='utf-8', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['username', 'password'])
+        w.writerows(creds.items())
+    manage = [sys.executable, os.path.join(ROOT, 'manage_users.py'), '--file', 'users.json', '--backend', 'json']
+    subprocess.run(manage + ['import', 'users.csv', '--method', HASH_METHOD],
+                   cwd=path, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    users = list(creds)
+    rng.shuffle(users)
+    assignments = {users[i]: users[(i + 1) % n_users] for i in range(n_users)}
+    with open(os.path.join(path, 'draw.json'), 'w', encoding='utf-8') as f:
+        json.dump({"done": True, "assignments": assignments, "forbidden_pairs": []}, f)
+    with open(os.path.join(path, 'selected_teams.json'), 'w', encoding='utf-8') as f:
+        json.dump([], f)
+    if backend == 'sqlite':
+        subprocess.run(manage + ['--db', 'santa.db', 'migrate-sqlite'],
+                       cwd=path, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return creds
+
+
+def team_ids() -> list[str]:
+    with open(os.path.join(ROOT, 'soccerWiki.json'), encoding='utf-8') as f:
+        return [str(c['ID']) for c in json.load(f)['ClubData']]
+
+
+def read_selections(workdir: str, backend: str, journal: bool) -> list[dict]:
+    """Selecciones tal y como quedaron guardadas (con el servidor ya parado)."""
+    from storage import open_storage
+    st = open_storage(backend, users_file=os.path.join(workdir, 'users.json'),
+                      selections_file=os.path.join(workdir, 'selected_teams.json'),
+                      draw_file=os.path.join(workdir, 'draw.json'),
+                      path=os.path.join(workdir, 'santa.db'), journal=journal, create_missing=False)
+    return st.selections()
+
+
+# -------- Servidor --------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, args, port: int) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=ROOT, STORAGE_BACKEND=args.backend, DATABASE_PATH='santa.db',
+               SELECTIONS_JOURNAL='1' if args.journal else '0',
+               # Todos los clientes salen de 127.0.0.1: el límite por IP no debe frenar los logins
+               HASH_PER_IP=str(args.concurrency))
+    if args.server == 'gunicorn':
+        # La configuración de producción, con los workers y el puerto de la prueba
+        cmd = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+               '-k', args.worker_class, '-w', str(args.workers), '-b', f'127.0.0.1:{port}', 'app:create_app()']
+    else:
+        cmd = [sys.executable, '-c',
+               'import sys; from werkzeug.serving import run_simple; import app; '
+               'run_simple("127.0.0.1", int(sys.argv[1]), app.app, threaded=True)', str(port)]
+    log = open(os.path.join(workdir, 'server.log'), 'wb')
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    stop_server(proc)
+    with open(os.path.join(workdir, 'server.log'), encoding='utf-8', errors='replace') as f:
+        print(f.read()[-2000:], file=sys.stderr)
+    raise SystemExit("ERROR: el servidor no arrancó.")
+
+
+def stop_server(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+# -------- Clientes --------
+class Client:
+    """Un navegador: cookies propias y redirecciones seguidas (POST -> GET)."""
+
+    def __init__(self, base: str, username: str, password: str):
+        self.base = base
+        self.username = username
+        self.password = password
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def request(self, path: str, form: dict | None = None) -> tuple[int, str, str, dict]:
+        """(estado, URL final, cuerpo, cabeceras)."""
+        data = urlencode(form).encode() if form is not None else None
+        try:
+            with self.opener.open(self.base + path, data=data, timeout=60) as r:
+                return r.status, r.geturl(), r.read().decode('utf-8', 'replace'), dict(r.headers)
+        except HTTPError as e:
+            return e.code, e.geturl(), e.read().decode('utf-8', 'replace'), dict(e.headers)
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.times: dict[str, list[float]] = defaultdict(list)
+        self.outcomes: dict[str, Counter] = defaultdict(Counter)
+
+    def add(self, op: str, seconds: float, outcome: str):
+        with self._lock:
+            self.times[op].append(seconds)
+            self.outcomes[op][outcome] += 1
+
+    def rows(self, wall: float) -> list[dict]:
+        return [{"op": op, "requests": len(ts), "per_s": len(ts) / wall if wall else None,
+                 "time_s": percentiles(ts), "outcomes": dict(self.outcomes[op])}
+                for op, ts in self.times.items()]
+
+
+def login(client: Client, stats: Stats, max_retries: int = 20) -> bool:
+    for _ in range(max_retries):
+        t0 = time.perf_counter()
+        status, url, _, headers = client.request('/login', {
+            'group': '', 'username': client.username, 'password': client.password})
+        seconds = time.perf_counter() - t0
+        if status in (429, 503):
+            # Control de admisión del hasher: se respeta Retry-After, como haría una persona
+            stats.add('login', seconds, str(status))
+            time.sleep(float(headers.get('Retry-After', 1)) * random.uniform(0.5, 1.0))
+            continue
+        ok = status == 200 and not url.endswith('/login')
+        stats.add('login', seconds, 'ok' if ok else f'fallo-{status}')
+        return ok
+    return False
+
+
+def claim(client: Client, stats: Stats, op: str, path: str, form: dict) -> str:
+    """Envía la elección y devuelve la categoría del aviso (success, error, confirm) o el estado HTTP."""
+    t0 = time.perf_counter()
+    try:
+        status, _, body, _ = client.request(path, form)
+    except (URLError, OSError) as e:
+        stats.add(op, time.perf_counter() - t0, type(e).__name__)
+        return 'red'
+    m = _FLASH_RE.search(body) if status == 200 else None
+    outcome = m.group(1) if m else f'http-{status}'
+    stats.add(op, time.perf_counter() - t0, outcome)
+    return outcome
+
+
+def rush(client: Client, stats: Stats, popular: list[str], trending: list[str], weights: list[float],
+         tail: list[str], attempts: int, change_rate: float, start: threading.Event,
+         rng: random.Random) -> str | None:
+    """Elección (y quizá cambio) de un usuario. Devuelve el equipo que el cliente cree tener."""
+    start.wait()
+    owned = None
+    for i in range(attempts * 2):
+        # Primero entre los populares; si no hay suerte, cualquiera del catálogo
+        team = rng.choices(popular, weights)[0] if i < attempts else rng.choice(tail)
+        if claim(client, stats, 'seleccionar', '/seleccionar-equipo', {'equipo_id': team}) == 'success':
+            owned = team
+            break
+    if owned and rng.random() < change_rate:
+        team = rng.choices(trending, weights)[0]
+        if team != owned and claim(client, stats, 'pedir-cambio', '/seleccionar-equipo',
+                                   {'equipo_id': team}) == 'confirm':
+            if claim(client, stats, 'confirmar-cambio', '/confirmar-cambio', {'new_id': team}) == 'success':
+                owned = team
+    return owned
+
+
+def taken_count(client: Client) -> int | None:
+    """Equipos marcados en /api/taken (el bitset que ve el navegador)."""
+    import base64
+    status, _, body, _ = client.request('/api/taken')
+    if status != 200:
+        return None
+    return sum(bin(b).count('1') for b in base64.b64decode(json.loads(body)['bits']))
+
+
+# -------- Comprobaciones --------
+def check(selections: list[dict], confirmed: dict[str, str]) -> dict:
+    stored = {it['user']: str(it['equipo_id']) for it in selections}
+    owners = defaultdict(list)
+    for it in selections:
+        owners[str(it['equipo_id'])].append(it['user'])
+    winners = defaultdict(list)
+    for user, team in confirmed.items():
+        winners[team].append(user)
+    return {
+        "selections": len(selections),
+        "distinct_teams": len(owners),
+        # Un equipo guardado con más de un dueño
+        "duplicate_owners": {t: us for t, us in owners.items() if len(us) > 1},
+        # Dos clientes que terminaron creyendo tener el mismo equipo
+        "double_success": {t: us for t, us in winners.items() if len(us) > 1},
+        # Un cliente vio «registrado» y su elección no está (la pisó otro proceso)
+        "lost_claims": {u: {"confirmed": t, "stored": stored.get(u)}
+                        for u, t in confirmed.items() if stored.get(u) != t},
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument('--users', type=int, default=200, help='Usuarios sintéticos')
+    p.add_argument('--teams', type=int, default=20, help='Equipos populares (y otros tantos de moda para los cambios)')
+    p.add_argument('--skew', type=float, default=1.2, help='Exponente Zipf del reparto entre populares')
+    p.add_argument('--attempts', type=int, default=5, help='Intentos entre populares antes de coger otro')
+    p.add_argument('--change-rate', type=float, default=0.2, help='Fracción que intenta cambiar de equipo')
+    p.add_argument('--concurrency', type=int, default=64, help='Clientes a la vez')
+    p.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    p.add_argument('--journal', action='store_true', help='JSON con journal de selecciones')
+    p.add_argument('--server', choices=['werkzeug', 'gunicorn'], default='werkzeug')
+    p.add_argument('--workers', type=int, default=1, help='Procesos de gunicorn')
+    p.add_argument('--worker-class', default='gevent', help='Tipo de worker de gunicorn (gevent, sync, gthread)')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--out', default='claim_rush.json', help='Fichero JSON de salida')
+    p.add_argument('--keep', action='store_true', help='No borrar el directorio temporal')
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    ids = team_ids()
+    hot = rng.sample(ids, min(2 * args.teams, len(ids)))
+    popular, trending = hot[:len(hot) // 2], hot[len(hot) // 2:]
+    weights = [1 / (r + 1) ** args.skew for r in range(len(popular))]
+    tail = sorted(set(ids) - set(popular) - set(trending))
+
+    workdir = tempfile.mkdtemp(prefix='santa-rush-')
+    proc = None
+    try:
+        t0 = time.perf_counter()
+        creds = seed_workdir(workdir, args.users, args.backend, args.seed)
+        print(f"[rush] {args.users} usuarios creados en {time.perf_counter() - t0:.1f}s ({workdir})", flush=True)
+        port = free_port()
+        proc = start_server(workdir, args, port)
+        base = f'http://127.0.0.1:{port}'
+        clients = [Client(base, u, pwd) for u, pwd in creds.items()]
+        stats = Stats()
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            t0 = time.perf_counter()
+            logged = list(pool.map(lambda c: login(c, stats), clients))
+            login_wall = time.perf_counter() - t0
+            clients = [c for c, ok in zip(clients, logged) if ok]
+            print(f"[rush] login: {len(clients)}/{args.users} en {login_wall:.2f}s", flush=True)
+
+            claim_stats = Stats()
+            start = threading.Event()
+            futures = [pool.submit(rush, c, claim_stats, popular, trending, weights, tail, args.attempts,
+                                   args.change_rate, start, random.Random(args.seed * 100003 + i))
+                       for i, c in enumerate(clients)]
+            t0 = time.perf_counter()
+            start.set()
+            owned = [f.result() for f in futures]
+            rush_wall = time.perf_counter() - t0
+
+        confirmed = {c.username: team for c, team in zip(clients, owned) if team}
+        bitset = taken_count(clients[0]) if clients else None
+        stop_server(proc)
+        proc = None
+        result = check(read_selections(workdir, args.backend, args.journal), confirmed)
+        result["taken_bitset"] = bitset
+
+        rows = stats.rows(login_wall) + claim_stats.rows(rush_wall)
+        for row in rows:
+            t = row["time_s"]
+            print(f"[rush] {row['op']:<16} n={row['requests']:<6} {row['per_s']:.1f}/s "
+                  f"p50={t['p50'] * 1e3:.1f}ms p95={t['p95'] * 1e3:.1f}ms p99={t['p99'] * 1e3:.1f}ms "
+                  f"{row['outcomes']}", flush=True)
+        total = sum(len(claim_stats.times[op]) for op in claim_stats.times)
+        print(f"[rush] avalancha: {total} peticiones en {rush_wall:.2f}s ({total / rush_wall:.1f}/s), "
+              f"{len(confirmed)} con equipo, {result['distinct_teams']} equipos distintos guardados", flush=True)
+
+        failures = {k: result[k] for k in ('duplicate_owners', 'double_success', 'lost_claims') if result[k]}
+        if bitset is not None and bitset != result['distinct_teams']:
+            # Con varios procesos cada uno tiene su propio bitset en memoria
+            print(f"[rush] AVISO: /api/taken marca {bitset} equipos y hay {result['distinct_teams']} guardados",
+                  flush=True)
+        for name, items in failures.items():
+            print(f"[rush] FALLO {name}: {len(items)} (p.ej. {next(iter(items.items()))})", flush=True)
+        if not failures:
+            print("[rush] OK: ningún equipo con dos dueños ni elecciones perdidas", flush=True)
+
+        report = {
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "popular_teams": popular,
+            "trending_teams": trending,
+            "login": {"wall_s": login_wall, "logged_in": len(clients)},
+            "rush": {"wall_s": rush_wall, "requests": total, "per_s": total / rush_wall if rush_wall else None},
+            "ops": rows,
+            "checks": result,
+            "ok": not failures,
+        }
+        out = os.path.abspath(args.out)
+        with open(out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Resultados en {out}")
+        sys.exit(0 if not failures else 1)
+    finally:
+        if proc is not None:
+            stop_server(proc)
+        if args.keep:
+            print(f"Datos en {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
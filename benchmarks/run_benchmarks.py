@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks offline: motor del sorteo y rutas más usadas.
+
+  - Sorteo: grupos sintéticos (10 a 10k) con densidad configurable de parejas
+    prohibidas; p50/p95/p99 del tiempo, tasa de éxito e intentos (reinicios).
+  - HTTP: /login, /, /espera y /seleccionar-equipo con el cliente de pruebas
+    de Flask sobre ficheros de datos sembrados en un directorio temporal.
+
+El resultado se escribe en JSON para poder comparar ejecuciones.
+
+Uso (desde la raíz del repo):
+    python benchmarks/run_benchmarks.py [--sizes 10 100 1000 10000] [--densities 0 0.01 0.05]
+                                        [--engines matching backtracking] [--runs 10]
+                                        [--http-users 200] [--http-requests 200] [--out bench_results.json]
+"""
+import argparse, json, os, platform, random, shutil, subprocess, sys, tempfile, time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from draw_engine import DRAW_ENGINES, DrawCancelled, DrawControl, compute_draw
+from bench_single_cycle import random_forbidden
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    xs = sorted(values)
+
+    def pct(p):
+        return xs[min(len(xs) - 1, max(0, round(p / 100 * len(xs) + 0.5) - 1))]
+
+    return {"p50": pct(50), "p95": pct(95), "p99": pct(99), "max": xs[-1]}
+
+
+def bench_draw(sizes, densities, engines, runs, timeout, seed) -> list[dict]:
+    rng = random.Random(seed)
+    random.seed(seed)
+    results = []
+    for engine in engines:
+        for n in sizes:
+            users = [f"u{i}" for i in range(n)]
+            for d in densities:
+                times, attempts, steps = [], [], []
+                ok = timeouts = errors = 0
+                for _ in range(runs):
+                    pairs = random_forbidden(users, d, rng)
+                    control = DrawControl(deadline=time.monotonic() + timeout)
+                    t0 = time.perf_counter()
+                    try:
+                        result = compute_draw(users, pairs, engine=engine, control=control)
+                    except DrawCancelled:
+                        result = None
+                        timeouts += 1
+                    except RecursionError:
+                        # El backtracking recursivo no admite grupos muy grandes
+                        result = None
+                        errors += 1
+                    times.append(time.perf_counter() - t0)
+                    attempts.append(control.attempts)
+                    steps.append(control.steps)
+                    ok += result is not None
+                row = {
+                    "engine": engine, "n": n, "density": d, "runs": runs,
+                    "success_rate": ok / runs, "timeouts": timeouts, "errors": errors,
+                    "time_s": percentiles(times),
+                    "attempts": percentiles(attempts),
+                    "steps": percentiles(steps),
+                }
+                results.append(row)
+                t = row["time_s"]
+                print(f"[draw] {engine:<12} n={n:<6} d={d:<5} ok={ok}/{runs} "
+                      f"p50={t['p50']:.4f}s p95={t['p95']:.4f}s p99={t['p99']:.4f}s "
+                      f"intentos p50={row['attempts']['p50']}", flush=True)
+    return results
+
+
+def seed_data_dir(path: str, n_users: int, seed: int) -> list[str]:
+    """Crea users.json, draw.json y selected_teams.json sintéticos en 'path'."""
+    from werkzeug.security import generate_password_hash
+    rng = random.Random(seed)
+    os.symlink(os.path.join(ROOT, 'soccerWiki.json'), os.path.join(path, 'soccerWiki.json'))
+    # Un único hash (el salt va dentro) para no pagar n_users veces el coste de scrypt
+    pwd_hash = generate_password_hash('benchmark-pass')
+    users = [f"user{i:05d}" for i in range(n_users)]
+    with open(os.path.join(path, 'users.json'), 'w', encoding='utf-8') as f:
+        json.dump([{"username": u, "password_hash": pwd_hash} for u in users], f)
+    shuffled = users[:]
+    rng.shuffle(shuffled)
+    assignments = {shuffled[i]: shuffled[(i + 1) % n_users] for i in range(n_users)}
+    with open(os.path.join(path, 'draw.json'), 'w', encoding='utf-8') as f:
+        json.dump({"done": True, "assignments": assignments, "forbidden_pairs": []}, f)
+    # La mitad de los usuarios ya tiene equipo
+    with open(os.path.join(path, 'selected_teams.json'), 'w', encoding='utf-8') as f:
+        json.dump([{"user": u, "equipo_id": str(i + 1), "timestamp": "2024-01-01T00:00:00Z"}
+                   for i, u in enumerate(users[: n_users // 2])], f)
+    return users
+
+
+def bench_http(n_users: int, n_requests: int, seed: int) -> list[dict]:
+    workdir = tempfile.mkdtemp(prefix='santa-bench-')
+    cwd = os.getcwd()
+    try:
+        users = seed_data_dir(workdir, n_users, seed)
+        os.chdir(workdir)
+        os.environ['STORAGE_BACKEND'] = 'json'
+        import app as santa_app
+        flask_app = santa_app.app
+        rng = random.Random(seed)
+
+        def client_for(username):
+            c = flask_app.test_client()
+            with c.session_transaction() as s:
+                s['user'] = username
+            return c
+
+        def timed(name, method, fn):
+            times, statuses = [], {}
+            for i in range(n_requests):
+                t0 = time.perf_counter()
+                r = fn(i)
+                times.append(time.perf_counter() - t0)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+            row = {"route": name, "method": method, "requests": n_requests,
+                   "time_s": percentiles(times), "statuses": statuses}
+            t = row["time_s"]
+            print(f"[http] {method:<4} {name:<20} p50={t['p50'] * 1e3:.2f}ms p95={t['p95'] * 1e3:.2f}ms "
+                  f"p99={t['p99'] * 1e3:.2f}ms {statuses}", flush=True)
+            return row
+
+        anon = flask_app.test_client()
+        results = [
+            timed('/login', 'POST', lambda i: anon.post('/login', data={
+                'username': rng.choice(users), 'password': 'benchmark-pass'})),
+            timed('/', 'GET', lambda i: client_for(rng.choice(users)).get('/')),
+            timed('/espera', 'GET', lambda i: client_for(rng.choice(users)).get('/espera')),
+            # Usuarios sin equipo eligiendo equipos libres (1ª elección) y, después, ocupados
+            timed('/seleccionar-equipo', 'POST', lambda i: client_for(users[n_users // 2 + i % (n_users - n_users // 2)]).post(
+                '/seleccionar-equipo', data={'equipo_id': str(n_users + i + 1)})),
+        ]
+        return results
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    p.add_argument('--densities', type=float, nargs='+', default=[0.0, 0.01, 0.05])
+    p.add_argument('--engines', nargs='+', default=list(DRAW_ENGINES), choices=list(DRAW_ENGINES))
+    p.add_argument('--runs', type=int, default=10, help='Sorteos por combinación')
+    p.add_argument('--timeout', type=float, default=10.0, help='Plazo por sorteo (s)')
+    p.add_argument('--http-users', type=int, default=200, help='Usuarios sembrados para las rutas HTTP')
+    p.add_argument('--http-requests', type=int, default=200, help='Peticiones por ruta')
+    p.add_argument('--skip-draw', action='store_true')
+    p.add_argument('--skip-http', action='store_true')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--out', default='bench_results.json', help='Fichero JSON de salida')
+    args = p.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "draw": [] if args.skip_draw else bench_draw(args.sizes, args.densities, args.engines,
+                                                     args.runs, args.timeout, args.seed),
+        "http": [] if args.skip_http else bench_http(args.http_users, args.http_requests, args.seed),
+    }
+    out = os.path.abspath(args.out)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Resultados en {out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Compila soccerWiki.json a un catálogo binario compacto (teams.bin) con los
+campos que usa la app y su índice de búsqueda ya construido. La app lo abre
+con mmap: arranca sin parsear JSON y todos los workers comparten las páginas.
+Si el JSON cambia (tamaño/mtime), la app vuelve a cargar el JSON hasta que
+se recompile.
+
+Uso:
+    python build_catalog.py [--src soccerWiki.json] [--out teams.bin]
+"""
+import argparse, time
+
+from compiled_catalog import compile_catalog
+
+
+def main():
+    p = argparse.ArgumentParser(description="Compila el catálogo de equipos a formato binario.")
+    p.add_argument('--src', default='soccerWiki.json', help="JSON de origen (por defecto: soccerWiki.json)")
+    p.add_argument('--out', default='teams.bin', help="Fichero compilado (por defecto: teams.bin)")
+    args = p.parse_args()
+
+    t0 = time.monotonic()
+    stats = compile_catalog(args.src, args.out)
+    print(f"{stats['teams']} equipos: {stats['source_bytes'] / 1e3:.0f} KB de JSON -> "
+          f"{stats['bytes'] / 1e3:.0f} KB en {args.out} ({time.monotonic() - t0:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Genera los logos optimizados para la página de selección.
+
+  - Miniaturas WebP y PNG (con paleta) al tamaño en que se muestran: por
+    defecto 80 px, los 40 px de la lista en pantallas de alta densidad.
+  - Los logos idénticos (mismo contenido) se procesan y sirven una sola vez.
+  - Nombres con hash del contenido: se pueden cachear como inmutables.
+  - Opcional: hoja de sprites con los primeros equipos de la lista (los que
+    se ven al abrir la página), para cargarlos en una sola petición.
+
+El resultado queda en static/build/ con un manifest.json que usa la app.
+Si no existe el manifest, la app sigue sirviendo los PNG originales.
+Requiere Pillow (solo para construir, no en producción).
+
+Uso:
+    python build_logos.py [--size 80] [--sprite-top 100] [--workers N]
+"""
+import argparse, hashlib, io, json, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+
+from fileio import atomic_write_bytes, atomic_write_json
+
+SRC_DIR = os.path.join('static', 'images', 'club_logos')
+OUT_DIR = os.path.join('static', 'build')
+LOGOS_SUBDIR = 'logos'
+MANIFEST = 'manifest.json'
+
+
+def _require_pillow():
+    try:
+        from PIL import Image  # noqa: F401
+    except ImportError:
+        print("ERROR: hace falta Pillow para generar los logos (pip install Pillow).", file=sys.stderr)
+        sys.exit(1)
+
+
+def _thumbnail(data: bytes, size: int):
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    img = img.convert('RGBA')
+    img.thumbnail((size, size), Image.LANCZOS)
+    # Centrado en un lienzo cuadrado transparente para que todos midan igual
+    canvas = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    canvas.paste(img, ((size - img.width) // 2, (size - img.height) // 2))
+    return canvas
+
+
+def _encode(img, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == 'webp':
+        img.save(buf, 'WEBP', quality=80, method=4)
+    else:
+        from PIL import Image
+        # Paleta de 256 colores (con alfa): ~3 veces menos que el PNG en color real
+        img.quantize(256, method=Image.Quantize.FASTOCTREE).save(buf, 'PNG', optimize=True)
+    return buf.getvalue()
+
+
+def _hashed_name(data: bytes, ext: str, prefix: str = '') -> str:
+    return f"{prefix}{hashlib.sha256(data).hexdigest()[:16]}.{ext}"
+
+
+def _build_one(item):
+    # Se ejecuta en los procesos del pool: lee, redimensiona y escribe WebP y PNG
+    src_path, size, out_dir = item
+    with open(src_path, 'rb') as f:
+        thumb = _thumbnail(f.read(), size)
+    entry = {}
+    for fmt in ('webp', 'png'):
+        data = _encode(thumb, fmt)
+        name = _hashed_name(data, fmt)
+        path = os.path.join(out_dir, LOGOS_SUBDIR, name)
+        if not os.path.exists(path):
+            atomic_write_bytes(path, data, mode=0o644)
+        entry[fmt] = f"{LOGOS_SUBDIR}/{name}"
+        entry[f"{fmt}_bytes"] = len(data)
+    return entry
+
+
+def _load_manifest(path: str) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def build_sprite(files: dict, content_of: dict, team_ids: list[str], size: int, out_dir: str) -> dict:
+    """Empaqueta los logos de team_ids en una rejilla WebP. Devuelve {team_id: posición}."""
+    from PIL import Image
+    # Un hueco por logo distinto, aunque varios equipos lo compartan
+    cells: dict[str, int] = {}
+    for tid in team_ids:
+        cells.setdefault(content_of[tid], len(cells))
+    if not cells:
+        return {}
+    cols = min(len(cells), 10)
+    rows = (len(cells) + cols - 1) // cols
+    sheet = Image.new('RGBA', (cols * size, rows * size), (0, 0, 0, 0))
+    for key, i in cells.items():
+        with Image.open(os.path.join(out_dir, files[key]['png'])) as img:
+            sheet.paste(img.convert('RGBA'), ((i % cols) * size, (i // cols) * size))
+    data = _encode(sheet, 'webp')
+    name = _hashed_name(data, 'webp', prefix='sprite-')
+    atomic_write_bytes(os.path.join(out_dir, LOGOS_SUBDIR, name), data, mode=0o644)
+    sprites = {}
+    for tid in team_ids:
+        i = cells[content_of[tid]]
+        # Posiciones en % para que el sprite escale con el tamaño del logo en CSS
+        sprites[tid] = {
+            "sheet": f"{LOGOS_SUBDIR}/{name}",
+            "x": round((i % cols) * 100 / (cols - 1), 4) if cols > 1 else 0,
+            "y": round((i // cols) * 100 / (rows - 1), 4) if rows > 1 else 0,
+            "cols": cols,
+            "rows": rows,
+        }
+    return sprites
+
+
+def sprite_team_ids(n: int) -> list[str]:
+    """Los n primeros equipos de la lista inicial (lo primero que se ve al abrir la página)."""
+    from team_catalog import TeamCatalog
+    from team_search import TeamSearchIndex
+    page, _ = TeamSearchIndex(TeamCatalog.from_soccerwiki('soccerWiki.json')).search('', limit=n)
+    return [t.id for t in page]
+
+
+def main():
+    p = argparse.ArgumentParser(description="Genera miniaturas WebP/PNG deduplicadas de los logos.")
+    p.add_argument('--src', default=SRC_DIR, help=f"Logos originales (por defecto: {SRC_DIR})")
+    p.add_argument('--out', default=OUT_DIR, help=f"Directorio de salida (por defecto: {OUT_DIR})")
+    p.add_argument('--size', type=int, default=80, help="Lado de la miniatura en px (por defecto: 80)")
+    p.add_argument('--sprite-top', type=int, default=0,
+                   help="Empaquetar en un sprite los N primeros equipos de la lista (0 = sin sprite)")
+    p.add_argument('--workers', type=int, help="Procesos (por defecto: todos los núcleos)")
+    args = p.parse_args()
+    _require_pillow()
+
+    t0 = time.monotonic()
+    os.makedirs(os.path.join(args.out, LOGOS_SUBDIR), exist_ok=True)
+    manifest_path = os.path.join(args.out, MANIFEST)
+    previous = _load_manifest(manifest_path)
+    reuse = previous.get('size') == args.size
+
+    # 1) Agrupa los logos por contenido (sha256 del PNG original)
+    content_of: dict[str, str] = {}
+    source_of: dict[str, str] = {}
+    bytes_in = 0
+    for fname in sorted(os.listdir(args.src)):
+        team_id, ext = os.path.splitext(fname)
+        if ext.lower() != '.png':
+            continue
+        path = os.path.join(args.src, fname)
+        with open(path, 'rb') as f:
+            data = f.read()
+        bytes_in += len(data)
+        key = hashlib.sha256(data).hexdigest()
+        content_of[team_id] = key
+        source_of.setdefault(key, path)
+
+    # 2) Una miniatura por contenido distinto; se reaprovecha lo ya generado
+    files: dict[str, dict] = {}
+    todo = []
+    for key, path in source_of.items():
+        old = previous.get('files', {}).get(key) if reuse else None
+        if old and all(os.path.exists(os.path.join(args.out, old[fmt])) for fmt in ('webp', 'png')):
+            files[key] = old
+        else:
+            todo.append((key, path))
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        items = [(path, args.size, args.out) for _, path in todo]
+        for i, ((key, _), entry) in enumerate(zip(todo, pool.map(_build_one, items, chunksize=32)), 1):
+            files[key] = entry
+            if i % 200 == 0 or i == len(todo):
+                print(f"\r  {i}/{len(todo)} logos", end='', file=sys.stderr, flush=True)
+    if todo:
+        print(file=sys.stderr)
+
+    sprites = {}
+    if args.sprite_top:
+        ids = [tid for tid in sprite_team_ids(args.sprite_top) if tid in content_of]
+        sprites = build_sprite(files, content_of, ids, args.size, args.out)
+
+    manifest = {
+        "size": args.size,
+        "files": files,
+        "teams": content_of,
+        "sprites": sprites,
+        "stats": {
+            "teams": len(content_of),
+            "unique": len(files),
+            "bytes_in": bytes_in,
+            "bytes_webp": sum(f['webp_bytes'] for f in files.values()),
+            "bytes_png": sum(f['png_bytes'] for f in files.values()),
+        },
+    }
+    # Se borran las miniaturas que ya no usa nadie
+    used = {f[fmt] for f in files.values() for fmt in ('webp', 'png')} | {s['sheet'] for s in sprites.values()}
+    for fname in os.listdir(os.path.join(args.out, LOGOS_SUBDIR)):
+        if f"{LOGOS_SUBDIR}/{fname}" not in used:
+            os.remove(os.path.join(args.out, LOGOS_SUBDIR, fname))
+    atomic_write_json(manifest_path, manifest)
+    os.chmod(manifest_path, 0o644)
+
+    s = manifest['stats']
+    print(f"{s['teams']} equipos, {s['unique']} logos distintos ({len(todo)} generados) en {time.monotonic() - t0:.1f} s")
+    print(f"Originales: {s['bytes_in'] / 1e6:.1f} MB · WebP: {s['bytes_webp'] / 1e6:.1f} MB · PNG: {s['bytes_png'] / 1e6:.1f} MB")
+    if sprites:
+        print(f"Sprite con {len(sprites)} equipos: {next(iter(sprites.values()))['sheet']}")
+
+
+if __name__ == '__main__':
+    main()
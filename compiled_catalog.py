@@ -0,0 +1,252 @@
+import mmap, os, struct, sys
+
+from fileio import atomic_write_bytes
+from team_catalog import TeamCatalog, TeamRecord
+from team_search import TeamSearchIndex, _tokens
+
+# Formato (little-endian, ver compile_catalog):
+#   cabecera | registros | índice por ID | índice por nombre | claves de prefijos |
+#   claves de trigramas | claves de coincidencia exacta | posting lists (u32) | tabla de cadenas (UTF-8)
+MAGIC = b'STC1'
+HEADER = struct.Struct('<4sIqq8I')     # magic, nº equipos, tamaño y mtime del JSON, 8 offsets
+RECORD = struct.Struct('<10I')         # 5 cadenas (offset, longitud): id, name, short, name y short normalizados
+KEY = struct.Struct('<4I')             # clave (offset, longitud), inicio y longitud de su posting list
+U32 = struct.Struct('<I')
+
+
+class _Strings:
+    def __init__(self):
+        self.buf = bytearray()
+        self.seen: dict[str, tuple[int, int]] = {}
+
+    def add(self, s: str) -> tuple[int, int]:
+        ref = self.seen.get(s)
+        if ref is None:
+            data = s.encode('utf-8')
+            ref = self.seen[s] = (len(self.buf), len(data))
+            self.buf += data
+        return ref
+
+
+def compile_catalog(json_path: str, out_path: str) -> dict:
+    """Compila soccerWiki.json (solo los campos usados) y su índice de búsqueda a un fichero binario."""
+    catalog = TeamCatalog.from_soccerwiki(json_path)
+    index = TeamSearchIndex(catalog)
+    strings = _Strings()
+    n = len(catalog)
+
+    records = bytearray()
+    for i, t in enumerate(catalog):
+        refs = [strings.add(s) for s in (t.id, t.name, t.short_name, index._names[i], index._short[i])]
+        records += RECORD.pack(*(x for ref in refs for x in ref))
+    key_bytes = lambda i, field: (catalog.records[i].id if field == 'id' else catalog.records[i].name).encode('utf-8')
+    # sorted() es estable: con nombres repetidos queda primero el del catálogo (como by_name)
+    by_id = sorted(range(n), key=lambda i: key_bytes(i, 'id'))
+    by_name = sorted(range(n), key=lambda i: key_bytes(i, 'name'))
+
+    postings = bytearray()
+
+    def key_table(table: dict[str, list[int]]) -> bytes:
+        nonlocal postings
+        out = bytearray(U32.pack(len(table)))
+        for key in sorted(table, key=lambda k: k.encode('utf-8')):
+            plist = table[key]
+            off, ln = strings.add(key)
+            out += KEY.pack(off, ln, len(postings) // 4, len(plist))
+            postings += struct.pack(f'<{len(plist)}I', *plist)
+        return bytes(out)
+
+    sections = [
+        bytes(records),
+        struct.pack(f'<{n}I', *by_id),
+        struct.pack(f'<{n}I', *by_name),
+        key_table(index._prefix),
+        key_table(index._grams),
+        key_table(index._exact),
+        bytes(postings),
+        bytes(strings.buf),
+    ]
+    offsets, pos = [], HEADER.size
+    for sec in sections:
+        offsets.append(pos)
+        pos += len(sec)
+    st = os.stat(json_path)
+    data = HEADER.pack(MAGIC, n, st.st_size, st.st_mtime_ns, *offsets) + b''.join(sections)
+    atomic_write_bytes(out_path, data, mode=0o644)
+    return {"teams": n, "bytes": len(data), "source_bytes": st.st_size}
+
+
+class _Column:
+    """Una columna de cadenas del catálogo compilado, indexable por posición."""
+
+    def __init__(self, cat: 'CompiledCatalog', field: int):
+        self._cat = cat
+        self._field = field
+        self._cache: dict[int, str] = {}  # solo las filas ya consultadas
+
+    def __len__(self):
+        return len(self._cat)
+
+    def __getitem__(self, i: int) -> str:
+        s = self._cache.get(i)
+        if s is None:
+            s = self._cache[i] = self._cat._field(i, self._field)
+        return s
+
+
+class _Tokens:
+    # Equivalente perezoso a TeamSearchIndex._toks
+    def __init__(self, names: _Column, short: _Column):
+        self._names = names
+        self._short = short
+        self._cache: dict[int, tuple[str, ...]] = {}
+
+    def __getitem__(self, i: int) -> tuple[str, ...]:
+        toks = self._cache.get(i)
+        if toks is None:
+            short = self._short[i]
+            toks = self._cache[i] = tuple(_tokens(self._names[i])) + ((short,) if short else ())
+        return toks
+
+
+class _PostingTable:
+    """Claves ordenadas + posting lists en el mmap; get() hace búsqueda binaria."""
+
+    def __init__(self, cat: 'CompiledCatalog', offset: int, postings: memoryview):
+        self._cat = cat
+        self._count = U32.unpack_from(cat._buf, offset)[0]
+        self._base = offset + U32.size
+        self._postings = postings
+
+    def _entry(self, k: int):
+        return KEY.unpack_from(self._cat._buf, self._base + k * KEY.size)
+
+    def _key(self, k: int) -> bytes:
+        off, ln, _, _ = self._entry(k)
+        return self._cat._str_bytes(off, ln)
+
+    def get(self, key: str, default=None):
+        target = key.encode('utf-8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._key(lo) == target:
+            _, _, start, ln = self._entry(lo)
+            return self._postings[start:start + ln]
+        return default
+
+
+class CompiledCatalog:
+    """
+    Catálogo de equipos leído de un fichero compilado con compile_catalog().
+    El fichero se mapea en memoria (mmap): no se parsea nada al arrancar y
+    las páginas las comparte el sistema entre todos los workers. Los
+    TeamRecord se crean solo al pedirlos. Misma interfaz que TeamCatalog.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self._n, self.source_size, self.source_mtime_ns,
+         self._records, self._by_id, self._by_name, self._prefix_off, self._gram_off, self._exact_off,
+         postings_off, self._strings) = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} no es un catálogo compilado")
+        self.version = f"{self.source_size}-{self.source_mtime_ns}"  # igual que TeamCatalog.version
+        self._postings = memoryview(self._buf)[postings_off:self._strings].cast('I')
+        self._cache: dict[int, TeamRecord] = {}
+        self._id_cache: dict[str, int | None] = {}
+
+    # --- Acceso a cadenas ---
+    def _str_bytes(self, off: int, ln: int) -> bytes:
+        start = self._strings + off
+        return self._buf[start:start + ln]
+
+    def _field_bytes(self, i: int, field: int) -> bytes:
+        off, ln = struct.unpack_from('<2I', self._buf, self._records + i * RECORD.size + field * 8)
+        return self._str_bytes(off, ln)
+
+    def _field(self, i: int, field: int) -> str:
+        return self._field_bytes(i, field).decode('utf-8')
+
+    def _lookup(self, index_off: int, field: int, key: str) -> int | None:
+        target = key.encode('utf-8')
+        lo, hi = 0, self._n
+        pos = lambda k: U32.unpack_from(self._buf, index_off + k * 4)[0]
+        raw = lambda k: self._field_bytes(pos(k), field)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if raw(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return pos(lo) if lo < self._n and raw(lo) == target else None
+
+    # --- Interfaz de TeamCatalog ---
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        rec = self._cache.get(i)
+        if rec is None:
+            rec = self._cache[i] = TeamRecord(self._field(i, 0), self._field(i, 1), self._field(i, 2), i)
+        return rec
+
+    def __iter__(self):
+        return (self[i] for i in range(self._n))
+
+    def get(self, equipo_id) -> TeamRecord | None:
+        key = str(equipo_id)
+        try:
+            i = self._id_cache[key]
+        except KeyError:
+            i = self._lookup(self._by_id, 0, key)
+            if len(self._id_cache) < 2 * self._n:  # acotada: IDs inexistentes no la hacen crecer sin fin
+                self._id_cache[key] = i
+        return self[i] if i is not None else None
+
+    def name_of(self, equipo_id) -> str:
+        rec = self.get(equipo_id)
+        return rec.name if rec else str(equipo_id)  # fallback
+
+    def id_of(self, name: str) -> str | None:
+        i = self._lookup(self._by_name, 1, name)
+        return self._field(i, 0) if i is not None else None
+
+    # --- Datos precalculados para TeamSearchIndex ---
+    def search_tables(self) -> dict:
+        names, short = _Column(self, 3), _Column(self, 4)
+        return {
+            "names": names,
+            "short": short,
+            "toks": _Tokens(names, short),
+            "prefix": _PostingTable(self, self._prefix_off, self._postings),
+            "grams": _PostingTable(self, self._gram_off, self._postings),
+            "exact": _PostingTable(self, self._exact_off, self._postings),
+        }
+
+
+def load_catalog(json_path: str, compiled_path: str | None = None):
+    """
+    Usa el catálogo compilado si existe y corresponde al JSON actual (mismo
+    tamaño y mtime); si no, carga el JSON como siempre.
+    """
+    if compiled_path and os.path.exists(compiled_path) and sys.byteorder == 'little':
+        try:
+            cat = CompiledCatalog(compiled_path)
+            st = os.stat(json_path) if os.path.exists(json_path) else None
+            if st is None or (cat.source_size, cat.source_mtime_ns) == (st.st_size, st.st_mtime_ns):
+                return cat
+            print(f"AVISO: {compiled_path} no corresponde a {json_path}; se carga el JSON "
+                  f"(recompila con python build_catalog.py).", file=sys.stderr)
+        except (ValueError, struct.error) as e:
+            print(f"AVISO: no se pudo abrir {compiled_path} ({e}); se carga el JSON.", file=sys.stderr)
+    return TeamCatalog.from_soccerwiki(json_path)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Compresión de respuestas (gzip y brotli) para Flask.
+
+  - init_compression(app): comprime al vuelo HTML/JSON/CSS/JS según
+    Accept-Encoding (brotli si está instalado y el cliente lo acepta).
+    Las respuestas con ETag se comprimen una vez y se guardan en una caché
+    pequeña, así una página que no cambia no se vuelve a comprimir.
+  - Ficheros estáticos: si existe '<fichero>.br' o '<fichero>.gz' al lado
+    del original se sirve ese, sin comprimir nada en la petición.
+    Se generan con:  python compression.py static
+"""
+import gzip, os, sys, threading
+from collections import OrderedDict
+
+from fileio import atomic_write_bytes
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se usa gzip
+    brotli = None
+
+COMPRESSIBLE = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon',
+}
+PRECOMPRESS_EXT = {'.html', '.css', '.js', '.svg', '.ico', '.txt'}
+SUFFIX = {'br': '.br', 'gzip': '.gz'}
+
+
+def available_encodings() -> list[str]:
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else 5)
+    return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+
+
+class _BodyCache:
+    """Cuerpos ya comprimidos por (ETag, codificación), LRU acotada en bytes."""
+
+    def __init__(self, max_bytes: int = 8 << 20):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items: OrderedDict[tuple, bytes] = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data: bytes):
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and self._items:
+                _, old = self._items.popitem(last=False)
+                self._size -= len(old)
+
+
+def _static_file(app, request) -> str | None:
+    """
+    Ruta en disco del fichero estático de la petición (o None). Además de
+    'static', app.config['PRECOMPRESSED_DIRS'] puede mapear otros endpoints
+    que sirven ficheros ({endpoint: directorio}).
+    """
+    dirs = {'static': app.static_folder, **app.config.get('PRECOMPRESSED_DIRS', {})}
+    base = dirs.get(request.endpoint)
+    name = (request.view_args or {}).get('filename')
+    if not base or not name:
+        return None
+    path = os.path.realpath(os.path.join(base, name))
+    return path if path.startswith(os.path.realpath(base) + os.sep) else None
+
+
+def _precompressed(path: str, accepted: list[str]) -> tuple[str, str, float] | None:
+    """(codificación, ruta, mtime) del mejor '.br'/'.gz' disponible para path."""
+    try:
+        src_mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    for enc in accepted:
+        try:
+            mtime = os.stat(path + SUFFIX[enc]).st_mtime
+        except OSError:
+            continue
+        if mtime >= src_mtime:
+            return enc, path + SUFFIX[enc], mtime
+    return None
+
+
+def init_compression(app, min_size: int = 500, cache_bytes: int = 8 << 20):
+    cache = _BodyCache(cache_bytes)
+
+    @app.after_request
+    def _compress_response(response):
+        from flask import request
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE:
+            return response
+        response.vary.add('Accept-Encoding')
+        accepted = [enc for enc in available_encodings() if request.accept_encodings[enc]]
+        if not accepted:
+            return response
+
+        if response.direct_passthrough:
+            # Estático: solo si hay versión precomprimida en disco (y no es más vieja que el original)
+            path = _static_file(app, request)
+            pre = _precompressed(path, accepted) if path else None
+            if pre is None:
+                return response
+            encoding, pre_path, mtime = pre
+            key = (pre_path, mtime)
+            body = cache.get(key)
+            if body is None:
+                with open(pre_path, 'rb') as f:
+                    body = f.read()
+                cache.put(key, body)
+            response.direct_passthrough = False
+        else:
+            if response.is_streamed:
+                return response
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            encoding = accepted[0]
+            etag, _ = response.get_etag()
+            key = (request.path, etag, encoding) if etag else None
+            body = cache.get(key) if key else None
+            if body is None:
+                body = compress(data, encoding)
+                if key:
+                    cache.put(key, body)
+
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            # Misma entidad, distinta codificación: el ETag pasa a ser débil
+            response.set_etag(etag, weak=True)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return app
+
+
+def precompress_tree(root: str, min_size: int = 500) -> dict:
+    """Genera '.gz' (y '.br' si hay brotli) junto a cada fichero comprimible de root."""
+    stats = {"files": 0, "bytes": 0, "gzip": 0, "br": 0}
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXT:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < min_size:
+                continue
+            stats["files"] += 1
+            stats["bytes"] += len(data)
+            for enc in available_encodings():
+                out = compress(data, enc, best=True)
+                if len(out) >= len(data):
+                    continue  # no compensa
+                atomic_write_bytes(path + SUFFIX[enc], out, mode=0o644)
+                stats[enc] += len(out)
+    return stats
+
+
+if __name__ == '__main__':
+    roots = sys.argv[1:] or ['static']
+    for root in roots:
+        s = precompress_tree(root)
+        print(f"{root}: {s['files']} ficheros, {s['bytes']} B -> gzip {s['gzip']} B"
+              + (f", brotli {s['br']} B" if brotli else " (brotli no instalado)"))
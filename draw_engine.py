@@ -0,0 +1,708 @@
+import os, random, time
+from collections import Counter, deque
+from itertools import chain
+
+import metrics
+
+
+class DrawCancelled(Exception):
+    """El sorteo se canceló o superó su plazo."""
+
+    partial = None  # lo que dio tiempo a hacer, si el cálculo lo aprovecha (p.ej. sorteo por grupos)
+
+
+class DrawControl:
+    """
+    Control y progreso de un cálculo de sorteo. Los motores llaman a
+    attempt() en cada reinicio y a step() en cada paso de búsqueda; si se ha
+    pedido cancelar o se ha superado el plazo, lanzan DrawCancelled.
+    """
+
+    def __init__(self, deadline: float | None = None):
+        self.deadline = deadline  # time.monotonic() límite, o None
+        self.cancelled = False
+        self.attempts = 0
+        self.steps = 0
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise DrawCancelled('cancelado')
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise DrawCancelled('plazo superado')
+
+    def attempt(self):
+        self.attempts += 1
+        self.check()
+
+    def step(self):
+        self.steps += 1
+        if not self.steps & 0x3FF:
+            self.check()
+
+
+def _build_forbidden_lookup(forbidden_pairs: list[tuple[str, str]],
+                            control: DrawControl | None = None) -> dict[str, set[str]]:
+    # Con millones de parejas esto ya cuesta segundos: se comprueba el plazo por el camino
+    d: dict[str, set[str]] = {}
+    for k, (a, b) in enumerate(forbidden_pairs, 1):
+        s = d.get(a)
+        if s is None:
+            s = d[a] = set()
+        s.add(b)
+        if control is not None and not k & 0xFFFF:
+            control.check()
+    return d
+
+
+def _backtracking_assignment(users: list[str], forbidden: dict[str, set[str]],
+                             control: DrawControl | None = None) -> dict[str, str] | None:
+    """
+    Encuentra asignación tal que:
+      - nadie se asigna a sí mismo
+      - respeta forbidden[a] (conjunto de receptores prohibidos para a)
+      - evita parejas de 2 ciclos (A->B y B->A)
+    Estrategia: backtracking ordenando por el que menos opciones tiene.
+    """
+    U = list(users)
+    # mapa de opciones válidas
+    options: dict[str, set[str]] = {}
+    for u in U:
+        opts = set(U) - {u} - forbidden.get(u, set())
+        options[u] = opts
+
+    # si alguien no tiene opciones, imposible
+    if any(len(opts) == 0 for opts in options.values()):
+        return None
+
+    # ordena por menor dominio (heurística MRV)
+    order = sorted(U, key=lambda x: len(options[x]))
+
+    assigned: dict[str, str] = {}
+    used_recipients: set[str] = set()
+    control = control or DrawControl()
+
+    def dfs(i: int) -> bool:
+        if i == len(order):
+            return True
+        giver = order[i]
+        # Probar en orden aleatorio para diversificar soluciones
+        candidates = list(options[giver] - used_recipients)
+        random.shuffle(candidates)
+        for rec in candidates:
+            # Evita 2-ciclos: si ya hemos asignado rec->giver, no permitir giver->rec
+            if assigned.get(rec) == giver:
+                continue
+            control.step()
+            assigned[giver] = rec
+            used_recipients.add(rec)
+            if dfs(i + 1):
+                return True
+            # backtrack
+            used_recipients.remove(rec)
+            del assigned[giver]
+        return False
+
+    ok = dfs(0)
+    return assigned if ok else None
+
+
+def _compute_backtracking(users: list[str], forbidden: dict[str, set[str]],
+                          control: DrawControl) -> dict[str, str] | None:
+    """
+    Intenta varias veces con aleatoriedad para encontrar una asignación válida.
+    """
+    # pequeños N: unos cuantos intentos aleatorios por si el orden inicial bloquea
+    for _ in range(200):
+        control.attempt()
+        random.shuffle(users)
+        result = _backtracking_assignment(users, forbidden, control)
+        if result:
+            return result
+    return None
+
+
+# -------- Motor por emparejamiento bipartito (Hopcroft–Karp) --------
+MATCHING_RETRIES = 10
+
+
+def _allowed_sets(users: list[str], forbidden: dict[str, set[str]],
+                  control: DrawControl | None = None) -> list[set[int]]:
+    """Para cada giver (por índice), receptores NO permitidos (incluido él mismo)."""
+    idx = {u: i for i, u in enumerate(users)}
+    out = []
+    for i, u in enumerate(users):
+        s = set(map(idx.get, forbidden.get(u, ())))
+        s.discard(None)  # prohibidos que no participan
+        s.add(i)
+        out.append(s)
+        if control is not None:
+            control.check()
+    return out
+
+
+def _greedy_matching(n: int, forb: list[set[int]], match_g: list[int], match_r: list[int]):
+    """Emparejamiento inicial aleatorio: cada giver toma un receptor libre permitido."""
+    pool = list(range(n))
+    random.shuffle(pool)
+    givers = list(range(n))
+    random.shuffle(givers)
+    for u in givers:
+        for k in range(len(pool) - 1, -1, -1):
+            v = pool[k]
+            if v not in forb[u]:
+                match_g[u], match_r[v] = v, u
+                pool[k] = pool[-1]
+                pool.pop()
+                break
+
+
+def _hopcroft_karp(n: int, forb: list[set[int]], order: list[int],
+                   match_g: list[int], match_r: list[int], control: DrawControl) -> bool:
+    """
+    Completa el emparejamiento por fases de caminos de aumento más cortos.
+    Devuelve False si no existe emparejamiento perfecto (sorteo imposible).
+    Los receptores libres se prueban antes que el resto: con grafos densos la
+    BFS termina en cuanto aparece uno, sin recorrer todas las aristas.
+    """
+    INF = n + 1
+
+    def neighbors(u, free_r):
+        fu = forb[u]
+        return (v for v in chain(free_r, order) if v not in fu)
+
+    while True:
+        free_g = [u for u in range(n) if match_g[u] == -1]
+        if not free_g:
+            return True
+        control.step()
+        free_r = [v for v in range(n) if match_r[v] == -1]
+
+        # BFS por capas desde los givers libres
+        dist = [INF] * n
+        for u in free_g:
+            dist[u] = 0
+        queue = deque(free_g)
+        limit = INF
+        while queue:
+            u = queue.popleft()
+            if dist[u] >= limit:
+                break
+            if any(v not in forb[u] for v in free_r):
+                limit = dist[u] + 1
+                continue
+            for v in order:
+                if v in forb[u]:
+                    continue
+                w = match_r[v]
+                if dist[w] == INF:
+                    dist[w] = dist[u] + 1
+                    queue.append(w)
+        if limit == INF:
+            return False
+
+        # DFS (iterativa) por las capas para aumentar caminos disjuntos
+        augmented = False
+        for root in free_g:
+            stack = [[root, neighbors(root, free_r), -1]]
+            while stack:
+                u, it, _ = stack[-1]
+                pushed = False
+                for v in it:
+                    w = match_r[v]
+                    if w == -1:
+                        if dist[u] + 1 == limit:
+                            stack[-1][2] = v
+                            for uu, _, vv in stack:
+                                match_g[uu], match_r[vv] = vv, uu
+                            augmented = True
+                            stack = []
+                            pushed = True
+                            break
+                    elif dist[w] == dist[u] + 1:
+                        stack[-1][2] = v
+                        stack.append([w, neighbors(w, free_r), -1])
+                        pushed = True
+                        break
+                if not pushed:
+                    dist[u] = INF
+                    stack.pop()
+        if not augmented:
+            return False
+
+
+def _break_two_cycles(perm: list[int], forb: list[set[int]]) -> tuple[int, int] | None:
+    """
+    Elimina parejas A->B, B->A intercambiando destinos con otro giver C (C->D):
+    A->D y C->B (o B->D y C->A). El resultado une ambos ciclos en uno de
+    longitud >= 4, así que no aparecen 2-ciclos nuevos. O(n) por 2-ciclo.
+    Devuelve la pareja (A, B) que no se pudo reparar, o None si todo fue bien.
+    """
+    n = len(perm)
+    for a in range(n):
+        b = perm[a]
+        if perm[b] != a:
+            continue
+        cands = list(range(n))
+        random.shuffle(cands)
+        for c in cands:
+            if c == a or c == b:
+                continue
+            d = perm[c]
+            if d not in forb[a] and b not in forb[c]:
+                perm[a], perm[c] = d, b
+                break
+            if d not in forb[b] and a not in forb[c]:
+                perm[b], perm[c] = d, a
+                break
+        else:
+            return a, b
+    return None
+
+
+def _matching_assignment(users: list[str], forbidden: dict[str, set[str]],
+                         control: DrawControl) -> dict[str, str] | None:
+    """
+    Modela el sorteo como emparejamiento perfecto giver -> receptor (grafo
+    bipartito sin auto-asignaciones ni parejas prohibidas):
+      1. emparejamiento inicial aleatorio (variedad en los resultados)
+      2. Hopcroft–Karp completa el emparejamiento; si no existe es imposible
+         en tiempo polinómico, sin reintentos
+      3. se reparan los 2-ciclos por intercambio local; si alguno no tiene
+         arreglo, se veta temporalmente una de sus aristas y se recalcula
+    """
+    n = len(users)
+    if n < 2:
+        return None
+    forb = _allowed_sets(users, forbidden, control)
+    order = list(range(n))
+
+    for _ in range(MATCHING_RETRIES):
+        control.attempt()
+        random.shuffle(order)
+        fb = forb
+        while True:
+            match_g = [-1] * n
+            match_r = [-1] * n
+            _greedy_matching(n, fb, match_g, match_r)
+            if not _hopcroft_karp(n, fb, order, match_g, match_r, control):
+                if fb is forb:
+                    return None  # no hay emparejamiento perfecto: demostrado imposible
+                break  # los vetos de este intento lo hicieron imposible; otro intento
+            stuck = _break_two_cycles(match_g, fb)
+            if stuck is None:
+                return {users[u]: users[v] for u, v in enumerate(match_g)}
+            if fb is forb:
+                fb = [set(f) for f in forb]
+            a, b = stuck if random.random() < 0.5 else stuck[::-1]
+            fb[a].add(b)
+    return None
+
+
+# -------- Modo "un único ciclo" (cadena de regalos completa) --------
+SINGLE_CYCLE_REPAIR_ROUNDS = 200   # pasos de reparación por participante
+SINGLE_CYCLE_TIME_BUDGET = 5.0     # segundos para la búsqueda de respaldo
+
+
+def _single_cycle_repair(n: int, forb: list[set[int]], max_steps: int, deadline: float,
+                         control: DrawControl) -> list[int] | None:
+    """
+    Camino rápido: permutación aleatoria como orden del ciclo y reparación
+    local (min-conflicts) intercambiando posiciones hasta que ninguna arista
+    cyc[k] -> cyc[k+1] esté prohibida. Se rinde tras max_steps pasos o al
+    llegar a 'deadline'.
+    """
+    cyc = list(range(n))
+    random.shuffle(cyc)
+
+    def bad(k):
+        return cyc[(k + 1) % n] in forb[cyc[k]]
+
+    bad_pos = {k for k in range(n) if bad(k)}
+    for _ in range(max_steps):
+        if not bad_pos:
+            return cyc
+        control.step()
+        if time.monotonic() > deadline:
+            control.check()  # lanza si el plazo vencido es el del control
+            return None
+        k = random.choice(tuple(bad_pos))
+        p = (k + 1) % n
+        best_q, best_delta = None, 1
+        for q in random.sample(range(n), min(n, 24)):
+            if q == p:
+                continue
+            touched = {(p - 1) % n, p, (q - 1) % n, q}
+            before = sum(1 for t in touched if t in bad_pos)
+            cyc[p], cyc[q] = cyc[q], cyc[p]
+            delta = sum(1 for t in touched if bad(t)) - before
+            cyc[p], cyc[q] = cyc[q], cyc[p]
+            if delta < best_delta or (delta == best_delta and random.random() < 0.5):
+                best_q, best_delta = q, delta
+        # Acepta mejoras y movimientos neutros; a veces uno peor para salir de mínimos locales
+        if best_q is None or (best_delta > 0 and random.random() > 0.05):
+            continue
+        q = best_q
+        cyc[p], cyc[q] = cyc[q], cyc[p]
+        for t in ((p - 1) % n, p, (q - 1) % n, q):
+            if bad(t):
+                bad_pos.add(t)
+            else:
+                bad_pos.discard(t)
+    return None
+
+
+def _single_cycle_search(n: int, forb: list[set[int]], forb_in: list[list[int]], deadline: float,
+                         control: DrawControl) -> list[int] | None:
+    """
+    Respaldo para grupos muy restringidos: búsqueda en profundidad de un ciclo
+    hamiltoniano con poda (siguiente nodo con menos salidas libres primero,
+    y se corta si ningún nodo pendiente puede cerrar el ciclo) y límite de tiempo.
+    forb_in[v] son los givers que no pueden regalar a v.
+    """
+    start = 0
+    closers = sum(1 for v in range(1, n) if start not in forb[v])  # pendientes que pueden volver al inicio
+    path = [start]
+    unvisited = set(range(1, n))
+    # Receptores prohibidos aún pendientes de cada nodo: entre los candidatos
+    # (todos pendientes) más prohibidos = menos salidas libres
+    blocked = [sum(1 for w in f if w in unvisited) for f in forb]
+
+    def visit(v):
+        nonlocal closers
+        path.append(v)
+        unvisited.discard(v)
+        for g in forb_in[v]:
+            blocked[g] -= 1
+        if start not in forb[v]:
+            closers -= 1
+
+    def leave():
+        nonlocal closers
+        v = path.pop()
+        unvisited.add(v)
+        for g in forb_in[v]:
+            blocked[g] += 1
+        if start not in forb[v]:
+            closers += 1
+
+    def candidates(u):
+        cands = [v for v in unvisited if v not in forb[u]]
+        random.shuffle(cands)
+        cands.sort(key=blocked.__getitem__, reverse=True)
+        return iter(cands)
+
+    stack = [candidates(start)]
+    while stack:
+        control.step()
+        if time.monotonic() > deadline:
+            control.check()
+            return None
+        if len(path) == n:
+            if start not in forb[path[-1]]:
+                return path
+            leave()
+            stack.pop()
+            continue
+        v = next(stack[-1], None)
+        if v is None:
+            stack.pop()
+            if len(path) > 1:
+                leave()
+            continue
+        visit(v)
+        if closers == 0 and unvisited:
+            # Nadie podría cerrar el ciclo: deshacer
+            leave()
+            continue
+        stack.append(candidates(v) if unvisited else iter(()))
+    return None
+
+
+def _single_cycle_assignment(users: list[str], forbidden: dict[str, set[str]], control: DrawControl,
+                             time_budget: float = SINGLE_CYCLE_TIME_BUDGET) -> dict[str, str] | None:
+    """
+    Sorteo como un único ciclo hamiltoniano (A->B->...->A). Con n >= 3 no
+    puede haber parejas A<->B, así que basta con respetar las prohibidas.
+    El plazo es el menor entre time_budget y el del control; la reparación
+    rápida se queda como mucho con la mitad para dejar sitio al respaldo.
+    """
+    n = len(users)
+    if n < 3:
+        return None
+    now = time.monotonic()
+    deadline = now + time_budget
+    if control.deadline is not None:
+        deadline = min(deadline, control.deadline)
+    forb = _allowed_sets(users, forbidden, control)
+    # Cada giver necesita al menos una salida y cada receptor una entrada
+    # (las veces que aparece cada receptor cuentan también la suya propia)
+    if any(len(f) >= n for f in forb) or any(c >= n for c in Counter(chain.from_iterable(forb)).values()):
+        return None
+
+    control.attempt()
+    cyc = _single_cycle_repair(n, forb, SINGLE_CYCLE_REPAIR_ROUNDS * n,
+                               min(deadline, now + time_budget / 2), control)
+    if cyc is None:
+        control.attempt()
+        forb_in: list[list[int]] = [[] for _ in range(n)]
+        for u, f in enumerate(forb):
+            for v in f:
+                if v != u:
+                    forb_in[v].append(u)
+            control.check()
+        cyc = _single_cycle_search(n, forb, forb_in, deadline, control)
+    if cyc is None:
+        return None
+    return {users[cyc[k]]: users[cyc[(k + 1) % n]] for k in range(n)}
+
+
+# -------- Selección de motor --------
+DRAW_ENGINES = {
+    'matching': _matching_assignment,
+    'backtracking': _compute_backtracking,
+}
+DEFAULT_DRAW_ENGINE = os.environ.get('DRAW_ENGINE', 'matching')
+
+
+def _merge_exclusions(forbidden: dict[str, set[str]],
+                      exclusions: dict[str, set[str]] | None) -> dict[str, set[str]]:
+    # Sin copiar los conjuntos del mapa precalculado: se reutiliza entre sorteos
+    if not exclusions:
+        return forbidden
+    merged = dict(exclusions)
+    for g, rs in forbidden.items():
+        merged[g] = merged[g] | rs if g in merged else rs
+    return merged
+
+
+def compute_draw(users: list[str], forbidden_pairs: list[tuple[str, str]],
+                 engine: str | None = None, single_cycle: bool = False,
+                 control: DrawControl | None = None,
+                 exclusions: dict[str, set[str]] | None = None) -> dict[str, str] | None:
+    """
+    Calcula el sorteo con el motor indicado ('matching' por defecto, o
+    'backtracking' para el algoritmo original). Con single_cycle=True solo
+    se acepta una cadena única que pase por todos (el motor se ignora).
+    'exclusions' (giver -> receptores, p.ej. del histórico) se suma a las
+    parejas prohibidas tal cual, sin pasar por la lista de parejas.
+    'control' permite seguir el progreso y cancelar (lanza DrawCancelled).
+    """
+    control = control or DrawControl()
+    forbidden = _merge_exclusions(_build_forbidden_lookup(forbidden_pairs, control), exclusions)
+    if single_cycle:
+        name, solver = 'single_cycle', _single_cycle_assignment
+    else:
+        name = engine or DEFAULT_DRAW_ENGINE
+        solver = DRAW_ENGINES[name]
+    if not metrics.ENABLED:
+        return solver(list(users), forbidden, control)
+
+    # Con métricas: tiempo, reinicios y pasos de este cálculo (el control puede venir ya usado)
+    t0, attempts0, steps0 = time.perf_counter(), control.attempts, control.steps
+    outcome = 'error'
+    try:
+        result = solver(list(users), forbidden, control)
+        outcome = 'ok' if result else 'sin_solucion'
+        return result
+    except DrawCancelled:
+        outcome = 'cancelado'
+        raise
+    finally:
+        metrics.observe_draw(name, outcome, control.attempts - attempts0, control.steps - steps0,
+                             time.perf_counter() - t0)
+
+
+# -------- Reparación incremental (altas y bajas después del sorteo) --------
+REPAIR_SPLICE_TRIES = 64        # aristas que se prueban para colar a alguien
+REPAIR_NEIGHBORHOOD = 4         # asignaciones que se liberan en la primera ronda de búsqueda local
+REPAIR_MAX_NEIGHBORHOOD = 64    # por encima, se recalcula el sorteo entero
+REPAIR_ROUND_STEPS = 20000      # pasos de búsqueda por ronda
+
+
+def is_single_cycle(assignments: dict[str, str]) -> bool:
+    """¿La asignación es una única cadena que pasa por todos?"""
+    if not assignments:
+        return False
+    start = next(iter(assignments))
+    x, k = assignments.get(start), 1
+    while x != start and x is not None and k <= len(assignments):
+        x, k = assignments.get(x), k + 1
+    return x == start and k == len(assignments)
+
+
+def _draw_is_valid(assign: dict[str, str], users: list[str], forbidden: dict[str, set[str]],
+                   single_cycle: bool) -> bool:
+    if set(assign) != set(users) or set(assign.values()) != set(users):
+        return False
+    for g, r in assign.items():
+        if g == r or r in forbidden.get(g, ()) or assign.get(r) == g:
+            return False
+    return not single_cycle or is_single_cycle(assign)
+
+
+def _can_give(cur: dict[str, str], forbidden: dict[str, set[str]], g: str, r: str) -> bool:
+    # g -> r sin autoasignación, sin pareja prohibida y sin cerrar un 2-ciclo
+    return g != r and r not in forbidden.get(g, ()) and cur.get(r) != g
+
+
+def _sample_edges(cur: dict[str, str], skip: set[str]):
+    givers = [g for g in random.sample(list(cur), min(len(cur), REPAIR_SPLICE_TRIES)) if g not in skip]
+    return ((g, cur[g]) for g in givers)
+
+
+def _splice(cur: dict[str, str], free_g: list[str], free_r: list[str],
+            forbidden: dict[str, set[str]], single_cycle: bool) -> bool:
+    """
+    Empalmes O(1) sobre cur (lo modifica). Cada alta y ← c->d pasa a c->y->d
+    (cambia solo c). Cada hueco de una baja (p se quedó sin receptor, s sin
+    quien le regale) se cierra con p->s o, si no se puede, se funde con otra
+    cadena: c->d pasa a c->s y p->d (cambian p y c). False si algo no encaja.
+    """
+    new = set(free_g) & set(free_r)
+    gaps_g = [u for u in free_g if u not in new]
+    gaps_r = [u for u in free_r if u not in new]
+    for y in (u for u in free_g if u in new):
+        for c, d in _sample_edges(cur, {y}):
+            if _can_give(cur, forbidden, c, y) and y != d and d not in forbidden.get(y, ()):
+                cur[c], cur[y] = y, d
+                break
+        else:
+            return False
+    if not gaps_g:
+        return True
+    if single_cycle:
+        # Lo que queda son tramos s ... p: hay que encadenarlos todos en un solo ciclo
+        ends = {}
+        for s in gaps_r:
+            x = s
+            while x in cur:
+                x = cur[x]
+            ends[s] = x
+        starts = list(ends)
+        for _ in range(REPAIR_SPLICE_TRIES):
+            random.shuffle(starts)
+            links = {ends[starts[i - 1]]: starts[i] for i in range(len(starts))}
+            trial = dict(cur, **links)
+            if all(_can_give(trial, forbidden, p, s) for p, s in links.items()):
+                cur.update(links)
+                return True
+        return False
+    pending = list(gaps_r)
+    random.shuffle(gaps_g)
+    for p in gaps_g:
+        s = next((s for s in pending if _can_give(cur, forbidden, p, s)), None)
+        if s is None:
+            # Fundir el tramo con otra cadena: c->d pasa a c->s y p->d
+            s, c, d = next(((s, c, d) for s in pending for c, d in _sample_edges(cur, {p, s})
+                            if _can_give(cur, forbidden, p, d) and _can_give(cur, forbidden, c, s)),
+                           (None, None, None))
+            if s is None:
+                return False
+            cur[c] = s
+            cur[p] = d
+        else:
+            cur[p] = s
+        pending.remove(s)
+    return True
+
+
+def _local_repair(base: dict[str, str], free_g: list[str], free_r: list[str], users: list[str],
+                  forbidden: dict[str, set[str]], single_cycle: bool,
+                  control: DrawControl) -> dict[str, str] | None:
+    """
+    Búsqueda local: libera las asignaciones pendientes más k al azar y las
+    reparte de nuevo con backtracking; si no sale, dobla k. None si se
+    llega a REPAIR_MAX_NEIGHBORHOOD sin solución.
+    """
+    kept = list(base)
+    k = REPAIR_NEIGHBORHOOD
+    while True:
+        control.attempt()
+        freed = random.sample(kept, min(k, len(kept)))
+        skip = set(freed)
+        cur = {g: r for g, r in base.items() if g not in skip}
+        givers = free_g + freed
+        receivers = set(free_r) | {base[g] for g in freed}
+        givers.sort(key=lambda g: sum(1 for r in receivers if r != g and r not in forbidden.get(g, ())))
+        budget = [REPAIR_ROUND_STEPS]
+
+        def dfs(i: int) -> bool:
+            if i == len(givers):
+                return not single_cycle or is_single_cycle(cur)
+            g = givers[i]
+            cands = [r for r in receivers if _can_give(cur, forbidden, g, r)]
+            random.shuffle(cands)
+            for r in cands:
+                budget[0] -= 1
+                if budget[0] < 0:
+                    return False
+                control.step()
+                cur[g] = r
+                receivers.discard(r)
+                if dfs(i + 1):
+                    return True
+                receivers.add(r)
+                del cur[g]
+            return False
+
+        if dfs(0) and _draw_is_valid(cur, users, forbidden, single_cycle):
+            return cur
+        if k >= len(kept) or k >= REPAIR_MAX_NEIGHBORHOOD:
+            return None
+        k *= 2
+
+
+def repair_draw(assignments: dict[str, str], users: list[str], forbidden_pairs: list[tuple[str, str]],
+                single_cycle: bool | None = None, engine: str | None = None,
+                control: DrawControl | None = None,
+                exclusions: dict[str, set[str]] | None = None) -> dict | None:
+    """
+    Ajusta un sorteo ya hecho a la lista actual de participantes tocando lo
+    mínimo: empalma a los nuevos en una cadena existente y cierra los huecos
+    de los que se han ido (también los de asignaciones que ahora son pareja
+    prohibida). Solo si ningún empalme vale, búsqueda local sobre unas pocas
+    asignaciones y, como último recurso, el sorteo entero.
+
+    single_cycle=None lo deduce del sorteo actual (si era un solo ciclo, lo
+    sigue siendo). Devuelve {'assignments', 'method' ('nada' | 'empalme' |
+    'local' | 'completo'), 'changed' (quienes ya estaban y cambian de
+    receptor), 'added', 'removed'} o None si no hay solución. 'exclusions'
+    como en compute_draw.
+    """
+    control = control or DrawControl()
+    forbidden = _merge_exclusions(_build_forbidden_lookup(forbidden_pairs, control), exclusions)
+    users = list(dict.fromkeys(users))
+    present = set(users)
+    if single_cycle is None:
+        single_cycle = is_single_cycle(assignments)
+    base = {g: r for g, r in assignments.items()
+            if g in present and r in present and g != r and r not in forbidden.get(g, ())}
+    added = [u for u in users if u not in assignments]
+    removed = [u for u in assignments if u not in present]
+
+    def result(new: dict[str, str], method: str) -> dict:
+        changed = [g for g in users if g in assignments and assignments[g] != new[g]]
+        return {"assignments": new, "method": method, "changed": changed,
+                "added": added, "removed": removed}
+
+    if len(users) < 3:
+        return None
+    if _draw_is_valid(base, users, forbidden, single_cycle):
+        return result(base, 'nada')
+    receivers = set(base.values())
+    free_g = [u for u in users if u not in base]
+    free_r = [u for u in users if u not in receivers]
+
+    cur = dict(base)
+    if _splice(cur, list(free_g), list(free_r), forbidden, single_cycle) and \
+            _draw_is_valid(cur, users, forbidden, single_cycle):
+        return result(cur, 'empalme')
+    cur = _local_repair(base, free_g, free_r, users, forbidden, single_cycle, control)
+    if cur is not None:
+        return result(cur, 'local')
+    cur = compute_draw(users, forbidden_pairs, engine=engine, single_cycle=single_cycle, control=control,
+                       exclusions=exclusions)
+    return result(cur, 'completo') if cur else None
@@ -0,0 +1,133 @@
+import json, os, threading, time
+
+import metrics
+from fileio import FileLock
+
+# Años anteriores cuyas parejas no se repiten en un sorteo nuevo (0 = ninguno)
+DEFAULT_EXCLUDE_YEARS = int(os.environ.get('HISTORY_EXCLUDE_YEARS', '1'))
+
+
+def current_year() -> int:
+    return time.gmtime().tm_year
+
+
+class DrawHistory:
+    """
+    Histórico de sorteos de un grupo, un año por entrada, en un fichero de
+    solo añadir (JSON Lines): {"year", "recorded_at", "assignments"}. Si un
+    año se repite (se resorteó o se ajustó tras altas y bajas), vale la
+    última línea; "assignments": null lo olvida.
+
+    En memoria se indexa por año, por giver y por receptor. Como el fichero
+    solo crece, otros procesos leen únicamente las líneas nuevas (desde el
+    último offset); los añadidos van con el cerrojo entre procesos.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._flock = FileLock(path)
+        self._offset = 0  # bytes ya indexados
+        self._ino = None
+        self._years: dict[int, dict[str, str]] = {}
+        self._by_giver: dict[str, dict[int, str]] = {}     # giver -> {año: receptor}
+        self._by_receiver: dict[str, dict[int, str]] = {}  # receptor -> {año: giver}
+
+    # --- Índice ---
+    def _set_year(self, year: int, assignments: dict[str, str] | None):
+        for g, r in self._years.pop(year, {}).items():
+            self._by_giver.get(g, {}).pop(year, None)
+            self._by_receiver.get(r, {}).pop(year, None)
+        if not assignments:
+            return
+        self._years[year] = dict(assignments)
+        for g, r in assignments.items():
+            self._by_giver.setdefault(g, {})[year] = r
+            self._by_receiver.setdefault(r, {})[year] = g
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if st.st_ino != self._ino or st.st_size < self._offset:
+            # Fichero nuevo (o sustituido a mano): se indexa desde el principio
+            self._ino, self._offset = st.st_ino, 0
+            self._years, self._by_giver, self._by_receiver = {}, {}, {}
+        if st.st_size <= self._offset:
+            return
+        t0 = time.perf_counter() if metrics.ENABLED else 0.0
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        if metrics.ENABLED:
+            metrics.observe_file('read', self.path, len(chunk), time.perf_counter() - t0)
+        end = chunk.rfind(b'\n') + 1  # una línea a medias (escritura en curso) se deja para luego
+        for line in chunk[:end].splitlines():
+            try:
+                rec = json.loads(line)
+                self._set_year(int(rec['year']), rec.get('assignments'))
+            except (ValueError, KeyError, TypeError):
+                continue
+        self._offset += end
+
+    # --- Lecturas ---
+    def years(self) -> list[int]:
+        with self._lock:
+            self._refresh()
+            return sorted(self._years)
+
+    def assignments(self, year: int) -> dict[str, str] | None:
+        with self._lock:
+            self._refresh()
+            a = self._years.get(year)
+            return dict(a) if a is not None else None
+
+    def query(self, giver: str | None = None, receiver: str | None = None,
+              since_year: int | None = None) -> list[dict]:
+        """Asignaciones pasadas [{year, giver, receiver}], de la más reciente a la más antigua."""
+        with self._lock:
+            self._refresh()
+            if giver is not None:
+                rows = [(y, giver, r) for y, r in self._by_giver.get(giver, {}).items()
+                        if receiver is None or r == receiver]
+            elif receiver is not None:
+                rows = [(y, g, receiver) for y, g in self._by_receiver.get(receiver, {}).items()]
+            else:
+                rows = [(y, g, r) for y, a in self._years.items() for g, r in a.items()]
+        rows = [row for row in rows if since_year is None or row[0] >= since_year]
+        rows.sort(key=lambda row: (-row[0], row[1]))
+        return [{"year": y, "giver": g, "receiver": r} for y, g, r in rows]
+
+    def exclusions(self, years: int, current_year: int) -> dict[str, set[str]]:
+        """Mapa giver -> receptores de los 'years' años anteriores a current_year (este no cuenta)."""
+        out: dict[str, set[str]] = {}
+        with self._lock:
+            self._refresh()
+            for y in range(current_year - years, current_year):
+                for g, r in self._years.get(y, {}).items():
+                    out.setdefault(g, set()).add(r)
+        return out
+
+    # --- Escrituras ---
+    def record(self, year: int, assignments: dict[str, str] | None):
+        """Añade el sorteo de 'year' (sustituye al anterior de ese año; None lo olvida)."""
+        rec = {"year": int(year), "recorded_at": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+               "assignments": assignments}
+        line = (json.dumps(rec, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock, self._flock:
+            self._refresh()
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self._offset:
+                # Una caída dejó una línea sin terminar: se quita antes de añadir
+                with open(self.path, 'r+b') as f:
+                    f.truncate(self._offset)
+            t0 = time.perf_counter() if metrics.ENABLED else 0.0
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            if metrics.ENABLED:
+                metrics.observe_file('write', self.path, len(line), time.perf_counter() - t0)
+            self._refresh()
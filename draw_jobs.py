@@ -0,0 +1,251 @@
+import threading, time, uuid
+from draw_engine import DrawCancelled, DrawControl, compute_draw
+from executors import cpu_executor
+from fileio import FileLock, atomic_write_json, read_json
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+ACTIVE = (QUEUED, RUNNING)
+SYNC_INTERVAL = 0.5  # segundos entre volcados del progreso al fichero compartido
+LOST_GRACE = 30.0    # margen tras el plazo para dar por perdido un trabajo (worker caído)
+
+
+class DrawJobBusy(Exception):
+    """Ya hay un sorteo en curso con la misma clave; 'job' es su estado."""
+
+    def __init__(self, job: dict):
+        super().__init__('sorteo en curso')
+        self.job = job
+
+
+class SharedDrawControl(DrawControl):
+    """
+    Control de un trabajo: al comprobarse (como mucho cada SYNC_INTERVAL)
+    vuelca intentos y pasos al fichero compartido y recoge la cancelación
+    que se haya pedido desde cualquier worker.
+    """
+
+    def __init__(self, manager: 'DrawJobManager', job_id: str):
+        super().__init__()
+        self._manager = manager
+        self._job_id = job_id
+        self._synced = 0.0
+
+    def check(self):
+        now = time.monotonic()
+        if now - self._synced >= SYNC_INTERVAL:
+            self._synced = now
+            if self._manager._sync(self._job_id, self.attempts, self.steps):
+                self.cancelled = True
+        super().check()
+
+
+class DrawJobManager:
+    """
+    Ejecuta los sorteos en un pool de hilos propio para no bloquear las
+    peticiones. Cada trabajo tiene un plazo máximo y puede cancelarse; al
+    terminar bien se llama a on_done(resultado) (p.ej. para guardar el sorteo).
+
+    El estado de los trabajos vive en un JSON compartido (con cerrojo entre
+    procesos), así que cualquier worker de gunicorn puede consultarlos o
+    cancelarlos, y "un sorteo a la vez por clave" vale para todos. Calcula
+    el worker que recibió el trabajo: vuelca allí el progreso y recoge las
+    cancelaciones. Si ese worker cae, el trabajo se da por perdido al pasar
+    su plazo (más LOST_GRACE) y deja de bloquear la clave.
+    """
+
+    def __init__(self, path: str = 'draw_jobs.json', max_workers: int = 1, deadline_s: float = 60.0,
+                 keep: int = 50):
+        self.path = path
+        self._pool = cpu_executor(max_workers, thread_name_prefix='draw-job')
+        self._lock = threading.RLock()
+        self._flock = FileLock(path)
+        self._controls: dict[str, DrawControl] = {}  # trabajos de este proceso en cola o en marcha
+        self.deadline_s = deadline_s
+        self.keep = keep
+
+    def submit(self, users, forbidden_pairs, engine=None, single_cycle=False, on_done=None, key='',
+               wrap=None, exclusions=None) -> dict:
+        """
+        wrap(task) -> task permite envolver el cálculo (p.ej. para perfilarlo).
+        exclusions: mapa giver -> receptores ya prohibidos (del histórico).
+        """
+        users, forbidden_pairs = list(users), list(forbidden_pairs)
+
+        def task(control):
+            return compute_draw(users, forbidden_pairs, engine=engine, single_cycle=single_cycle, control=control,
+                                exclusions=exclusions)
+
+        if wrap:
+            task = wrap(task)
+
+        return self.submit_task(task, key=key, participants=len(users), single_cycle=single_cycle, on_done=on_done)
+
+    def submit_task(self, task, key='', participants=0, single_cycle=False, on_done=None,
+                    public_result=False) -> dict:
+        """
+        Encola un cálculo arbitrario task(control) -> resultado (None = sin
+        solución). Lanza DrawJobBusy si ya hay uno en curso con la misma clave.
+        """
+        job = {
+            "id": uuid.uuid4().hex,
+            "key": key,
+            "status": QUEUED,
+            "error": None,
+            "participants": participants,
+            "single_cycle": single_cycle,
+            "public_result": public_result,  # el resultado puede mostrarse (p.ej. un resumen por grupo)
+            "result": None,
+            "deadline_s": self.deadline_s,
+            "created": time.time(),  # hora de reloj: monotonic no se comparte entre procesos
+            "started": None,
+            "finished": None,
+            "attempts": 0,
+            "steps": 0,
+            "cancel": False,
+        }
+
+        def add(jobs):
+            now = time.time()
+            running = next((j for j in jobs.values() if j['key'] == key and self._alive(j, now)), None)
+            if running:
+                return running
+            jobs[job['id']] = job
+            self._prune(jobs)
+            return None
+
+        running = self._update(add)
+        if running:
+            raise DrawJobBusy(self._view(running))
+        control = SharedDrawControl(self, job['id'])
+        with self._lock:
+            self._controls[job['id']] = control
+        self._pool.submit(self._run, job['id'], task, control, on_done)
+        return self._view(job)
+
+    def get(self, job_id: str) -> dict | None:
+        job = self._load().get(job_id)
+        return self._view(job) if job else None
+
+    def active_job(self, key: str = '') -> dict | None:
+        now = time.time()
+        return next((self._view(j, now) for j in self._load().values() if j['key'] == key and self._alive(j, now)),
+                    None)
+
+    def cancel(self, job_id: str) -> dict | None:
+        """Pide cancelar el trabajo; devuelve su estado o None si no existe o ya terminó."""
+        def mark(jobs):
+            job = jobs.get(job_id)
+            if not job or not self._alive(job, time.time()):
+                return None
+            if job['status'] == QUEUED:
+                job.update(status=CANCELLED, error='cancelado', finished=time.time())
+            else:
+                job['cancel'] = True  # lo recoge el worker que calcula
+            return dict(job)
+
+        job = self._update(mark)
+        if job is None:
+            return None
+        with self._lock:
+            control = self._controls.get(job_id)
+        if control:
+            control.cancel()
+        return self._view(job)
+
+    # --- Fichero compartido ---
+    def _load(self) -> dict[str, dict]:
+        try:
+            return read_json(self.path)
+        except FileNotFoundError:
+            return {}
+
+    def _update(self, fn):
+        with self._lock, self._flock:
+            jobs = self._load()
+            out = fn(jobs)
+            atomic_write_json(self.path, jobs, indent=None)
+            return out
+
+    def _sync(self, job_id: str, attempts: int, steps: int) -> bool:
+        """Vuelca el progreso; True si se ha pedido cancelar."""
+        def put(jobs):
+            job = jobs.get(job_id)
+            if not job:
+                return False
+            job.update(attempts=attempts, steps=steps)
+            return job['cancel']
+        return self._update(put)
+
+    @staticmethod
+    def _alive(job: dict, now: float) -> bool:
+        # Activo y dentro de plazo: pasado el margen, el worker que lo calculaba ya no está
+        return job['status'] in ACTIVE and now <= (job['started'] or job['created']) + job['deadline_s'] + LOST_GRACE
+
+    def _prune(self, jobs: dict[str, dict]):
+        # Solo se conservan los últimos 'keep' trabajos terminados (los perdidos cuentan como terminados)
+        now = time.time()
+        finished = [j for j in jobs.values() if not self._alive(j, now)]
+        for j in finished[:max(0, len(finished) - self.keep)]:
+            del jobs[j['id']]
+
+    def _view(self, job: dict, now: float | None = None) -> dict:
+        """Estado público del trabajo (lo que devuelven las rutas de consulta)."""
+        now = now or time.time()
+        status, error = job['status'], job['error']
+        if status in ACTIVE and not self._alive(job, now):
+            status, error = FAILED, 'trabajo perdido (se reinició el worker)'
+        end = job['finished'] or now
+        d = {
+            "id": job['id'],
+            "status": status,
+            "error": error,
+            "key": job['key'],
+            "participants": job['participants'],
+            "single_cycle": job['single_cycle'],
+            "queued_s": round((job['started'] or end) - job['created'], 3),
+            "elapsed_s": round(end - job['started'], 3) if job['started'] else 0.0,
+            "attempts": job['attempts'],
+            "steps": job['steps'],
+        }
+        if job['public_result'] and job['result'] is not None:
+            d["result"] = job['result']  # también el parcial de uno cancelado
+        return d
+
+    # --- Ejecución (en el worker que recibió el trabajo) ---
+    def _run(self, job_id: str, task, control: DrawControl, on_done):
+        def start(jobs):
+            job = jobs.get(job_id)
+            if not job or job['status'] != QUEUED:
+                return None  # cancelado mientras esperaba en cola
+            job.update(status=RUNNING, started=time.time())
+            return job
+
+        try:
+            job = self._update(start)
+            if job is None:
+                return
+            control.deadline = time.monotonic() + job['deadline_s']
+            result, status, error = None, DONE, None
+            try:
+                control.check()
+                result = task(control)
+                if result is None:
+                    status, error = FAILED, 'sin solución'
+                elif on_done:
+                    on_done(result)
+            except DrawCancelled as e:
+                status = CANCELLED if control.cancelled else FAILED
+                error, result = str(e), e.partial
+            except Exception as e:
+                status, error = FAILED, f"{type(e).__name__}: {e}"
+
+            def finish(jobs):
+                job = jobs.get(job_id)
+                if job:
+                    job.update(status=status, error=error, finished=time.time(),
+                               attempts=control.attempts, steps=control.steps,
+                               result=result if job['public_result'] else None)
+            self._update(finish)
+        finally:
+            with self._lock:
+                self._controls.pop(job_id, None)
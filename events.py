@@ -0,0 +1,125 @@
+import itertools, json, threading, time
+from collections import deque
+
+
+class Event:
+    __slots__ = ('id', 'type', 'data')
+
+    def __init__(self, id: str, type: str, data: dict):
+        self.id = id
+        self.type = type
+        self.data = data
+
+    def encode(self) -> str:
+        """Formato text/event-stream."""
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, ensure_ascii=False)}\n\n"
+
+
+class _Channel:
+    def __init__(self, history: int):
+        self.cond = threading.Condition()
+        self.events: deque[tuple[int, Event]] = deque(maxlen=history)
+        self.seq = 0
+        self.subscribers = 0
+
+
+class EventBroker:
+    """
+    Pub/sub en memoria del proceso, un canal por grupo. Cada canal guarda
+    los últimos 'history' eventos; los suscriptores no tienen cola propia,
+    solo recuerdan el último número que han visto y esperan en la condición
+    del canal. Así una conexión parada cuesta casi nada.
+
+    Los IDs llevan la época del proceso ('<época>-<n>'): si un cliente se
+    reconecta con un Last-Event-ID de otro proceso o demasiado antiguo, se
+    le manda un evento 'resync' para que vuelva a pedir el estado.
+    """
+
+    def __init__(self, history: int = 256):
+        self.history = history
+        self.epoch = format(time.time_ns() // 1000, 'x')
+        self._lock = threading.Lock()
+        self._channels: dict[str, _Channel] = {}
+        self.published = 0
+
+    def _channel(self, name: str) -> _Channel:
+        with self._lock:
+            ch = self._channels.get(name)
+            if ch is None:
+                ch = self._channels[name] = _Channel(self.history)
+            return ch
+
+    def publish(self, channel: str, type: str, data: dict) -> Event:
+        ch = self._channel(channel)
+        with ch.cond:
+            ch.seq += 1
+            ev = Event(f"{self.epoch}-{ch.seq}", type, data)
+            ch.events.append((ch.seq, ev))
+            self.published += 1
+            ch.cond.notify_all()
+        return ev
+
+    def subscribe(self, channel: str, last_event_id: str | None = None) -> 'Subscription':
+        return Subscription(self, channel, last_event_id)
+
+    def active_channels(self) -> list[str]:
+        """Canales con algún suscriptor."""
+        with self._lock:
+            return [name for name, ch in self._channels.items() if ch.subscribers]
+
+    def stats(self) -> dict:
+        with self._lock:
+            channels = dict(self._channels)
+        return {
+            "published": self.published,
+            "subscribers": sum(ch.subscribers for ch in channels.values()),
+            "channels": {name or '(defecto)': ch.subscribers for name, ch in channels.items() if ch.subscribers},
+        }
+
+
+class Subscription:
+    """Lectura de un canal a partir del último evento visto."""
+
+    def __init__(self, broker: EventBroker, channel: str, last_event_id: str | None):
+        self._ch = broker._channel(channel)
+        with self._ch.cond:
+            self._ch.subscribers += 1
+            current = self._ch.seq
+        self.resync = False
+        self._last = current
+        if last_event_id:
+            epoch, _, n = last_event_id.partition('-')
+            if epoch == broker.epoch and n.isdigit() and int(n) <= current:
+                self._last = int(n)
+            else:
+                self.resync = True
+        self._epoch = broker.epoch
+        self._closed = False
+
+    @property
+    def last_id(self) -> str:
+        return f"{self._epoch}-{self._last}"
+
+    def next_events(self, timeout: float) -> list[Event]:
+        """Eventos nuevos (espera hasta 'timeout' segundos; [] si no llega nada)."""
+        ch = self._ch
+        with ch.cond:
+            if ch.seq == self._last:
+                ch.cond.wait(timeout)
+            if ch.seq == self._last:
+                return []
+            oldest = ch.events[0][0] if ch.events else ch.seq + 1
+            if self._last + 1 < oldest:
+                # Se ha quedado atrás más de lo que guarda el canal
+                self.resync = True
+            # Los números son consecutivos: los nuevos son los últimos del deque
+            count = min(ch.seq - self._last, len(ch.events))
+            new = [ev for _, ev in itertools.islice(reversed(ch.events), count)][::-1]
+            self._last = ch.seq
+            return new
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            with self._ch.cond:
+                self._ch.subscribers -= 1
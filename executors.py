@@ -0,0 +1,46 @@
+import multiprocessing, sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+def gevent_patched() -> bool:
+    """True si gevent ha parcheado threading (p.ej. gunicorn -k gevent)."""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+
+def cpu_executor(max_workers: int, thread_name_prefix: str = ''):
+    """
+    Pool para trabajo de CPU (hashes, sorteos). Con gevent los hilos del
+    ThreadPoolExecutor normal son greenlets y un cálculo largo bloquearía a
+    todo el worker; en ese caso se usa el pool de hilos nativos de gevent,
+    que se espera sin bloquear al resto de conexiones.
+    """
+    if gevent_patched():
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+
+def process_executor(max_workers: int | None = None) -> ProcessPoolExecutor:
+    """
+    Pool de procesos para repartir cálculos entre núcleos. Siempre con
+    'spawn': se crea desde hilos de trabajo y, con gevent, un fork copiaría
+    un proceso parcheado a medias (hub, cerrojos). Las tareas tienen que ser
+    funciones de módulo y recibir datos que se puedan serializar.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def terminate_process_executor(pool: ProcessPoolExecutor):
+    """
+    Descarta lo que queda en cola y mata los procesos que siguen calculando:
+    un cálculo en marcha no se puede interrumpir de otra forma, y
+    shutdown(wait=True) esperaría a que terminase.
+    """
+    processes = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for p in processes:
+        if p.is_alive():
+            p.terminate()
@@ -0,0 +1,122 @@
+import json, os, tempfile, time
+
+import metrics
+from executors import gevent_patched
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin cerrojo entre procesos (usar un solo proceso)
+    fcntl = None
+
+
+def atomic_write_bytes(path: str, data: bytes, mode: int | None = None):
+    """Escribe en un temporal del mismo directorio, fsync y os.replace (atómico)."""
+    t0 = time.perf_counter() if metrics.ENABLED else 0.0
+    dir_ = os.path.dirname(os.path.abspath(path)) or "."
+    with tempfile.NamedTemporaryFile("wb", delete=False, dir=dir_) as tmp:
+        tmp.write(data)
+        tmp.flush()
+        os.fsync(tmp.fileno())
+        tmp_path = tmp.name
+    if mode is not None:
+        os.chmod(tmp_path, mode)  # el temporal se crea con 0600
+    os.replace(tmp_path, path)
+    if metrics.ENABLED:
+        metrics.observe_file('write', path, len(data), time.perf_counter() - t0)
+
+
+def atomic_write_json(path: str, obj, indent=2):
+    # Guardado atómico para evitar corrupción
+    atomic_write_bytes(path, json.dumps(obj, ensure_ascii=False, indent=indent).encode('utf-8'))
+
+
+def read_json(path: str):
+    """Lee y parsea un JSON (UTF-8). Lanza FileNotFoundError/ValueError como json.load."""
+    t0 = time.perf_counter() if metrics.ENABLED else 0.0
+    with open(path, 'rb') as f:
+        data = f.read()
+    obj = json.loads(data)
+    if metrics.ENABLED:
+        metrics.observe_file('read', path, len(data), time.perf_counter() - t0)
+    return obj
+
+
+class FileLock:
+    """
+    Cerrojo consultivo entre procesos (fcntl.flock) para un fichero de datos.
+    Va en '<path>.lock' porque el de datos se sustituye (os.replace) en cada
+    escritura. Es reentrante y se usa con el cerrojo de hilos del dueño ya
+    tomado: los hilos de un mismo proceso comparten descriptor y no se
+    excluyen entre sí.
+
+    El .lock guarda además un contador de generación que sube con cada
+    escritura (bump): un lector sabe si otro proceso ha cambiado los datos
+    aunque mtime, tamaño e inodo coincidan.
+    """
+
+    def __init__(self, path: str):
+        self.data_path = path
+        self.path = f"{path}.lock"
+        self._fd = None
+        self._pid = None
+        self._depth = 0
+
+    def _open(self, create: bool = True) -> int | None:
+        if self._pid != os.getpid() and self._fd is not None:
+            # Tras un fork el descriptor heredado comparte el cerrojo con el padre
+            os.close(self._fd)
+            self._fd = None
+        if self._fd is None:
+            try:
+                self._fd = os.open(self.path, os.O_RDWR | (os.O_CREAT if create else 0), 0o644)
+            except FileNotFoundError:
+                if create:
+                    raise
+                return None  # nadie ha escrito aún: leer no crea el .lock
+            self._pid = os.getpid()
+            self._depth = 0
+        return self._fd
+
+    def _acquire(self, fd: int):
+        if not gevent_patched():
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return
+        # Con gevent una espera bloqueante pararía el worker entero: se reintenta cediendo el turno
+        delay = 0.0005
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                time.sleep(delay)
+                delay = min(delay * 2, 0.01)
+
+    def __enter__(self):
+        if fcntl is None:
+            return self
+        fd = self._open()
+        if self._depth == 0:
+            t0 = time.perf_counter() if metrics.ENABLED else 0.0
+            self._acquire(fd)
+            if metrics.ENABLED:
+                metrics.observe_file('lock', self.data_path, 0, time.perf_counter() - t0)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is None:
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def generation(self) -> int:
+        if fcntl is None:
+            return 0
+        fd = self._open(create=False)
+        return int.from_bytes(os.pread(fd, 8, 0), 'little') if fd is not None else 0
+
+    def bump(self):
+        """Sube la generación (con el cerrojo tomado, tras escribir)."""
+        if fcntl is not None:
+            os.pwrite(self._fd, (self.generation() + 1).to_bytes(8, 'little'), 0)
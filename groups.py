@@ -0,0 +1,229 @@
+import os, re, threading, time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from draw_engine import DrawCancelled, DrawControl, compute_draw, repair_draw
+from draw_history import DEFAULT_EXCLUDE_YEARS, current_year
+from executors import process_executor, terminate_process_executor
+from storage import Storage, open_storage
+
+GROUP_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+DEFAULT_GROUP = ''  # grupo "raíz": los ficheros de siempre (users.json, draw.json, ...)
+
+
+def is_valid_group_id(group_id: str) -> bool:
+    return bool(GROUP_ID_RE.match(group_id or ''))
+
+
+def group_paths(base_dir: str, group_id: str) -> dict:
+    d = os.path.join(base_dir, group_id)
+    return {
+        "users_file": os.path.join(d, 'users.json'),
+        "selections_file": os.path.join(d, 'selected_teams.json'),
+        "draw_file": os.path.join(d, 'draw.json'),
+        "path": os.path.join(d, 'santa.db'),
+    }
+
+
+class GroupRegistry:
+    """
+    Grupos independientes, cada uno en su directorio GROUPS_DIR/<id>/ con sus
+    propios usuarios (el primero es su admin), selecciones y sorteo.
+    El almacenamiento de cada grupo se abre al primer uso y se mantiene en
+    una caché LRU acotada, así un proceso puede atender miles de grupos.
+    """
+
+    def __init__(self, base_dir: str = 'groups', default: Storage | None = None,
+                 backend: str | None = None, cache_size: int = 256):
+        self.base_dir = base_dir
+        self.default = default
+        self.backend = backend
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, Storage] = OrderedDict()
+
+    def exists(self, group_id: str) -> bool:
+        if group_id == DEFAULT_GROUP:
+            return True
+        return is_valid_group_id(group_id) and os.path.isdir(os.path.join(self.base_dir, group_id))
+
+    def list_groups(self) -> list[str]:
+        try:
+            names = os.listdir(self.base_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(n for n in names if is_valid_group_id(n) and os.path.isdir(os.path.join(self.base_dir, n)))
+
+    def get(self, group_id: str) -> Storage:
+        if group_id == DEFAULT_GROUP and self.default is not None:
+            return self.default
+        if not self.exists(group_id):
+            raise KeyError(group_id)
+        with self._lock:
+            st = self._cache.get(group_id)
+            if st is not None:
+                self._cache.move_to_end(group_id)
+                return st
+        st = open_storage(self.backend, **group_paths(self.base_dir, group_id))
+        with self._lock:
+            st = self._cache.setdefault(group_id, st)
+            self._cache.move_to_end(group_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return st
+
+    def create(self, group_id: str) -> Storage:
+        if not is_valid_group_id(group_id):
+            raise ValueError(f"Identificador de grupo no válido: {group_id!r}")
+        os.makedirs(os.path.join(self.base_dir, group_id), exist_ok=True)
+        return self.get(group_id)
+
+
+def parse_stored_pairs(stored: list) -> list[tuple[str, str]]:
+    """Convierte las parejas guardadas en draw.json ('A::B') en tuplas."""
+    pairs = []
+    for p in stored:
+        if isinstance(p, str) and '::' in p:
+            a, b = p.split('::', 1)
+            pairs.append((a, b))
+        elif isinstance(p, (list, tuple)) and len(p) == 2:
+            pairs.append((p[0], p[1]))
+    return pairs
+
+
+NO_REPAIR = {"method": None, "changed": [], "added": [], "removed": []}
+
+
+def _draw_year(st: Storage, assignments: dict[str, str]) -> int | None:
+    """Año del histórico al que corresponde el sorteo guardado (None si no está)."""
+    years = st.history_years()
+    return years[-1] if years and st.history_assignments(years[-1]) == assignments else None
+
+
+def repair_stored_draw(st: Storage, engine: str | None = None, control: DrawControl | None = None,
+                       exclude_years: int = DEFAULT_EXCLUDE_YEARS) -> dict | None:
+    """
+    Ajusta el sorteo guardado a los usuarios actuales tras altas o bajas
+    (ver draw_engine.repair_draw). None si aún no hay sorteo. Si no hay
+    solución, el sorteo se queda como estaba y 'method' es None. Las
+    asignaciones nuevas evitan lo que ya tocó en los últimos exclude_years
+    años, y el histórico de este año se actualiza con el resultado.
+    """
+    year = None
+
+    def repair(d: dict) -> dict:
+        nonlocal year
+        assignments = d.get('assignments') or {}
+        year = _draw_year(st, assignments)
+        pairs = parse_stored_pairs(d.get('forbidden_pairs', []))
+        # Lo que ya estaba asignado se respeta aunque se sortease sin excluir el histórico
+        exclusions = {g: rs - {assignments.get(g)}
+                      for g, rs in st.history_exclusions(exclude_years, year or current_year()).items()}
+        return repair_draw(assignments, st.usernames(), pairs, engine=engine, control=control,
+                           exclusions=exclusions) or dict(NO_REPAIR)
+
+    d = st.load_draw()
+    if not d.get('done'):
+        return None
+    result = repair(d)
+    if result['method'] in (None, 'nada'):
+        return result
+
+    def apply(d: dict) -> dict:
+        # Se repite con el cerrojo: el sorteo o los usuarios pudieron cambiar mientras tanto
+        nonlocal result
+        result = repair(d) if d.get('done') else dict(NO_REPAIR)
+        if result['method'] in (None, 'nada'):
+            return d
+        return dict(d, assignments=result['assignments'])
+    st.update_draw(apply)
+    if year is not None and result['method'] not in (None, 'nada'):
+        st.record_draw(year, result['assignments'])
+    return result
+
+
+def _solve_group(users: list[str], pairs: list[tuple[str, str]], engine: str | None,
+                 single_cycle: bool, exclusions: dict[str, set[str]],
+                 deadline: float | None) -> dict[str, str] | None:
+    # Se ejecuta en un proceso del pool: solo recibe y devuelve datos simples.
+    # El plazo llega como hora de reloj (time.time()): monotonic no se comparte entre procesos
+    control = DrawControl(deadline=time.monotonic() + deadline - time.time() if deadline is not None else None)
+    return compute_draw(users, pairs, engine=engine, single_cycle=single_cycle, control=control,
+                        exclusions=exclusions)
+
+
+def draw_groups_parallel(registry: GroupRegistry, group_ids: list[str], engine: str | None = None,
+                         single_cycle: bool = False, max_workers: int | None = None,
+                         control: DrawControl | None = None,
+                         exclude_years: int = DEFAULT_EXCLUDE_YEARS, on_drawn=None) -> dict[str, str]:
+    """
+    Sortea varios grupos a la vez repartiéndolos en un pool de procesos.
+    Usa las parejas prohibidas ya guardadas en cada grupo y excluye lo que
+    ya tocó en sus últimos exclude_years años; cada resultado va también al
+    histórico del grupo y se avisa con on_drawn(grupo). Los grupos ya
+    sorteados o con menos de 2 miembros se omiten. Devuelve {grupo: estado}.
+
+    El plazo del control se aplica también dentro de cada proceso. Si se
+    cancela o vence, se matan los procesos que siguen calculando y el
+    DrawCancelled lleva en 'partial' el resumen hasta ese momento (lo que
+    faltaba queda como 'cancelado' o 'plazo superado'). El pool arranca sus
+    procesos con 'spawn' (ver executors.process_executor): vale también
+    desde un hilo de un worker gevent.
+    """
+    control = control or DrawControl()
+    year = current_year()
+    deadline = time.time() + control.deadline - time.monotonic() if control.deadline is not None else None
+    summary: dict[str, str] = {}
+    pending = {}
+    pool = process_executor(max_workers)
+    try:
+        for gid in group_ids:
+            control.check()
+            st = registry.get(gid)
+            d = st.load_draw()
+            members = st.usernames()
+            if d.get('done'):
+                summary[gid] = 'ya sorteado'
+                continue
+            if len(members) < 2:
+                summary[gid] = 'menos de 2 miembros'
+                continue
+            pairs = parse_stored_pairs(d.get('forbidden_pairs', []))
+            exclusions = st.history_exclusions(exclude_years, year)
+            pending[pool.submit(_solve_group, members, pairs, engine, single_cycle, exclusions, deadline)] = gid
+
+        not_done = set(pending)
+        while not_done:
+            # Espera por tramos para atender cancelaciones y el plazo
+            done, not_done = wait(not_done, timeout=0.5, return_when=FIRST_COMPLETED)
+            for fut in done:
+                control.attempt()
+                gid = pending[fut]
+                try:
+                    assignment = fut.result()
+                except DrawCancelled as e:
+                    summary[gid] = str(e)
+                    continue
+                except Exception as e:
+                    summary[gid] = f"error: {type(e).__name__}"
+                    continue
+                if not assignment:
+                    summary[gid] = 'sin solución'
+                    continue
+                st = registry.get(gid)
+                st.update_draw(lambda d: dict(d, done=True, assignments=assignment))
+                st.record_draw(year, assignment)
+                summary[gid] = 'hecho'
+                if on_drawn:
+                    on_drawn(gid)
+            control.check()
+    except DrawCancelled as e:
+        # Sin esperar a los procesos: un cálculo sin salida no acabaría nunca
+        terminate_process_executor(pool)
+        for gid in pending.values():
+            summary.setdefault(gid, str(e))
+        e.partial = summary
+        raise
+    finally:
+        pool.shutdown(wait=True)
+    return summary
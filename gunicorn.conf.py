@@ -0,0 +1,42 @@
+"""
+Configuración de gunicorn; se carga sola al arrancar desde la raíz del repo:
+    gunicorn 'app:create_app()'
+
+Un worker gevent por núcleo (WEB_CONCURRENCY para cambiarlo). Los JSON de
+datos se escriben con cerrojo entre procesos (fileio.FileLock) y cada
+worker reenvía a sus conexiones /events lo que guardan los demás.
+"""
+import multiprocessing, os, shutil
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))  # incluye las conexiones /events
+timeout = 60           # un worker que no responde en este tiempo se reinicia
+graceful_timeout = 20  # al reiniciar se cortan las conexiones /events; el navegador reconecta solo
+keepalive = 5
+# Sin preload: cada worker crea sus pools de hilos, su broker de eventos y su bitset tras el fork
+preload_app = False
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')  # '-' para stdout
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+
+# Con un worker por núcleo basta un hilo de hash por worker (HASH_WORKERS lo cambia)
+os.environ.setdefault('HASH_WORKERS', '1')
+
+
+def on_starting(server):
+    # Métricas multiproceso: el directorio tiene que empezar vacío en cada arranque
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Los valores del worker que termina dejan de contarse como vivos en /metrics
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        try:
+            from prometheus_client import multiprocess
+        except ImportError:
+            return
+        multiprocess.mark_process_dead(worker.pid)
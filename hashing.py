@@ -0,0 +1,143 @@
+import os, threading, time
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from executors import cpu_executor
+
+
+class HashOverloaded(Exception):
+    """Demasiados hashes en cola: hay que reintentar más tarde (503)."""
+
+    def __init__(self, retry_after: int = 5):
+        super().__init__('servicio saturado')
+        self.retry_after = retry_after
+
+
+class HashRateLimited(HashOverloaded):
+    """La misma IP ya tiene demasiados hashes en curso (429)."""
+
+    def __init__(self, retry_after: int = 2):
+        Exception.__init__(self, 'demasiadas peticiones')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    Ejecuta los hashes de contraseña (scrypt/pbkdf2, costosos a propósito)
+    en un pool acotado de hilos, fuera del hilo de la petición. hashlib
+    libera el GIL durante el cálculo, así que el pool limita los núcleos que
+    se dedican a hashear y el resto de rutas sigue respondiendo.
+
+    Control de admisión:
+      - como mucho max_workers + max_queue hashes a la vez (si no, HashOverloaded)
+      - si per_ip > 0, como mucho per_ip por IP (si no, HashRateLimited); la
+        IP tiene que ser la del cliente, no la de un proxy compartido por todos
+      - si un hash espera en cola más de queue_timeout segundos, HashOverloaded
+    """
+
+    def __init__(self, max_workers: int | None = None, max_queue: int = 32, per_ip: int = 0,
+                 queue_timeout: float = 10.0):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_queue = max_queue
+        self.per_ip = per_ip
+        self.queue_timeout = queue_timeout
+        self._pool = cpu_executor(self.max_workers, thread_name_prefix='pwd-hash')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._by_ip: dict[str, int] = {}
+        self._latencies: deque[float] = deque(maxlen=1024)  # segundos de cálculo
+        self._waits: deque[float] = deque(maxlen=1024)      # segundos en cola
+        self.completed = 0
+        self.rejected_overload = 0
+        self.rejected_ip = 0
+        self.timeouts = 0
+
+    # --- Admisión ---
+    def _admit(self, ip: str | None):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.rejected_overload += 1
+                raise HashOverloaded()
+            if ip is not None and self.per_ip:
+                if self._by_ip.get(ip, 0) >= self.per_ip:
+                    self.rejected_ip += 1
+                    raise HashRateLimited()
+                self._by_ip[ip] = self._by_ip.get(ip, 0) + 1
+            self._in_flight += 1
+
+    def _release(self, ip: str | None):
+        with self._lock:
+            self._in_flight -= 1
+            if ip is not None:
+                n = self._by_ip.get(ip, 1) - 1
+                if n:
+                    self._by_ip[ip] = n
+                else:
+                    self._by_ip.pop(ip, None)
+
+    def _timed(self, enqueued: float, started: threading.Event, fn, args):
+        t0 = time.monotonic()
+        with self._lock:
+            self._running += 1
+            self._waits.append(t0 - enqueued)
+        started.set()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._latencies.append(time.monotonic() - t0)
+                self.completed += 1
+
+    def _run(self, fn, *args, ip: str | None = None):
+        self._admit(ip)
+        fut = None
+        try:
+            started = threading.Event()
+            fut = self._pool.submit(self._timed, time.monotonic(), started, fn, args)
+            # Solo se limita la espera en cola; un hash ya empezado se deja terminar
+            if not started.wait(self.queue_timeout) and fut.cancel():
+                with self._lock:
+                    self.timeouts += 1
+                raise HashOverloaded()
+            return fut.result()
+        finally:
+            if fut is None or fut.done():
+                self._release(ip)
+            else:
+                fut.add_done_callback(lambda _: self._release(ip))
+
+    # --- API ---
+    def check(self, pwhash: str, password: str, ip: str | None = None) -> bool:
+        return self._run(check_password_hash, pwhash, password, ip=ip)
+
+    def generate(self, password: str, ip: str | None = None, method: str | None = None) -> str:
+        if method:
+            return self._run(generate_password_hash, password, method, ip=ip)
+        return self._run(generate_password_hash, password, ip=ip)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lat = sorted(self._latencies)
+            waits = sorted(self._waits)
+            running = self._running
+            in_flight = self._in_flight
+
+        def pct(xs, p):
+            return round(xs[min(len(xs) - 1, int(p / 100 * len(xs)))], 4) if xs else None
+
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": running,
+            "queue_depth": max(0, in_flight - running),
+            "completed": self.completed,
+            "rejected_overload": self.rejected_overload,
+            "rejected_ip": self.rejected_ip,
+            "timeouts": self.timeouts,
+            "hash_s": {"p50": pct(lat, 50), "p95": pct(lat, 95), "max": lat[-1] if lat else None},
+            "wait_s": {"p50": pct(waits, 50), "p95": pct(waits, 95), "max": waits[-1] if waits else None},
+        }
@@ -0,0 +1,34 @@
+import hashlib, json
+
+
+class LogoAssets:
+    """
+    Logos optimizados generados por build_logos.py (static/build/manifest.json).
+    Para cada equipo da las rutas (relativas a static/build) de su miniatura
+    WebP y PNG y, si está en el sprite, su posición. Sin manifest, available
+    es False y la app sirve los PNG originales.
+    """
+
+    def __init__(self, manifest: dict | None = None, version: str = ''):
+        manifest = manifest or {}
+        self.version = version  # hash del manifest ('' si no hay)
+        self.available = bool(manifest.get('files'))
+        self._files: dict[str, dict] = manifest.get('files', {})
+        self._teams: dict[str, str] = manifest.get('teams', {})
+        self._sprites: dict[str, dict] = manifest.get('sprites', {})
+
+    @classmethod
+    def load(cls, path: str) -> 'LogoAssets':
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            return cls(json.loads(raw), version=hashlib.sha256(raw).hexdigest()[:16])
+        except (FileNotFoundError, ValueError):
+            return cls()
+
+    def files_of(self, team_id: str) -> dict | None:
+        key = self._teams.get(str(team_id))
+        return self._files.get(key) if key else None
+
+    def sprite_of(self, team_id: str) -> dict | None:
+        return self._sprites.get(str(team_id))
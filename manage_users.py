@@ -1,27 +1,37 @@
 #!/usr/bin/env python3
-import argparse, json, os, sys, tempfile
+import argparse, csv, json, os, secrets, string, sys, time
+from concurrent.futures import ProcessPoolExecutor
 from getpass import getpass
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone
 
+from fileio import atomic_write_bytes
+from storage import open_storage, migrate_json_to_sqlite
+from groups import group_paths, is_valid_group_id, repair_stored_draw
+
 DEFAULT_USERS_FILE = os.environ.get("USERS_FILE", "users.json")
+DEFAULT_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
+DEFAULT_DB = os.environ.get("DATABASE_PATH", "santa.db")
+DEFAULT_DRAW_FILE = os.environ.get("DRAW_FILE", "draw.json")
+DEFAULT_GROUPS_DIR = os.environ.get("GROUPS_DIR", "groups")
 
 def now_iso():
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
+def get_storage(path):
+    # Con backend json, 'path' es el users.json; con sqlite se usa DEFAULT_DB
+    return open_storage(DEFAULT_BACKEND, users_file=path, draw_file=DEFAULT_DRAW_FILE, path=DEFAULT_DB,
+                        create_missing=False)
+
 def load_users(path):
-    if not os.path.exists(path):
-        return []
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return get_storage(path).load_users()
 
 def save_users(path, users):
-    # Guardado atómico para evitar corrupción
-    dir_ = os.path.dirname(os.path.abspath(path)) or "."
-    with tempfile.NamedTemporaryFile("w", delete=False, dir=dir_, encoding="utf-8") as tmp:
-        json.dump(users, tmp, ensure_ascii=False, indent=2)
-        tmp_path = tmp.name
-    os.replace(tmp_path, path)
+    get_storage(path).save_users(users)
+
+def update_users(path, fn):
+    # Lectura-modificación-escritura con el cerrojo entre procesos: la app puede estar escribiendo a la vez
+    return get_storage(path).update_users(fn)
 
 def find_index(users, username):
     for i, u in enumerate(users):
@@ -29,6 +39,66 @@ def find_index(users, username):
             return i
     return -1
 
+def repair_draw_after_change(args):
+    # Altas y bajas después del sorteo: se empalman en las cadenas existentes
+    if getattr(args, "no_repair_draw", False):
+        return
+    report_repair(repair_stored_draw(get_storage(args.file)))
+
+def report_repair(result):
+    if result is None or result["method"] == "nada":
+        return
+    if result["method"] is None:
+        print("AVISO: el sorteo ya hecho no se pudo ajustar a los usuarios actuales; "
+              "revísalo o repítelo desde el panel.", file=sys.stderr)
+        return
+    print(f"Sorteo ajustado ({result['method']}): {len(result['added'])} altas, {len(result['removed'])} bajas, "
+          f"{len(result['changed'])} asignaciones existentes cambiadas"
+          + (f" ({', '.join(result['changed'])})." if result["changed"] else "."))
+
+def repair_draw_cmd(args):
+    result = repair_stored_draw(get_storage(args.file))
+    if result is None:
+        print("No hay sorteo hecho.")
+    elif result["method"] == "nada":
+        print("El sorteo ya está al día.")
+    else:
+        report_repair(result)
+        if result["method"] is None:
+            sys.exit(1)
+
+def history_cmd(args):
+    st = get_storage(args.file)
+    rows = st.draw_history(giver=args.giver, receiver=args.receiver, since_year=args.since)
+    if not rows:
+        print("(sin sorteos en el histórico)")
+        return
+    for r in rows:
+        print(f"{r['year']}  {r['giver']} -> {r['receiver']}")
+
+def history_add(args):
+    # Para sorteos anteriores a tener histórico: el draw.json vigente o una copia guardada
+    st = get_storage(args.file)
+    if args.source:
+        with open(args.source, encoding="utf-8") as f:
+            data = json.load(f)
+        assignments = data.get("assignments", data) if isinstance(data, dict) else None
+    else:
+        assignments = st.load_draw().get("assignments")
+    if not isinstance(assignments, dict) or not assignments:
+        print(f"ERROR: no hay asignaciones en {args.source or 'el sorteo actual'}.", file=sys.stderr)
+        sys.exit(1)
+    st.record_draw(args.year, assignments)
+    print(f"Sorteo de {args.year} guardado en el histórico ({len(assignments)} asignaciones).")
+
+def history_forget(args):
+    st = get_storage(args.file)
+    if args.year not in st.history_years():
+        print(f"ERROR: no hay sorteo de {args.year} en el histórico.", file=sys.stderr)
+        sys.exit(1)
+    st.record_draw(args.year, None)
+    print(f"Sorteo de {args.year} olvidado.")
+
 def prompt_password(confirm=True):
     while True:
         p1 = getpass("Contraseña: ")
@@ -40,59 +110,66 @@ def prompt_password(confirm=True):
         print("No coinciden. Intenta de nuevo.", file=sys.stderr)
 
 def add_user(args):
-    users = load_users(args.file)
-    if find_index(users, args.username) != -1:
+    if find_index(load_users(args.file), args.username) != -1:
         print(f"ERROR: el usuario '{args.username}' ya existe.", file=sys.stderr)
         sys.exit(1)
     pwd = args.password or prompt_password()
     method = args.method  # e.g. 'scrypt' (por defecto) o 'pbkdf2:sha256:600000'
     hash_ = generate_password_hash(pwd, method=method) if method else generate_password_hash(pwd)
-    users.append({
-        "username": args.username,
-        "password_hash": hash_,
-        "last_password_change": now_iso()
-    })
-    save_users(args.file, users)
-    print(f"Usuario '{args.username}' creado.")
 
-def set_password(args):
-    users = load_users(args.file)
-    idx = find_index(users, args.username)
-    if idx == -1:
-        if not args.create:
-            print(f"ERROR: el usuario '{args.username}' no existe. Usa --create para crearlo.", file=sys.stderr)
+    def apply(users):
+        # Se vuelve a comprobar: pudo crearse mientras se pedía la contraseña
+        if find_index(users, args.username) != -1:
+            print(f"ERROR: el usuario '{args.username}' ya existe.", file=sys.stderr)
             sys.exit(1)
-        # crear
-        pwd = args.password or prompt_password()
-        method = args.method
-        hash_ = generate_password_hash(pwd, method=method) if method else generate_password_hash(pwd)
         users.append({
             "username": args.username,
             "password_hash": hash_,
             "last_password_change": now_iso()
         })
+        return users
+    update_users(args.file, apply)
+    print(f"Usuario '{args.username}' creado.")
+    repair_draw_after_change(args)
 
-        save_users(args.file, users)
-        print(f"Usuario '{args.username}' creado con contraseña.")
-        return
-    # actualizar
+def set_password(args):
+    exists = find_index(load_users(args.file), args.username) != -1
+    if not exists and not args.create:
+        print(f"ERROR: el usuario '{args.username}' no existe. Usa --create para crearlo.", file=sys.stderr)
+        sys.exit(1)
     pwd = args.password or prompt_password()
     method = args.method
     hash_ = generate_password_hash(pwd, method=method) if method else generate_password_hash(pwd)
-    users[idx]["password_hash"] = hash_
-    users[idx]["last_password_change"] = now_iso()
-    save_users(args.file, users)
-    print(f"Contraseña de '{args.username}' actualizada.")
+
+    def apply(users):
+        idx = find_index(users, args.username)
+        if idx == -1:
+            if not args.create:
+                print(f"ERROR: el usuario '{args.username}' ya no existe.", file=sys.stderr)
+                sys.exit(1)
+            users.append({"username": args.username})
+            idx = len(users) - 1
+        users[idx]["password_hash"] = hash_
+        users[idx]["last_password_change"] = now_iso()
+        return users
+    update_users(args.file, apply)
+    if exists:
+        print(f"Contraseña de '{args.username}' actualizada.")
+    else:
+        print(f"Usuario '{args.username}' creado con contraseña.")
+        repair_draw_after_change(args)
 
 def delete_user(args):
-    users = load_users(args.file)
-    idx = find_index(users, args.username)
-    if idx == -1:
-        print(f"ERROR: el usuario '{args.username}' no existe.", file=sys.stderr)
-        sys.exit(1)
-    users.pop(idx)
-    save_users(args.file, users)
+    def apply(users):
+        idx = find_index(users, args.username)
+        if idx == -1:
+            print(f"ERROR: el usuario '{args.username}' no existe.", file=sys.stderr)
+            sys.exit(1)
+        users.pop(idx)
+        return users
+    update_users(args.file, apply)
     print(f"Usuario '{args.username}' eliminado.")
+    repair_draw_after_change(args)
 
 def list_users(args):
     users = load_users(args.file)
@@ -118,14 +195,157 @@ def check_user(args):
     print("OK" if ok else "NO OK")
     sys.exit(0 if ok else 2)
 
+# -------- Importación masiva --------
+PASSWORD_ALPHABET = string.ascii_letters + string.digits
+
+def random_password(length=12):
+    return "".join(secrets.choice(PASSWORD_ALPHABET) for _ in range(length))
+
+def read_import_rows(path, fmt=None):
+    """Genera (username, password|None) desde un CSV (cabecera username[,password]) o un JSONL."""
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8", newline="")
+    try:
+        if fmt == "jsonl":
+            for n, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        print(f"AVISO: línea {n} no es JSON válido, se ignora.", file=sys.stderr)
+                        continue
+                    yield str(rec.get("username", "")).strip(), rec.get("password") or None
+        else:
+            for rec in csv.DictReader(f):
+                yield (rec.get("username") or "").strip(), (rec.get("password") or "").strip() or None
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def _hash_password(item):
+    # Se ejecuta en los procesos del pool
+    username, pwd, method = item
+    return username, generate_password_hash(pwd, method=method) if method else generate_password_hash(pwd)
+
+def _load_progress(path):
+    """Entradas ya hasheadas de una importación interrumpida: {username: registro}."""
+    done = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # última línea a medias
+                done[rec["username"]] = rec
+    except FileNotFoundError:
+        pass
+    return done
+
+def write_credentials(path, creds):
+    """Exporta usuario,contraseña en CSV legible solo por el propietario."""
+    lines = ["username,password"] + [f"{u},{p}" for u, p in creds]
+    atomic_write_bytes(path, ("\n".join(lines) + "\n").encode("utf-8"))
+    os.chmod(path, 0o600)
+
+def import_users(args):
+    users = load_users(args.file)
+    existing = {u.get("username") for u in users}
+    progress_path = f"{args.file}.import-progress"
+    done = _load_progress(progress_path) if args.resume else {}
+
+    # 1) Lee y valida el origen; las contraseñas que falten se generan si se pide
+    pending, order, seen, skipped = [], [], set(), 0
+    for username, pwd in read_import_rows(args.source, args.format):
+        if not username or username in seen:
+            skipped += 1
+            continue
+        seen.add(username)
+        if username in existing:
+            skipped += 1
+            continue
+        order.append(username)
+        if username in done:
+            continue
+        generated = pwd is None
+        if generated:
+            if not args.generate_passwords:
+                print(f"ERROR: '{username}' no tiene contraseña (usa --generate-passwords).", file=sys.stderr)
+                sys.exit(1)
+            pwd = random_password(args.length)
+        pending.append((username, pwd, generated))
+
+    print(f"{len(order)} usuarios nuevos ({len(order) - len(pending)} ya hasheados antes), {skipped} omitidos.")
+    if not order:
+        return
+
+    # 2) Hashea en paralelo; cada resultado se apunta en el fichero de progreso para poder reanudar
+    generated = {u: p for u, p, gen in pending if gen}
+    t0 = last = time.monotonic()
+    with open(progress_path, "a" if args.resume else "w", encoding="utf-8") as prog, \
+            ProcessPoolExecutor(max_workers=args.workers) as pool:
+        os.chmod(progress_path, 0o600)
+        items = [(u, p, args.method) for u, p, _ in pending]
+        chunk = max(1, len(items) // ((args.workers or os.cpu_count() or 1) * 8))
+        for i, (username, hash_) in enumerate(pool.map(_hash_password, items, chunksize=chunk), 1):
+            rec = {"username": username, "password_hash": hash_, "last_password_change": now_iso()}
+            if username in generated and args.export:
+                rec["password"] = generated[username]  # solo hace falta para exportar al reanudar
+            done[username] = rec
+            prog.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            prog.flush()
+            now = time.monotonic()
+            if now - last >= 0.5 or i == len(items):
+                last = now
+                print(f"\r  {i}/{len(items)} ({i * 100 // len(items)}%) · {i / max(now - t0, 1e-9):.1f}/s",
+                      end="", file=sys.stderr, flush=True)
+    if pending:
+        print(file=sys.stderr)
+
+    # 3) Una sola escritura atómica con todos los usuarios nuevos
+    new_users = []
+    for username in order:
+        rec = done[username]
+        new_users.append({k: rec[k] for k in ("username", "password_hash", "last_password_change")})
+
+    def apply(current):
+        # Releída con el cerrojo: no pisa lo que la app o otro comando hayan guardado mientras se hasheaba
+        taken = {u.get("username") for u in current}
+        return current + [u for u in new_users if u["username"] not in taken]
+    update_users(args.file, apply)
+    if args.export:
+        creds = [(u, done[u]["password"]) for u in order if "password" in done[u]]
+        write_credentials(args.export, creds)
+        print(f"Credenciales generadas exportadas a {args.export} ({len(creds)}).")
+    os.remove(progress_path)
+    print(f"Importados {len(new_users)} usuarios en {time.monotonic() - t0:.1f} s.")
+    repair_draw_after_change(args)
+
+def migrate(args):
+    counts = migrate_json_to_sqlite(args.db, users_file=args.file,
+                                    selections_file=args.selections, draw_file=args.draw)
+    print(f"Migrados {counts['users']} usuarios, {counts['selections']} selecciones y "
+          f"{counts['history_years']} años de histórico a {args.db}.")
+
 def ensure_file_exists(path):
-    if not os.path.exists(path):
+    if DEFAULT_BACKEND == "json" and not os.path.exists(path):
         save_users(path, [])
         print(f"Inicializado {path} con una lista vacía.")
 
 def main():
+    global DEFAULT_BACKEND, DEFAULT_DB, DEFAULT_DRAW_FILE
     p = argparse.ArgumentParser(description="Gestión de users.json (hash de contraseñas).")
     p.add_argument("--file", default=DEFAULT_USERS_FILE, help=f"Ruta del users.json (por defecto: {DEFAULT_USERS_FILE})")
+    p.add_argument("--backend", choices=["json", "sqlite"], default=DEFAULT_BACKEND,
+                   help=f"Almacenamiento (por defecto: {DEFAULT_BACKEND}, o STORAGE_BACKEND)")
+    p.add_argument("--db", default=DEFAULT_DB, help=f"Ruta de la base SQLite (por defecto: {DEFAULT_DB})")
+    p.add_argument("--group", help="Trabajar sobre un grupo (se crea si no existe); ignora --file y --db")
+    p.add_argument("--groups-dir", default=DEFAULT_GROUPS_DIR,
+                   help=f"Directorio de los grupos (por defecto: {DEFAULT_GROUPS_DIR}, o GROUPS_DIR)")
+    p.add_argument("--draw-file", default=DEFAULT_DRAW_FILE,
+                   help=f"Ruta del draw.json con backend json (por defecto: {DEFAULT_DRAW_FILE}, o DRAW_FILE)")
+    p.add_argument("--no-repair-draw", action="store_true",
+                   help="No ajustar el sorteo ya hecho tras altas y bajas")
     sub = p.add_subparsers(dest="cmd", required=True)
 
     p_add = sub.add_parser("add", help="Crear usuario nuevo")
@@ -154,8 +374,55 @@ def main():
     p_check.add_argument("--password", help="Si se omite, se pedirá sin eco")
     p_check.set_defaults(func=check_user)
 
+    p_imp = sub.add_parser("import", help="Importar muchos usuarios desde CSV/JSONL (hash en paralelo)")
+    p_imp.add_argument("source", help="Fichero CSV (username[,password]) o JSONL; '-' para stdin")
+    p_imp.add_argument("--format", choices=["csv", "jsonl"], help="Por defecto según la extensión")
+    p_imp.add_argument("--generate-passwords", action="store_true",
+                       help="Generar contraseña aleatoria a quien no la traiga")
+    p_imp.add_argument("--length", type=int, default=12, help="Longitud de las contraseñas generadas")
+    p_imp.add_argument("--export", help="Exportar las contraseñas generadas a este CSV (permisos 600)")
+    p_imp.add_argument("--workers", type=int, help="Procesos para el hash (por defecto: todos los núcleos)")
+    p_imp.add_argument("--method", help="Método de hash (p.ej. 'scrypt' o 'pbkdf2:sha256:600000')")
+    p_imp.add_argument("--resume", action="store_true", help="Reanudar una importación interrumpida")
+    p_imp.set_defaults(func=import_users)
+
+    p_rep = sub.add_parser("repair-draw", help="Ajustar el sorteo ya hecho a los usuarios actuales")
+    p_rep.set_defaults(func=repair_draw_cmd)
+
+    p_hist = sub.add_parser("history", help="Consultar el histórico de sorteos")
+    p_hist.add_argument("--giver", help="Solo lo que regaló este usuario")
+    p_hist.add_argument("--receiver", help="Solo quién regaló a este usuario")
+    p_hist.add_argument("--since", type=int, help="Desde este año")
+    p_hist.set_defaults(func=history_cmd)
+
+    p_hadd = sub.add_parser("history-add", help="Guardar en el histórico un sorteo hecho antes")
+    p_hadd.add_argument("year", type=int)
+    p_hadd.add_argument("--from", dest="source",
+                        help="draw.json (o JSON {giver: receptor}) de ese año; por defecto el sorteo actual")
+    p_hadd.set_defaults(func=history_add)
+
+    p_hfor = sub.add_parser("history-forget", help="Olvidar el sorteo de un año (queda anotado, no se borra)")
+    p_hfor.add_argument("year", type=int)
+    p_hfor.set_defaults(func=history_forget)
+
+    p_mig = sub.add_parser("migrate-sqlite", help="Importar users.json, selected_teams.json y draw.json a SQLite")
+    p_mig.add_argument("--selections", default="selected_teams.json", help="Ruta del selected_teams.json")
+    p_mig.add_argument("--draw", default="draw.json", help="Ruta del draw.json")
+    p_mig.set_defaults(func=migrate)
+
     args = p.parse_args()
-    ensure_file_exists(args.file)
+    if args.group is not None:
+        if not is_valid_group_id(args.group):
+            print(f"ERROR: identificador de grupo no válido: '{args.group}'.", file=sys.stderr)
+            sys.exit(1)
+        paths = group_paths(args.groups_dir, args.group)
+        os.makedirs(os.path.dirname(paths["users_file"]), exist_ok=True)
+        args.file, args.db, args.draw_file = paths["users_file"], paths["path"], paths["draw_file"]
+        if args.cmd == "migrate-sqlite":
+            args.selections, args.draw = paths["selections_file"], paths["draw_file"]
+    DEFAULT_BACKEND, DEFAULT_DB, DEFAULT_DRAW_FILE = args.backend, args.db, args.draw_file
+    if args.cmd != "migrate-sqlite":
+        ensure_file_exists(args.file)
     args.func(args)
 
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+"""
+Métricas al estilo Prometheus (/metrics).
+
+Se activan con METRICS=1 y necesitan prometheus_client (pip install
+prometheus-client). Desactivadas no cuestan nada: los decoradores
+devuelven la función tal cual, no se registran hooks y las llamadas
+sueltas (observe_file, observe_draw) comprueban ENABLED y salen.
+
+Con varios procesos (gunicorn -w N) hay que definir PROMETHEUS_MULTIPROC_DIR
+(un directorio vacío al arrancar): cada proceso escribe sus valores en
+ficheros mmap de ese directorio y /metrics los suma todos.
+"""
+import functools, os, sys, time
+
+try:
+    import prometheus_client as prom
+    from prometheus_client import multiprocess
+except ImportError:  # opcional
+    prom = None
+
+ENABLED = os.environ.get('METRICS', '') == '1' and prom is not None
+if os.environ.get('METRICS', '') == '1' and prom is None:
+    print("AVISO: METRICS=1 pero falta prometheus_client; métricas desactivadas.", file=sys.stderr)
+
+# Cubos en segundos: de 0,5 ms (rutas cacheadas) a 10 s (sorteos grandes)
+LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+if ENABLED:
+    REQUEST_SECONDS = prom.Histogram('santa_http_request_duration_seconds', 'Tiempo de respuesta por ruta',
+                                     ['route', 'method', 'status'], buckets=LATENCY_BUCKETS)
+    STORE_SECONDS = prom.Histogram('santa_store_operation_seconds', 'Tiempo de las operaciones de datos de la app',
+                                   ['op'], buckets=LATENCY_BUCKETS)
+    FILE_SECONDS = prom.Histogram('santa_file_io_seconds', 'Tiempo de lectura/escritura de ficheros de datos',
+                                  ['file', 'op'], buckets=LATENCY_BUCKETS)
+    FILE_BYTES = prom.Counter('santa_file_io_bytes', 'Bytes leídos/escritos en ficheros de datos', ['file', 'op'])
+    DRAW_SECONDS = prom.Histogram('santa_draw_solve_seconds', 'Tiempo de cálculo del sorteo',
+                                  ['engine', 'outcome'], buckets=LATENCY_BUCKETS)
+    DRAW_ATTEMPTS = prom.Counter('santa_draw_attempts', 'Reinicios del motor de sorteo', ['engine'])
+    DRAW_STEPS = prom.Counter('santa_draw_backtrack_steps', 'Pasos de búsqueda (backtracking) del sorteo', ['engine'])
+
+
+def _file_label(path: str) -> str:
+    # Solo el nombre (los grupos repiten los mismos ficheros) y solo JSON: cardinalidad acotada
+    name = os.path.basename(path)
+    return name if name.endswith(('.json', '.jsonl', '.journal')) else 'otros'
+
+
+def timed(op: str):
+    """Decorador: histograma de duración de la operación 'op'."""
+    def deco(fn):
+        if not ENABLED:
+            return fn
+        hist = STORE_SECONDS.labels(op)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - t0)
+        return wrapper
+    return deco
+
+
+def observe_file(op: str, path: str, nbytes: int, seconds: float):
+    if ENABLED:
+        label = _file_label(path)
+        FILE_SECONDS.labels(label, op).observe(seconds)
+        FILE_BYTES.labels(label, op).inc(nbytes)
+
+
+def observe_draw(engine: str, outcome: str, attempts: int, steps: int, seconds: float):
+    if ENABLED:
+        DRAW_SECONDS.labels(engine, outcome).observe(seconds)
+        DRAW_ATTEMPTS.labels(engine).inc(attempts)
+        DRAW_STEPS.labels(engine).inc(steps)
+
+
+def render() -> tuple[bytes, str]:
+    """(cuerpo, content-type) en formato de texto de Prometheus, sumando todos los procesos si procede."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prom.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prom.REGISTRY
+    return prom.generate_latest(registry), prom.CONTENT_TYPE_LATEST
+
+
+def init_metrics(app):
+    """Hooks de latencia por ruta y la ruta /metrics (solo si están activadas)."""
+    if not ENABLED:
+        return app
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe(response):
+        t0 = g.pop('_metrics_t0', None)
+        if t0 is not None:
+            # El endpoint y no la URL: no crece con IDs de trabajos ni nombres de fichero
+            REQUEST_SECONDS.labels(request.endpoint or 'sin_ruta', request.method,
+                                   str(response.status_code)).observe(time.perf_counter() - t0)
+        return response
+
+    token = os.environ.get('METRICS_TOKEN')
+
+    @app.route('/metrics')
+    def metrics():
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return 'No autorizado', 401
+        body, content_type = render()
+        return app.response_class(body, mimetype=content_type.split(';')[0],
+                                  headers={'Content-Type': content_type, 'Cache-Control': 'no-store'})
+
+    return app
@@ -0,0 +1,231 @@
+"""
+Perfilado bajo demanda de peticiones (solo con PROFILING=1).
+
+  - Un admin añade ?_profile=1 (o la cabecera X-Profile: 1) a una petición:
+    se perfila con cProfile y se guarda un .prof (pstats).
+    Con ?_profile=flame se muestrea la pila del hilo cada PROFILE_INTERVAL_MS
+    y se guarda un .collapsed (pilas plegadas para flamegraph.pl o speedscope).
+  - PROFILE_SAMPLE=0.01 perfila además ese tanto por uno del tráfico normal.
+  - Los ficheros van a PROFILE_DIR (por defecto profiles/); se guardan los
+    PROFILE_KEEP más recientes. La respuesta lleva X-Profile con el nombre.
+
+Sin PROFILING=1 no se registra ningún hook: coste cero.
+Con gevent, el perfil de una petición incluye lo que hagan a la vez otros
+greenlets del mismo hilo (comparten pila de llamadas del sistema).
+"""
+import cProfile, importlib, os, random, re, sys, threading, time
+from collections import Counter
+
+from executors import gevent_patched
+
+ENABLED = os.environ.get('PROFILING', '') == '1'
+PROFILE_EXTS = ('.prof', '.collapsed')
+_NAME_RE = re.compile(r'^[\w.-]+$')
+
+
+def _native(module: str, name: str):
+    # Con gevent, threading.Thread y time.sleep son de greenlets; el muestreador necesita los reales
+    if gevent_patched():
+        from gevent import monkey
+        return monkey.get_original(module, name)
+    return getattr(importlib.import_module(module), name)
+
+
+class StackSampler:
+    """Muestrea la pila de un hilo desde otro hilo (nativo) y cuenta las pilas plegadas."""
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = False
+        self._thread = None
+
+    @staticmethod
+    def _label(code) -> str:
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _run(self):
+        sleep = _native('time', 'sleep')
+        while not self._stop:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                parts = []
+                while frame is not None:
+                    parts.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(parts))] += 1
+            sleep(self.interval)
+
+    def start(self):
+        self._thread = _native('threading', 'Thread')(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop = True
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+class RequestProfiler:
+    def __init__(self, directory: str = 'profiles', keep: int = 100, sample: float = 0.0,
+                 interval_ms: float = 1.0):
+        self.directory = directory
+        self.keep = keep
+        self.sample = sample
+        self.interval = interval_ms / 1000
+        self._lock = threading.Lock()
+
+    # --- Perfiles ---
+    def start(self, mode: str):
+        if mode == 'flame':
+            prof = StackSampler(_native('threading', 'get_ident')(), self.interval)
+            prof.start()
+        else:
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:
+                return None  # ya hay otro perfilador activo (Python 3.12+ solo admite uno)
+        return prof
+
+    def finish(self, prof, label: str, elapsed: float) -> str | None:
+        """Para el perfil y lo guarda. Devuelve el nombre del fichero."""
+        if prof is None:
+            return None
+        if isinstance(prof, StackSampler):
+            prof.stop()
+        else:
+            prof.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        label = re.sub(r'[^\w-]', '_', label)[:40]
+        base = f"{stamp}-{label}-{elapsed * 1000:.0f}ms-{os.urandom(3).hex()}"
+        if isinstance(prof, StackSampler):
+            name = base + '.collapsed'
+            with open(os.path.join(self.directory, name), 'w', encoding='utf-8') as f:
+                f.write(prof.collapsed())
+        else:
+            name = base + '.prof'
+            prof.dump_stats(os.path.join(self.directory, name))
+        self._prune()
+        return name
+
+    def wrap_task(self, label: str, mode: str):
+        """Envuelve task(control) para perfilar también un cálculo en segundo plano (p.ej. el sorteo)."""
+        def wrap(task):
+            def profiled(control):
+                prof, t0 = self.start(mode), time.perf_counter()
+                try:
+                    return task(control)
+                finally:
+                    self.finish(prof, label, time.perf_counter() - t0)
+            return profiled
+        return wrap
+
+    def _prune(self):
+        with self._lock:
+            files = self.list()
+            for info in files[self.keep:]:
+                try:
+                    os.remove(os.path.join(self.directory, info['name']))
+                except FileNotFoundError:
+                    pass
+
+    # --- Listado ---
+    def list(self) -> list[dict]:
+        """Perfiles guardados, del más reciente al más antiguo."""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(PROFILE_EXTS)]
+        except FileNotFoundError:
+            return []
+        out = []
+        for name in names:
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            m = re.match(r'^\d{8}-\d{6}-(.+)-(\d+)ms-[0-9a-f]+\.', name)
+            out.append({"name": name, "label": m.group(1) if m else '', "ms": int(m.group(2)) if m else None,
+                        "kind": 'flame' if name.endswith('.collapsed') else 'pstats',
+                        "bytes": st.st_size, "mtime": st.st_mtime})
+        out.sort(key=lambda i: i['mtime'], reverse=True)
+        return out
+
+    def path_of(self, name: str) -> str | None:
+        if not _NAME_RE.match(name) or not name.endswith(PROFILE_EXTS):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def summary(self, name: str, limit: int = 30) -> str | None:
+        """Texto legible del perfil: funciones con más tiempo acumulado o las pilas más frecuentes."""
+        path = self.path_of(name)
+        if path is None:
+            return None
+        if name.endswith('.collapsed'):
+            with open(path, encoding='utf-8') as f:
+                return ''.join(f.readlines()[:limit])
+        import io, pstats
+        buf = io.StringIO()
+        pstats.Stats(path, stream=buf).sort_stats('cumulative').print_stats(limit)
+        return buf.getvalue()
+
+
+def init_profiling(app, is_admin) -> RequestProfiler | None:
+    """
+    Registra los hooks si PROFILING=1. is_admin() dice si el usuario de la
+    sesión puede pedir un perfil. Devuelve el perfilador (o None).
+    """
+    if not ENABLED:
+        return None
+    from flask import g, request
+
+    profiler = RequestProfiler(directory=os.environ.get('PROFILE_DIR', 'profiles'),
+                               keep=int(os.environ.get('PROFILE_KEEP', '100')),
+                               sample=float(os.environ.get('PROFILE_SAMPLE', '0')),
+                               interval_ms=float(os.environ.get('PROFILE_INTERVAL_MS', '1')))
+
+    def _requested_mode() -> str | None:
+        flag = request.args.get('_profile') or request.headers.get('X-Profile')
+        if flag and is_admin():
+            return 'flame' if flag == 'flame' else 'pstats'
+        if profiler.sample and random.random() < profiler.sample:
+            return 'pstats'
+        return None
+
+    @app.before_request
+    def _profile_start():
+        mode = _requested_mode()
+        if mode:
+            g._profile = (profiler.start(mode), mode, time.perf_counter())
+
+    def _stop(suffix: str = '') -> str | None:
+        state = g.pop('_profile', None)
+        if state is None:
+            return None
+        prof, _, t0 = state
+        return profiler.finish(prof, f"{request.endpoint or 'sin_ruta'}{suffix}", time.perf_counter() - t0)
+
+    @app.after_request
+    def _profile_stop(response):
+        name = _stop()
+        if name:
+            response.headers['X-Profile'] = name
+        return response
+
+    @app.teardown_request
+    def _profile_teardown(exc):
+        # La vista lanzó una excepción: after_request no se ejecuta
+        _stop('-error')
+
+    return profiler
+
+
+def profile_mode() -> str | None:
+    """Modo del perfil de la petición en curso (None si no se está perfilando)."""
+    from flask import g
+    state = g.get('_profile')
+    return state[1] if state else None
@@ -0,0 +1,220 @@
+import json, os, threading, time
+
+import metrics
+from fileio import FileLock, atomic_write_bytes, atomic_write_json, read_json
+
+
+class TeamTakenError(Exception):
+    """El equipo ya está elegido por otro usuario."""
+
+
+class SelectionStore:
+    """
+    Selecciones de equipo en memoria con doble índice:
+      - by_user: usuario -> {user, equipo_id, timestamp}
+      - by_team: equipo_id -> mismo registro
+    El fichero solo se vuelve a leer si cambia su mtime/tamaño o la generación
+    de su .lock (otro proceso lo ha escrito). Las escrituras van directas a
+    disco (write-through) con el cerrojo entre procesos tomado y releen antes
+    de comprobar si el equipo está libre: con varios workers tampoco hay dos
+    dueños para un equipo.
+
+    Con journal=True cada elección se añade como una línea JSON (con fsync) a
+    '<path>.journal' en vez de reescribir todo el fichero. Al arrancar se
+    carga el snapshot (<path>) y se reproduce el journal encima. Cuando el
+    journal supera compact_bytes, un hilo en segundo plano vuelca el estado a
+    un snapshot nuevo y recorta el journal. Otros procesos leen las líneas
+    nuevas del journal y detectan la compactación por el cambio de inodo.
+    """
+
+    def __init__(self, path: str, journal: bool = False, compact_bytes: int = 1 << 20):
+        self.path = path
+        self.journal_path = f"{path}.journal" if journal else None
+        self.compact_bytes = compact_bytes
+        self._lock = threading.RLock()
+        self._flock = FileLock(path)
+        self._by_user: dict[str, dict] = {}
+        self._by_team: dict[str, dict] = {}
+        self._stamp = None
+        self._journal_offset = 0  # bytes del journal ya aplicados en memoria
+        self._journal_fd = None
+        self._compacting = False
+
+    # --- Carga / sincronización ---
+    @staticmethod
+    def _stat(path: str):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _file_stamp(self):
+        # Del journal solo cuenta el inodo: que crezca es normal, que cambie es que se compactó
+        journal = self._stat(self.journal_path) if self.journal_path else None
+        return self._stat(self.path), journal and journal[2], self._flock.generation()
+
+    def _apply(self, username: str, equipo_id: str, timestamp: str) -> dict:
+        it = self._by_user.get(username)
+        if it is not None:
+            old_id = str(it.get('equipo_id'))
+            if self._by_team.get(old_id) is it:
+                del self._by_team[old_id]
+            it['equipo_id'] = equipo_id
+            it['timestamp'] = timestamp
+        else:
+            it = {"user": username, "equipo_id": equipo_id, "timestamp": timestamp}
+            self._by_user[username] = it
+        self._by_team[equipo_id] = it
+        return it
+
+    def _index(self, items: list[dict]):
+        self._by_user = {}
+        self._by_team = {}
+        for it in items:
+            self._by_user[it.get('user')] = it
+            self._by_team[str(it.get('equipo_id'))] = it
+
+    def _replay_journal(self):
+        """Aplica las líneas completas del journal a partir de _journal_offset."""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                f.seek(self._journal_offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return
+        end = chunk.rfind(b'\n') + 1  # una línea a medias (escritura en curso o caída) se ignora
+        for line in chunk[:end].splitlines():
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            self._apply(rec['user'], str(rec['equipo_id']), rec.get('timestamp'))
+        self._journal_offset += end
+
+    def _refresh(self):
+        stamp = self._file_stamp()
+        if self._stamp is not None and stamp == self._stamp:
+            if self.journal_path:
+                self._replay_journal()
+            return
+        items = []
+        if stamp[0] is not None:
+            items = read_json(self.path)
+        self._index(items if isinstance(items, list) else [])
+        self._stamp = stamp
+        if self.journal_path:
+            if self._journal_fd is not None:
+                # Otro proceso compactó: el journal abierto ya no es el vigente
+                os.close(self._journal_fd)
+                self._journal_fd = None
+            self._journal_offset = 0
+            self._replay_journal()
+            # El journal puede solaparse con el snapshot: recalcula el índice inverso
+            self._by_team = {str(it['equipo_id']): it for it in self._by_user.values()}
+
+    def _snapshot(self) -> list[dict]:
+        return [dict(it) for it in self._by_user.values()]
+
+    def _write(self):
+        atomic_write_json(self.path, self._snapshot())
+        self._flock.bump()
+        self._stamp = self._file_stamp()
+
+    # --- Journal ---
+    def _append(self, it: dict):
+        if self._journal_fd is None:
+            self._truncate_partial_line()
+            self._journal_fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        line = (json.dumps(it, ensure_ascii=False) + '\n').encode('utf-8')
+        t0 = time.perf_counter() if metrics.ENABLED else 0.0
+        os.write(self._journal_fd, line)
+        os.fsync(self._journal_fd)
+        if metrics.ENABLED:
+            metrics.observe_file('write', self.journal_path, len(line), time.perf_counter() - t0)
+        self._journal_offset += len(line)
+        if self._journal_offset >= self.compact_bytes and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self._compact, name='selection-compact', daemon=True).start()
+
+    def _truncate_partial_line(self):
+        # Si una caída dejó una línea sin terminar, la quitamos antes de añadir más
+        try:
+            size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            return
+        if size > self._journal_offset:
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(self._journal_offset)
+
+    def _reset_journal(self, tail: bytes = b''):
+        if self._journal_fd is not None:
+            os.close(self._journal_fd)
+            self._journal_fd = None
+        atomic_write_bytes(self.journal_path, tail)
+        self._flock.bump()
+        self._journal_offset = len(tail)
+        self._stamp = self._file_stamp()
+
+    def _compact(self):
+        try:
+            # Todo con el cerrojo entre procesos: nadie puede añadir al journal viejo mientras
+            # se sustituye. Quien elija equipo espera lo que tarde en escribirse el snapshot.
+            with self._lock, self._flock:
+                self._refresh()
+                atomic_write_json(self.path, self._snapshot())
+                self._reset_journal()
+        finally:
+            self._compacting = False
+
+    def compact(self):
+        """Compacta el journal de forma síncrona (p.ej. antes de apagar)."""
+        if self.journal_path:
+            with self._lock:
+                self._compacting = True
+            self._compact()
+
+    # --- Lecturas O(1) (copias: quien llama no puede tocar el índice) ---
+    def by_user(self, username: str) -> dict | None:
+        with self._lock:
+            self._refresh()
+            it = self._by_user.get(username)
+            return dict(it) if it is not None else None
+
+    def by_team(self, equipo_id: str) -> dict | None:
+        with self._lock:
+            self._refresh()
+            it = self._by_team.get(str(equipo_id))
+            return dict(it) if it is not None else None
+
+    def items(self) -> list[dict]:
+        with self._lock:
+            self._refresh()
+            return self._snapshot()
+
+    def version(self):
+        """Cambia con cada escritura de cualquier proceso (para cachés derivadas)."""
+        journal = self._stat(self.journal_path) if self.journal_path else None
+        return self._stat(self.path), journal, self._flock.generation()
+
+    # --- Escrituras ---
+    def replace_all(self, items: list[dict]):
+        with self._lock, self._flock:
+            self._index([dict(it) for it in items])
+            self._write()
+            if self.journal_path:
+                self._reset_journal()
+
+    def set(self, username: str, equipo_id: str, timestamp: str):
+        """Asigna (o cambia) el equipo del usuario y lo persiste."""
+        with self._lock, self._flock:
+            self._refresh()
+            equipo_id = str(equipo_id)
+            owner = self._by_team.get(equipo_id)
+            if owner is not None and owner.get('user') != username:
+                raise TeamTakenError(equipo_id)
+            it = self._apply(username, equipo_id, timestamp)
+            if self.journal_path:
+                self._append(it)
+            else:
+                self._write()
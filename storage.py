@@ -0,0 +1,503 @@
+import json, os, sqlite3, threading
+
+from draw_history import DrawHistory
+from fileio import FileLock, atomic_write_json, read_json
+from selection_store import SelectionStore, TeamTakenError
+from user_directory import UserDirectory
+
+__all__ = ['Storage', 'JsonStorage', 'SqliteStorage', 'TeamTakenError', 'open_storage', 'migrate_json_to_sqlite']
+
+EMPTY_DRAW = {"done": False, "assignments": {}, "forbidden_pairs": []}
+
+
+class Storage:
+    """
+    Interfaz de almacenamiento: usuarios, selecciones de equipo, sorteo y
+    su histórico por años.
+    El orden de los usuarios importa: el primero es el administrador.
+    """
+
+    # --- Usuarios ---
+    def load_users(self) -> list[dict]:
+        raise NotImplementedError
+
+    def save_users(self, users: list[dict]):
+        raise NotImplementedError
+
+    def get_user(self, username: str) -> dict | None:
+        for u in self.load_users():
+            if u.get('username') == username:
+                return u
+        return None
+
+    def usernames(self) -> list[str]:
+        return [u['username'] for u in self.load_users()]
+
+    def admin_username(self) -> str | None:
+        users = self.load_users()
+        return users[0]['username'] if users else None
+
+    def update_users(self, fn) -> list[dict]:
+        """
+        Lee, modifica y guarda los usuarios sin que otro proceso escriba en medio.
+        fn(usuarios) devuelve la lista nueva (puede lanzar para no guardar nada).
+        """
+        users = fn(self.load_users())
+        self.save_users(users)
+        return users
+
+    def upsert_user(self, user: dict):
+        """Crea o actualiza un usuario (los nuevos van al final de la lista)."""
+        def apply(users):
+            for i, u in enumerate(users):
+                if u.get('username') == user['username']:
+                    users[i] = dict(user)
+                    break
+            else:
+                users.append(dict(user))
+            return users
+        self.update_users(apply)
+
+    def delete_user(self, username: str) -> bool:
+        found = []
+
+        def apply(users):
+            kept = [u for u in users if u.get('username') != username]
+            found.append(len(kept) != len(users))
+            return kept
+        self.update_users(apply)
+        return found[0]
+
+    # --- Selecciones ---
+    def selections(self) -> list[dict]:
+        raise NotImplementedError
+
+    def replace_selections(self, items: list[dict]):
+        raise NotImplementedError
+
+    def selection_by_user(self, username: str) -> dict | None:
+        raise NotImplementedError
+
+    def selection_by_team(self, equipo_id: str) -> dict | None:
+        raise NotImplementedError
+
+    def set_selection(self, username: str, equipo_id: str, timestamp: str):
+        """Guarda el equipo del usuario. Lanza TeamTakenError si ya es de otro."""
+        raise NotImplementedError
+
+    def selections_version(self):
+        """Valor que cambia cuando cualquier proceso modifica las selecciones."""
+        raise NotImplementedError
+
+    # --- Sorteo ---
+    def load_draw(self) -> dict:
+        raise NotImplementedError
+
+    def save_draw(self, state: dict):
+        raise NotImplementedError
+
+    def update_draw(self, fn) -> dict:
+        """Como update_users, para el estado del sorteo: fn(estado) devuelve el nuevo."""
+        state = fn(self.load_draw())
+        self.save_draw(state)
+        return state
+
+    def draw_version(self):
+        """Valor que cambia cuando cualquier proceso guarda el sorteo."""
+        raise NotImplementedError
+
+    # --- Histórico de sorteos ---
+    def record_draw(self, year: int, assignments: dict[str, str] | None):
+        """Guarda el sorteo de 'year' en el histórico (sustituye al de ese año; None lo olvida)."""
+        raise NotImplementedError
+
+    def history_years(self) -> list[int]:
+        raise NotImplementedError
+
+    def history_assignments(self, year: int) -> dict[str, str] | None:
+        """Sorteo guardado de ese año (None si no hay)."""
+        raise NotImplementedError
+
+    def draw_history(self, giver: str | None = None, receiver: str | None = None,
+                     since_year: int | None = None) -> list[dict]:
+        """Asignaciones pasadas [{year, giver, receiver}], de la más reciente a la más antigua."""
+        raise NotImplementedError
+
+    def history_exclusions(self, years: int, current_year: int) -> dict[str, set[str]]:
+        """giver -> receptores que ya le tocaron en los 'years' años anteriores a current_year."""
+        raise NotImplementedError
+
+
+class JsonStorage(Storage):
+    """
+    Backend original: users.json, selected_teams.json y draw.json, más el
+    histórico draw_history.jsonl (por defecto junto a draw.json).
+    """
+
+    def __init__(self, users_file='users.json', selections_file='selected_teams.json', draw_file='draw.json',
+                 create_missing=True, journal=False, compact_bytes=1 << 20, history_file=None):
+        self.users_file = users_file
+        self.selections_file = selections_file
+        self.draw_file = draw_file
+        self.history_file = history_file or os.path.join(os.path.dirname(draw_file), 'draw_history.jsonl')
+        if create_missing:
+            for path, empty in ((users_file, []), (selections_file, []), (draw_file, EMPTY_DRAW)):
+                if not os.path.exists(path):
+                    atomic_write_json(path, empty)
+        self._users = UserDirectory(users_file)
+        self._selections = SelectionStore(selections_file, journal=journal, compact_bytes=compact_bytes)
+        self._draw_lock = threading.RLock()
+        self._draw_flock = FileLock(draw_file)
+        self._history = DrawHistory(self.history_file)
+
+    def load_users(self):
+        return self._users.users()
+
+    def save_users(self, users):
+        self._users.replace_all(users)
+
+    def update_users(self, fn):
+        return self._users.update(fn)
+
+    def get_user(self, username):
+        return self._users.get(username)
+
+    def upsert_user(self, user):
+        self._users.upsert(user)
+
+    def usernames(self):
+        return self._users.usernames()
+
+    def admin_username(self):
+        return self._users.admin()
+
+    def selections(self):
+        return self._selections.items()
+
+    def replace_selections(self, items):
+        self._selections.replace_all(items)
+
+    def selection_by_user(self, username):
+        return self._selections.by_user(username)
+
+    def selection_by_team(self, equipo_id):
+        return self._selections.by_team(equipo_id)
+
+    def set_selection(self, username, equipo_id, timestamp):
+        self._selections.set(username, equipo_id, timestamp)
+
+    def selections_version(self):
+        return self._selections.version()
+
+    def load_draw(self):
+        if not os.path.exists(self.draw_file):
+            return json.loads(json.dumps(EMPTY_DRAW))
+        return read_json(self.draw_file)
+
+    def save_draw(self, state):
+        with self._draw_lock, self._draw_flock:
+            atomic_write_json(self.draw_file, state)
+            self._draw_flock.bump()
+
+    def update_draw(self, fn):
+        with self._draw_lock, self._draw_flock:
+            state = fn(self.load_draw())
+            self.save_draw(state)
+            return state
+
+    def draw_version(self):
+        try:
+            st = os.stat(self.draw_file)
+            stamp = st.st_mtime_ns, st.st_size, st.st_ino
+        except FileNotFoundError:
+            stamp = None
+        with self._draw_lock:
+            return stamp, self._draw_flock.generation()
+
+    def record_draw(self, year, assignments):
+        self._history.record(year, assignments)
+
+    def history_years(self):
+        return self._history.years()
+
+    def history_assignments(self, year):
+        return self._history.assignments(year)
+
+    def draw_history(self, giver=None, receiver=None, since_year=None):
+        return self._history.query(giver, receiver, since_year)
+
+    def history_exclusions(self, years, current_year):
+        return self._history.exclusions(years, current_year)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    position             INTEGER PRIMARY KEY AUTOINCREMENT,
+    username             TEXT NOT NULL UNIQUE,
+    password_hash        TEXT NOT NULL,
+    last_password_change TEXT
+);
+CREATE TABLE IF NOT EXISTS selections (
+    user      TEXT PRIMARY KEY,
+    equipo_id TEXT NOT NULL UNIQUE,
+    timestamp TEXT
+);
+CREATE TABLE IF NOT EXISTS draw_state (
+    id              INTEGER PRIMARY KEY CHECK (id = 1),
+    done            INTEGER NOT NULL DEFAULT 0,
+    forbidden_pairs TEXT NOT NULL DEFAULT '[]'
+);
+CREATE TABLE IF NOT EXISTS draw_assignments (
+    giver    TEXT PRIMARY KEY,
+    receiver TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_draw_assignments_receiver ON draw_assignments(receiver);
+INSERT OR IGNORE INTO draw_state (id, done, forbidden_pairs) VALUES (1, 0, '[]');
+-- Histórico: registro de solo añadir y, aparte, la versión vigente de cada año indexada
+CREATE TABLE IF NOT EXISTS draw_history_log (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+    year        INTEGER NOT NULL,
+    recorded_at TEXT NOT NULL,
+    assignments TEXT
+);
+CREATE TABLE IF NOT EXISTS draw_history (
+    year     INTEGER NOT NULL,
+    giver    TEXT NOT NULL,
+    receiver TEXT NOT NULL,
+    PRIMARY KEY (giver, year)
+);
+CREATE INDEX IF NOT EXISTS idx_draw_history_receiver ON draw_history(receiver, year);
+CREATE INDEX IF NOT EXISTS idx_draw_history_year ON draw_history(year);
+-- Contadores de cambios (selections_version / draw_version), al día con triggers
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    n    INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO versions (name, n) VALUES ('selections', 0), ('draw', 0);
+CREATE TRIGGER IF NOT EXISTS selections_v_ins AFTER INSERT ON selections
+    BEGIN UPDATE versions SET n = n + 1 WHERE name = 'selections'; END;
+CREATE TRIGGER IF NOT EXISTS selections_v_upd AFTER UPDATE ON selections
+    BEGIN UPDATE versions SET n = n + 1 WHERE name = 'selections'; END;
+CREATE TRIGGER IF NOT EXISTS selections_v_del AFTER DELETE ON selections
+    BEGIN UPDATE versions SET n = n + 1 WHERE name = 'selections'; END;
+CREATE TRIGGER IF NOT EXISTS draw_v_upd AFTER UPDATE ON draw_state
+    BEGIN UPDATE versions SET n = n + 1 WHERE name = 'draw'; END;
+"""
+
+
+class SqliteStorage(Storage):
+    """
+    Backend SQLite (modo WAL). Una conexión por hilo; varias instancias o
+    procesos pueden compartir el mismo fichero. La restricción UNIQUE sobre
+    selections.equipo_id impide que dos usuarios reclamen el mismo equipo.
+    """
+
+    def __init__(self, path='santa.db'):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # --- Usuarios ---
+    @staticmethod
+    def _user_row(row) -> dict:
+        u = {"username": row['username'], "password_hash": row['password_hash']}
+        if row['last_password_change']:
+            u['last_password_change'] = row['last_password_change']
+        return u
+
+    def load_users(self):
+        rows = self._conn().execute('SELECT * FROM users ORDER BY position').fetchall()
+        return [self._user_row(r) for r in rows]
+
+    @staticmethod
+    def _write_users(conn, users):
+        conn.execute('DELETE FROM users')
+        conn.executemany(
+            'INSERT INTO users (username, password_hash, last_password_change) VALUES (?, ?, ?)',
+            [(u['username'], u.get('password_hash', ''), u.get('last_password_change')) for u in users])
+
+    def save_users(self, users):
+        with self._conn() as conn:
+            self._write_users(conn, users)
+
+    def update_users(self, fn):
+        with self._conn() as conn:
+            conn.execute('BEGIN IMMEDIATE')  # otros escritores esperan desde la lectura
+            users = fn(self.load_users())
+            self._write_users(conn, users)
+        return users
+
+    def get_user(self, username):
+        row = self._conn().execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+        return self._user_row(row) if row else None
+
+    def usernames(self):
+        return [r[0] for r in self._conn().execute('SELECT username FROM users ORDER BY position')]
+
+    def admin_username(self):
+        row = self._conn().execute('SELECT username FROM users ORDER BY position LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def upsert_user(self, user):
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT INTO users (username, password_hash, last_password_change) VALUES (?, ?, ?) '
+                'ON CONFLICT(username) DO UPDATE SET password_hash = excluded.password_hash, '
+                'last_password_change = excluded.last_password_change',
+                (user['username'], user.get('password_hash', ''), user.get('last_password_change')))
+
+    def delete_user(self, username):
+        with self._conn() as conn:
+            return conn.execute('DELETE FROM users WHERE username = ?', (username,)).rowcount > 0
+
+    # --- Selecciones ---
+    def selections(self):
+        rows = self._conn().execute('SELECT user, equipo_id, timestamp FROM selections ORDER BY rowid').fetchall()
+        return [dict(r) for r in rows]
+
+    def replace_selections(self, items):
+        with self._conn() as conn:
+            conn.execute('DELETE FROM selections')
+            conn.executemany('INSERT INTO selections (user, equipo_id, timestamp) VALUES (?, ?, ?)',
+                             [(it['user'], str(it['equipo_id']), it.get('timestamp')) for it in items])
+
+    def selection_by_user(self, username):
+        row = self._conn().execute('SELECT user, equipo_id, timestamp FROM selections WHERE user = ?',
+                                   (username,)).fetchone()
+        return dict(row) if row else None
+
+    def selection_by_team(self, equipo_id):
+        row = self._conn().execute('SELECT user, equipo_id, timestamp FROM selections WHERE equipo_id = ?',
+                                   (str(equipo_id),)).fetchone()
+        return dict(row) if row else None
+
+    def set_selection(self, username, equipo_id, timestamp):
+        try:
+            with self._conn() as conn:
+                conn.execute(
+                    'INSERT INTO selections (user, equipo_id, timestamp) VALUES (?, ?, ?) '
+                    'ON CONFLICT(user) DO UPDATE SET equipo_id = excluded.equipo_id, timestamp = excluded.timestamp',
+                    (username, str(equipo_id), timestamp))
+        except sqlite3.IntegrityError:
+            raise TeamTakenError(equipo_id)
+
+    def _version(self, name: str) -> int:
+        return self._conn().execute('SELECT n FROM versions WHERE name = ?', (name,)).fetchone()[0]
+
+    def selections_version(self):
+        return self._version('selections')
+
+    # --- Sorteo ---
+    def load_draw(self):
+        conn = self._conn()
+        row = conn.execute('SELECT done, forbidden_pairs FROM draw_state WHERE id = 1').fetchone()
+        assignments = {r['giver']: r['receiver'] for r in conn.execute('SELECT giver, receiver FROM draw_assignments')}
+        return {"done": bool(row['done']), "assignments": assignments,
+                "forbidden_pairs": json.loads(row['forbidden_pairs'])}
+
+    @staticmethod
+    def _write_draw(conn, state):
+        conn.execute('UPDATE draw_state SET done = ?, forbidden_pairs = ? WHERE id = 1',
+                     (int(bool(state.get('done'))), json.dumps(state.get('forbidden_pairs', []), ensure_ascii=False)))
+        conn.execute('DELETE FROM draw_assignments')
+        conn.executemany('INSERT INTO draw_assignments (giver, receiver) VALUES (?, ?)',
+                         list(state.get('assignments', {}).items()))
+
+    def save_draw(self, state):
+        with self._conn() as conn:
+            self._write_draw(conn, state)
+
+    def update_draw(self, fn):
+        with self._conn() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            state = fn(self.load_draw())
+            self._write_draw(conn, state)
+        return state
+
+    def draw_version(self):
+        return self._version('draw')
+
+    # --- Histórico de sorteos ---
+    def record_draw(self, year, assignments):
+        with self._conn() as conn:
+            conn.execute('INSERT INTO draw_history_log (year, recorded_at, assignments) '
+                         "VALUES (?, strftime('%Y-%m-%dT%H:%M:%SZ', 'now'), ?)",
+                         (int(year), json.dumps(assignments, ensure_ascii=False) if assignments else None))
+            conn.execute('DELETE FROM draw_history WHERE year = ?', (int(year),))
+            conn.executemany('INSERT INTO draw_history (year, giver, receiver) VALUES (?, ?, ?)',
+                             [(int(year), g, r) for g, r in (assignments or {}).items()])
+
+    def history_years(self):
+        return [r[0] for r in self._conn().execute('SELECT DISTINCT year FROM draw_history ORDER BY year')]
+
+    def history_assignments(self, year):
+        rows = self._conn().execute('SELECT giver, receiver FROM draw_history WHERE year = ?', (int(year),))
+        return {g: r for g, r in rows} or None
+
+    def draw_history(self, giver=None, receiver=None, since_year=None):
+        where, args = [], []
+        for col, value in (('giver', giver), ('receiver', receiver)):
+            if value is not None:
+                where.append(f'{col} = ?')
+                args.append(value)
+        if since_year is not None:
+            where.append('year >= ?')
+            args.append(int(since_year))
+        sql = 'SELECT year, giver, receiver FROM draw_history'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return [dict(r) for r in self._conn().execute(sql + ' ORDER BY year DESC, giver', args)]
+
+    def history_exclusions(self, years, current_year):
+        out: dict[str, set[str]] = {}
+        rows = self._conn().execute('SELECT giver, receiver FROM draw_history WHERE year >= ? AND year < ?',
+                                    (current_year - years, current_year))
+        for g, r in rows:
+            out.setdefault(g, set()).add(r)
+        return out
+
+
+def open_storage(backend: str | None = None, **kwargs) -> Storage:
+    """
+    Crea el backend indicado (o el de STORAGE_BACKEND: 'json' por defecto, o 'sqlite').
+    Para SQLite la ruta sale de DATABASE_PATH (por defecto santa.db).
+    Con JSON, SELECTIONS_JOURNAL=1 activa el journal de selecciones y
+    JOURNAL_COMPACT_BYTES fija el tamaño a partir del cual se compacta.
+    """
+    backend = (backend or os.environ.get('STORAGE_BACKEND') or 'json').lower()
+    if backend == 'sqlite':
+        return SqliteStorage(kwargs.get('path') or os.environ.get('DATABASE_PATH', 'santa.db'))
+    if backend == 'json':
+        kwargs.setdefault('journal', os.environ.get('SELECTIONS_JOURNAL', '0') == '1')
+        kwargs.setdefault('compact_bytes', int(os.environ.get('JOURNAL_COMPACT_BYTES', 1 << 20)))
+        return JsonStorage(**{k: v for k, v in kwargs.items() if k != 'path'})
+    raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
+
+
+def migrate_json_to_sqlite(db_path: str, users_file='users.json',
+                           selections_file='selected_teams.json', draw_file='draw.json') -> dict:
+    """Importa de una vez los JSON existentes (y el histórico) a la base de datos SQLite. Devuelve recuentos."""
+    # Con journal, las últimas elecciones solo están en '<selecciones>.journal' hasta que se compacta
+    journal = os.environ.get('SELECTIONS_JOURNAL') == '1' or os.path.exists(f"{selections_file}.journal")
+    src = JsonStorage(users_file, selections_file, draw_file, create_missing=False, journal=journal)
+    dst = SqliteStorage(db_path)
+    users = src.load_users()
+    items = src.selections()
+    dst.save_users(users)
+    dst.replace_selections(items)
+    dst.save_draw(src.load_draw())
+    years = src.history_years()
+    for year in years:
+        dst.record_draw(year, src.history_assignments(year))
+    return {"users": len(users), "selections": len(items), "history_years": len(years)}
@@ -0,0 +1,119 @@
+import base64, threading, time
+from collections import deque
+
+
+class TakenTeams:
+    """
+    Equipos ocupados de un grupo como bitset sobre el orden del catálogo
+    (bit i = equipo en la posición i; byte i >> 3, máscara 1 << (i & 7)).
+
+    Se mantiene con cada escritura de selección (update) y no releyendo
+    las selecciones. Cada cambio sube la versión ('<época>-<n>') y queda en
+    un log acotado, así un cliente puede pedir solo lo que cambió desde su
+    versión (delta). La época cambia al reiniciar el proceso.
+    """
+
+    def __init__(self, catalog, selections: list[dict], log_size: int = 2048):
+        self._catalog = catalog
+        self._bits = bytearray((len(catalog) + 7) // 8)
+        self._lock = threading.Lock()
+        self._epoch = format(time.time_ns() // 1000, 'x')
+        self._seq = 0
+        self._log: deque[tuple[int, int, bool]] = deque(maxlen=log_size)  # (versión, posición, ocupado)
+        self._floor = 0  # versión más antigua desde la que aún se puede dar un delta completo
+        for it in selections:
+            pos = self._pos(it.get('equipo_id'))
+            if pos is not None:
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def _pos(self, equipo_id) -> int | None:
+        rec = self._catalog.get(equipo_id) if equipo_id is not None else None
+        return rec.pos if rec else None
+
+    def _version(self, seq: int) -> str:
+        return f"{self._epoch}-{seq}"
+
+    def _set(self, pos: int, taken: bool) -> bool:
+        byte, mask = pos >> 3, 1 << (pos & 7)
+        if bool(self._bits[byte] & mask) == taken:
+            return False
+        self._bits[byte] ^= mask
+        if len(self._log) == self._log.maxlen:
+            # Se descarta la entrada más antigua: su versión puede quedar a medias
+            self._floor = self._log[0][0]
+        self._log.append((self._seq + 1, pos, taken))
+        return True
+
+    def _commit(self, changed: bool) -> tuple[str, str]:
+        prev = self._version(self._seq)
+        if changed:
+            self._seq += 1
+        return prev, self._version(self._seq)
+
+    def update(self, taken_id: str | None, released_id: str | None) -> tuple[str, str]:
+        """Marca taken_id como ocupado y libera released_id. Devuelve (versión anterior, versión nueva)."""
+        if released_id == taken_id:
+            released_id = None
+        with self._lock:
+            changed = False
+            for equipo_id, taken in ((released_id, False), (taken_id, True)):
+                pos = self._pos(equipo_id)
+                if pos is not None:
+                    changed |= self._set(pos, taken)
+            return self._commit(changed)
+
+    def reload(self, selections: list[dict]) -> tuple[str, str]:
+        """Sustituye todas las selecciones; las diferencias quedan en el log como cambios normales."""
+        wanted = {self._pos(it.get('equipo_id')) for it in selections} - {None}
+        with self._lock:
+            changed = False
+            for pos in range(len(self._catalog)):
+                changed |= self._set(pos, pos in wanted)
+            return self._commit(changed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "version": self._version(self._seq),
+                "size": len(self._catalog),
+                "bits": base64.b64encode(self._bits).decode('ascii'),
+            }
+
+    def delta(self, since: str) -> dict | None:
+        """
+        Cambios desde la versión 'since': {'version', 'taken': [pos], 'released': [pos]}.
+        None si esa versión no es de este proceso o ya no está en el log (hay que pedir el bitset).
+        """
+        epoch, _, n = (since or '').partition('-')
+        if epoch != self._epoch or not n.isdigit():
+            return None
+        since_seq = int(n)
+        with self._lock:
+            if not self._floor <= since_seq <= self._seq:
+                return None
+            final: dict[int, bool] = {}
+            for seq, pos, taken in self._log:
+                if seq > since_seq:
+                    final[pos] = taken
+            version = self._version(self._seq)
+        return {
+            "version": version,
+            "taken": sorted(p for p, t in final.items() if t),
+            "released": sorted(p for p, t in final.items() if not t),
+        }
+
+
+class TakenTeamsRegistry:
+    """Un TakenTeams por grupo, creado la primera vez que se pide (a partir de sus selecciones)."""
+
+    def __init__(self, catalog):
+        self._catalog = catalog
+        self._lock = threading.Lock()
+        self._groups: dict[str, TakenTeams] = {}
+
+    def get(self, group: str, load_selections) -> TakenTeams:
+        with self._lock:
+            taken = self._groups.get(group)
+            if taken is None:
+                taken = self._groups[group] = TakenTeams(self._catalog, load_selections())
+            return taken
@@ -0,0 +1,63 @@
+import json, os
+
+
+class TeamRecord:
+    """Equipo del catálogo. Usa __slots__ para no arrastrar un dict por registro."""
+
+    __slots__ = ('id', 'name', 'short_name', 'pos')
+
+    def __init__(self, id: str, name: str, short_name: str, pos: int):
+        self.id = id
+        self.name = name
+        self.short_name = short_name
+        self.pos = pos  # posición en el orden del catálogo
+
+    def __repr__(self):
+        return f"TeamRecord({self.id!r}, {self.name!r})"
+
+
+class TeamCatalog:
+    """
+    Catálogo de equipos (clubs + selecciones) construido una vez.
+      - records: lista en el orden original (clubs y después selecciones)
+      - by_id:   ID -> TeamRecord
+      - by_name: nombre -> ID
+    """
+
+    def __init__(self, records: list[TeamRecord], version: str = ''):
+        self.records = records
+        self.version = version  # cambia si cambia el fichero de origen (para cachés)
+        self.by_id: dict[str, TeamRecord] = {r.id: r for r in records}
+        self.by_name: dict[str, str] = {}
+        for r in records:
+            # Si hay nombres repetidos gana el primero (igual que el recorrido lineal)
+            self.by_name.setdefault(r.name, r.id)
+
+    @classmethod
+    def from_soccerwiki(cls, path: str) -> 'TeamCatalog':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        records: list[TeamRecord] = []
+        for club in data.get('ClubData', []):
+            records.append(TeamRecord(str(club['ID']), club['Name'], club.get('ShortName') or '', len(records)))
+        for nation in data.get('InternationalData', []):
+            records.append(TeamRecord(str(nation['ID']), f"Selección: {nation['Name']}",
+                                      nation.get('ShortName') or '', len(records)))
+        st = os.stat(path)
+        return cls(records, version=f"{st.st_size}-{st.st_mtime_ns}")
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def get(self, equipo_id) -> TeamRecord | None:
+        return self.by_id.get(str(equipo_id))
+
+    def name_of(self, equipo_id) -> str:
+        rec = self.by_id.get(str(equipo_id))
+        return rec.name if rec else str(equipo_id)  # fallback
+
+    def id_of(self, name: str) -> str | None:
+        return self.by_name.get(name)
@@ -0,0 +1,148 @@
+import unicodedata
+
+
+def fold(text: str) -> str:
+    """Quita tildes y pasa a minúsculas (igual que removeDiacritics() en el front)."""
+    text = unicodedata.normalize('NFD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def _tokens(text: str) -> list[str]:
+    out, cur = [], []
+    for c in text:
+        if c.isalnum():
+            cur.append(c)
+        elif cur:
+            out.append(''.join(cur))
+            cur = []
+    if cur:
+        out.append(''.join(cur))
+    return out
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TeamSearchIndex:
+    """
+    Índice de búsqueda de equipos construido una sola vez al arrancar.
+      - nombres y nombres cortos normalizados (sin tildes, minúsculas)
+      - posting lists por prefijo de palabra (hasta MAX_PREFIX caracteres)
+      - posting lists por trigramas para búsquedas de subcadena
+    Las posting lists son listas de posiciones del catálogo ordenadas.
+    """
+
+    MAX_PREFIX = 4
+
+    def __init__(self, teams):
+        self.teams = list(teams)
+        self._names: list[str] = []
+        self._short: list[str] = []
+        self._toks: list[tuple[str, ...]] = []
+        self._prefix: dict[str, list[int]] = {}
+        self._grams: dict[str, list[int]] = {}
+        self._exact: dict[str, list[int]] = {}  # nombres/nombres cortos de 1-2 letras
+
+        for i, t in enumerate(self.teams):
+            name = fold(t.name)
+            short = fold(t.short_name)
+            self._names.append(name)
+            self._short.append(short)
+            toks = tuple(_tokens(name)) + ((short,) if short else ())
+            self._toks.append(toks)
+
+            prefixes = set()
+            for tok in toks:
+                for n in range(1, min(len(tok), self.MAX_PREFIX) + 1):
+                    prefixes.add(tok[:n])
+            for p in prefixes:
+                self._prefix.setdefault(p, []).append(i)
+            for g in _trigrams(name) | _trigrams(short):
+                self._grams.setdefault(g, []).append(i)
+            for s in {name, short}:
+                if 0 < len(s) < 3:
+                    self._exact.setdefault(s, []).append(i)
+
+        # Prefijos ya ordenados por relevancia: las búsquedas cortas (las más
+        # frecuentes mientras se teclea) no necesitan reordenar nada
+        for p, posting in self._prefix.items():
+            posting.sort(key=lambda i: (not self._names[i].startswith(p), len(self._names[i]), i))
+
+    @classmethod
+    def for_catalog(cls, catalog) -> 'TeamSearchIndex':
+        """
+        Con un catálogo compilado (compiled_catalog.py) reutiliza sus tablas ya
+        construidas en vez de recalcular el índice al arrancar.
+        """
+        tables = getattr(catalog, 'search_tables', None)
+        if tables is None:
+            return cls(catalog)
+        idx = cls.__new__(cls)
+        t = tables()
+        idx.teams = catalog
+        idx._names, idx._short, idx._toks = t['names'], t['short'], t['toks']
+        idx._prefix, idx._grams, idx._exact = t['prefix'], t['grams'], t['exact']
+        return idx
+
+    def __len__(self):
+        return len(self.teams)
+
+    def _candidates(self, word: str) -> set[int]:
+        """Posiciones del catálogo que contienen la palabra buscada."""
+        if len(word) < 3:
+            return set(self._prefix.get(word, ()))
+        lists = []
+        for g in _trigrams(word):
+            posting = self._grams.get(g)
+            if not posting:
+                return set()
+            lists.append(posting)
+        lists.sort(key=len)
+        cands = set(lists[0])
+        for posting in lists[1:]:
+            cands.intersection_update(posting)
+            if not cands:
+                break
+        # Los trigramas solo filtran: confirma que la palabra aparece de verdad
+        return {i for i in cands if word in self._names[i] or word in self._short[i]}
+
+    def _rank(self, i: int, query: str, words: list[str]) -> tuple:
+        name = self._names[i]
+        if name == query or self._short[i] == query:
+            tier = 0
+        elif name.startswith(query):
+            tier = 1
+        elif all(any(tok.startswith(w) for tok in self._toks[i]) for w in words):
+            tier = 2
+        else:
+            tier = 3
+        return tier, len(name), i
+
+    def search(self, q: str, limit: int = 20, offset: int = 0) -> tuple[list, int]:
+        """
+        Devuelve (página de equipos, total de coincidencias).
+        Sin búsqueda se devuelve el catálogo en su orden original.
+        """
+        query = ' '.join(_tokens(fold(q)))
+        if not query:
+            return self.teams[offset:offset + limit], len(self.teams)
+
+        if len(query) < 3:
+            posting = self._prefix.get(query, [])
+            exact_ids = set(self._exact.get(query, ()))
+            exact = [i for i in posting if i in exact_ids] if exact_ids else []
+            ranked = exact + [i for i in posting if i not in exact_ids] if exact else posting
+            return [self.teams[i] for i in ranked[offset:offset + limit]], len(ranked)
+
+        words = sorted(set(query.split()), key=len, reverse=True)
+        matches: set[int] | None = None
+        for w in words:
+            cands = self._candidates(w)
+            matches = cands if matches is None else matches & cands
+            if not matches:
+                return [], 0
+
+        ranked = sorted(matches, key=lambda i: self._rank(i, query, words))
+        page = [self.teams[i] for i in ranked[offset:offset + limit]]
+        return page, len(ranked)
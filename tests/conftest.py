@@ -0,0 +1,4 @@
+import os, sys
+
+# Los módulos de la app están en la raíz del repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
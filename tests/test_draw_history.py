@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from draw_history import DrawHistory
+from groups import repair_stored_draw
+from storage import JsonStorage, SqliteStorage
+
+Y2024 = {'a': 'b', 'b': 'c', 'c': 'a'}
+Y2025 = {'a': 'c', 'c': 'b', 'b': 'a'}
+
+
+@pytest.fixture
+def history(tmp_path):
+    h = DrawHistory(str(tmp_path / 'draw_history.jsonl'))
+    h.record(2024, Y2024)
+    h.record(2025, Y2025)
+    return h
+
+
+def test_record_and_query_indexes(history):
+    assert history.years() == [2024, 2025]
+    assert history.assignments(2024) == Y2024
+    assert history.query(giver='a') == [{"year": 2025, "giver": 'a', "receiver": 'c'},
+                                        {"year": 2024, "giver": 'a', "receiver": 'b'}]
+    assert history.query(receiver='a') == [{"year": 2025, "giver": 'b', "receiver": 'a'},
+                                           {"year": 2024, "giver": 'c', "receiver": 'a'}]
+    assert history.query(giver='a', receiver='b') == [{"year": 2024, "giver": 'a', "receiver": 'b'}]
+    assert len(history.query(since_year=2025)) == 3
+
+
+def test_exclusions_cover_previous_years_only(history):
+    assert history.exclusions(1, 2026) == {'a': {'c'}, 'c': {'b'}, 'b': {'a'}}
+    assert history.exclusions(2, 2026) == {'a': {'b', 'c'}, 'b': {'a', 'c'}, 'c': {'a', 'b'}}
+    assert history.exclusions(1, 2025) == {'a': {'b'}, 'b': {'c'}, 'c': {'a'}}  # el año en curso no cuenta
+    assert history.exclusions(0, 2026) == {}
+
+
+def test_same_year_supersedes_and_none_forgets(history, tmp_path):
+    history.record(2025, {'a': 'b', 'b': 'c', 'c': 'a'})
+    assert history.query(giver='a', since_year=2025) == [{"year": 2025, "giver": 'a', "receiver": 'b'}]
+    history.record(2025, None)
+    assert history.years() == [2024]
+    assert history.query(receiver='b') == [{"year": 2024, "giver": 'a', "receiver": 'b'}]
+    assert history.exclusions(1, 2026) == {}
+    # Solo se añade: las cuatro líneas siguen en el fichero
+    assert len((tmp_path / 'draw_history.jsonl').read_text().splitlines()) == 4
+    assert DrawHistory(str(tmp_path / 'draw_history.jsonl')).years() == [2024]
+
+
+def test_other_instance_reads_only_new_lines(history, tmp_path):
+    other = DrawHistory(str(tmp_path / 'draw_history.jsonl'))
+    assert other.years() == [2024, 2025]
+    history.record(2026, {'a': 'b', 'b': 'c', 'c': 'a'})
+    assert other.years() == [2024, 2025, 2026]
+    assert other.exclusions(1, 2027) == {'a': {'b'}, 'b': {'c'}, 'c': {'a'}}
+
+
+def test_torn_line_is_ignored_then_truncated(history, tmp_path):
+    path = tmp_path / 'draw_history.jsonl'
+    with open(path, 'ab') as f:
+        f.write(b'{"year": 2026, "assignments": {"a"')  # caída a mitad de línea
+    fresh = DrawHistory(str(path))
+    assert fresh.years() == [2024, 2025]
+    fresh.record(2026, {'a': 'b', 'b': 'c', 'c': 'a'})
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)['year'] for line in lines] == [2024, 2025, 2026]
+    assert DrawHistory(str(path)).years() == [2024, 2025, 2026]
+
+
+def _storages(tmp_path):
+    js = JsonStorage(str(tmp_path / 'users.json'), str(tmp_path / 'selected_teams.json'),
+                     str(tmp_path / 'draw.json'))
+    return [js, SqliteStorage(str(tmp_path / 'santa.db'))]
+
+
+def test_backends_agree(tmp_path):
+    for st in _storages(tmp_path):
+        st.record_draw(2024, Y2024)
+        st.record_draw(2025, Y2025)
+        st.record_draw(2023, {'x': 'y'})
+        st.record_draw(2023, None)
+        assert st.history_years() == [2024, 2025]
+        assert st.history_assignments(2024) == Y2024
+        assert st.history_assignments(2023) is None
+        assert st.draw_history(giver='a')[0] == {"year": 2025, "giver": 'a', "receiver": 'c'}
+        assert st.history_exclusions(2, 2026) == {'a': {'b', 'c'}, 'b': {'a', 'c'}, 'c': {'a', 'b'}}
+
+
+def test_repair_updates_this_years_entry(tmp_path):
+    st = _storages(tmp_path)[0]
+    users = ['a', 'b', 'c', 'd']
+    draw = {'a': 'b', 'b': 'c', 'c': 'd', 'd': 'a'}
+    st.save_users([{"username": u, "password_hash": 'x'} for u in users + ['e']])
+    st.save_draw({"done": True, "assignments": draw, "forbidden_pairs": []})
+    st.record_draw(2024, {'e': 'd', 'd': 'e'})
+    st.record_draw(2025, draw)
+
+    result = repair_stored_draw(st, exclude_years=1)
+    assert result['method'] == 'empalme' and result['added'] == ['e']
+    assert result['assignments']['e'] != 'd'  # ya le tocó en 2024
+    assert st.history_assignments(2025) == result['assignments'] == st.load_draw()['assignments']
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+import draw_jobs
+from draw_jobs import DrawJobBusy, DrawJobManager
+
+
+def wait_for(manager, job_id, statuses=('done', 'failed', 'cancelled'), timeout=10):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        job = manager.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"el trabajo sigue en {manager.get(job_id)['status']}")
+
+
+def until_cancelled(control):
+    while True:
+        control.step()
+        control.check()
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def workers(tmp_path):
+    # Dos gestores sobre el mismo fichero: como dos workers de gunicorn
+    path = str(tmp_path / 'draw_jobs.json')
+    return DrawJobManager(path, max_workers=2), DrawJobManager(path, max_workers=2)
+
+
+def test_result_and_on_done(workers):
+    a, b = workers
+    saved = []
+    job = a.submit(['x', 'y', 'z'], [], key='g', on_done=saved.append)
+    done = wait_for(b, job['id'])
+    assert done['status'] == 'done' and 'result' not in done
+    assert set(saved[0]) == {'x', 'y', 'z'}
+
+
+def test_other_worker_sees_status_and_the_single_draw_lock(workers):
+    a, b = workers
+    job = a.submit_task(until_cancelled, key='g')
+    wait_for(b, job['id'], statuses=('running',))
+    assert b.active_job('g')['id'] == job['id']
+    with pytest.raises(DrawJobBusy) as exc:
+        b.submit_task(until_cancelled, key='g')
+    assert exc.value.job['id'] == job['id']
+    assert b.active_job('otro') is None
+    a.cancel(job['id'])
+    wait_for(b, job['id'])
+
+
+def test_cancel_from_another_worker(workers):
+    a, b = workers
+    job = a.submit_task(until_cancelled, key='g', public_result=True)
+    wait_for(b, job['id'], statuses=('running',))
+    assert b.cancel(job['id'])['id'] == job['id']
+    done = wait_for(b, job['id'])
+    assert done['status'] == 'cancelled' and done['error'] == 'cancelado'
+    assert b.active_job('g') is None
+    assert b.cancel(job['id']) is None  # ya terminó
+
+
+def test_progress_is_shared(workers):
+    a, b = workers
+    job = a.submit_task(until_cancelled, key='g')
+    time.sleep(draw_jobs.SYNC_INTERVAL * 3)
+    assert b.get(job['id'])['steps'] > 0
+    b.cancel(job['id'])
+    wait_for(a, job['id'])
+
+
+def test_job_of_a_dead_worker_stops_blocking_after_its_deadline(workers, monkeypatch):
+    a, b = workers
+    monkeypatch.setattr(draw_jobs, 'LOST_GRACE', 0.0)
+    # Un trabajo "en marcha" que nadie calcula: su worker cayó
+    a._update(lambda jobs: jobs.update(perdido={
+        "id": 'perdido', "key": 'g', "status": 'running', "error": None, "participants": 3,
+        "single_cycle": False, "public_result": False, "result": None, "deadline_s": 0.1,
+        "created": time.time(), "started": time.time(), "finished": None, "attempts": 0, "steps": 0,
+        "cancel": False}))
+    assert b.active_job('g')['id'] == 'perdido'
+    time.sleep(0.2)
+    assert b.active_job('g') is None
+    assert b.get('perdido')['status'] == 'failed'
+    job = b.submit(['x', 'y', 'z'], [], key='g')
+    assert wait_for(a, job['id'])['status'] == 'done'
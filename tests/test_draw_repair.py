@@ -0,0 +1,111 @@
+import random
+
+import pytest
+
+import draw_engine
+from draw_engine import compute_draw, is_single_cycle, repair_draw
+
+
+def assert_valid(assign, users, forbidden=(), single_cycle=False):
+    assert set(assign) == set(users) and set(assign.values()) == set(users)
+    for g, r in assign.items():
+        assert g != r
+        assert (g, r) not in set(forbidden)
+        assert assign[r] != g, f"2-ciclo {g}<->{r}"
+    if single_cycle:
+        assert is_single_cycle(assign)
+
+
+def cycle(users):
+    return {u: users[(i + 1) % len(users)] for i, u in enumerate(users)}
+
+
+def test_unchanged_draw_needs_nothing():
+    users = list('abcde')
+    result = repair_draw(cycle(users), users, [])
+    assert result['method'] == 'nada' and result['changed'] == []
+
+
+def test_join_is_spliced_touching_one_assignment():
+    users = list('abcdef')
+    draw = cycle(users)
+    result = repair_draw(draw, users + ['nuevo'], [])
+    assert result['method'] == 'empalme'
+    assert result['added'] == ['nuevo']
+    assert len(result['changed']) == 1
+    giver = result['changed'][0]
+    assert result['assignments'][giver] == 'nuevo'
+    assert result['assignments']['nuevo'] == draw[giver]
+    assert_valid(result['assignments'], users + ['nuevo'], single_cycle=True)
+
+
+def test_leave_closes_the_gap():
+    users = list('abcdef')
+    result = repair_draw(cycle(users), [u for u in users if u != 'c'], [])
+    assert result['method'] == 'empalme' and result['removed'] == ['c']
+    assert result['changed'] == ['b'] and result['assignments']['b'] == 'd'
+    assert_valid(result['assignments'], [u for u in users if u != 'c'], single_cycle=True)
+
+
+def test_leave_that_would_create_a_two_cycle_merges_with_another_cycle():
+    # a->b->c->a y d->e->f->g->d: si se va c, cerrar b->a sería un 2-ciclo
+    draw = {'a': 'b', 'b': 'c', 'c': 'a', 'd': 'e', 'e': 'f', 'f': 'g', 'g': 'd'}
+    users = list('abdefg')
+    result = repair_draw(draw, users, [], single_cycle=False)
+    assert result['method'] in ('empalme', 'local')
+    assert len(result['changed']) <= 4
+    assert_valid(result['assignments'], users)
+
+
+def test_forbidden_splice_falls_back_to_local_search():
+    users = list('abcdefgh')
+    forbidden = [('b', 'd')]  # al irse c, cerrar b->d está prohibido
+    result = repair_draw(cycle(users), [u for u in users if u != 'c'], forbidden)
+    assert result['method'] in ('local', 'completo')
+    assert_valid(result['assignments'], [u for u in users if u != 'c'], forbidden, single_cycle=True)
+
+
+def test_full_redraw_is_the_last_resort(monkeypatch):
+    monkeypatch.setattr(draw_engine, '_splice', lambda *a: False)
+    monkeypatch.setattr(draw_engine, '_local_repair', lambda *a: None)
+    users = list('abcdef')
+    result = repair_draw(cycle(users), users + ['g'], [])
+    assert result['method'] == 'completo'
+    assert_valid(result['assignments'], users + ['g'], single_cycle=True)
+
+
+def test_assignments_hitting_a_new_forbidden_pair_are_repaired():
+    users = list('abcdef')
+    result = repair_draw(cycle(users), users, [('a', 'b')])
+    assert result['method'] != 'nada' and 'a' in result['changed']
+    assert_valid(result['assignments'], users, [('a', 'b')], single_cycle=True)
+
+
+def test_exclusions_apply_to_new_edges():
+    users = list('abcdef')
+    exclusions = {'nuevo': set(users) - {'d'}}
+    result = repair_draw(cycle(users), users + ['nuevo'], [], exclusions=exclusions)
+    assert result['assignments']['nuevo'] == 'd'
+    assert_valid(result['assignments'], users + ['nuevo'], single_cycle=True)
+
+
+def test_too_few_participants_has_no_solution():
+    assert repair_draw(cycle(list('abc')), ['a', 'b'], []) is None
+
+
+@pytest.mark.parametrize('single_cycle', [False, True])
+def test_random_joins_and_leaves_stay_valid(single_cycle):
+    rng = random.Random(7)
+    random.seed(7)
+    users = [f"u{i}" for i in range(60)]
+    forbidden = [(rng.choice(users), rng.choice(users)) for _ in range(60)]
+    draw = compute_draw(users, forbidden, single_cycle=single_cycle)
+    for round_ in range(30):
+        now = [u for u in users if u not in rng.sample(users, rng.randint(0, 3))]
+        now += [f"n{round_}_{i}" for i in range(rng.randint(0, 3))]
+        result = repair_draw(draw, now, forbidden)
+        assert result is not None
+        assert_valid(result['assignments'], now, forbidden, single_cycle=single_cycle)
+        if result['method'] == 'empalme':
+            # Cada alta cambia una asignación existente; cada baja, como mucho dos
+            assert len(result['changed']) <= len(result['added']) + 2 * len(result['removed'])
@@ -0,0 +1,49 @@
+import threading, time
+
+import pytest
+
+from draw_engine import DrawCancelled, DrawControl
+from groups import GroupRegistry, draw_groups_parallel
+
+
+@pytest.fixture
+def registry(tmp_path):
+    reg = GroupRegistry(str(tmp_path), backend='json')
+    facil = reg.create('facil')
+    for u in 'abcd':
+        facil.upsert_user({"username": u, "password_hash": ''})
+    # Nadie puede regalar a 'x': con backtracking no acaba nunca
+    duro = reg.create('duro')
+    users = [f"u{i}" for i in range(30)] + ['x']
+    for u in users:
+        duro.upsert_user({"username": u, "password_hash": ''})
+    duro.save_draw({"done": False, "forbidden_pairs": [f"{u}::x" for u in users if u != 'x']})
+    return reg
+
+
+def test_draws_every_group(registry):
+    drawn = []
+    summary = draw_groups_parallel(registry, ['facil'], max_workers=1, on_drawn=drawn.append)
+    assert summary == {'facil': 'hecho'} and drawn == ['facil']
+    assert registry.get('facil').load_draw()['done']
+
+
+def test_deadline_stops_running_children_and_keeps_the_summary(registry):
+    control = DrawControl(deadline=time.monotonic() + 3)
+    t0 = time.monotonic()
+    with pytest.raises(DrawCancelled) as exc:
+        draw_groups_parallel(registry, ['facil', 'duro'], engine='backtracking', max_workers=2, control=control)
+    assert time.monotonic() - t0 < 10
+    assert exc.value.partial == {'facil': 'hecho', 'duro': 'plazo superado'}
+    assert registry.get('facil').load_draw()['done']
+    assert not registry.get('duro').load_draw().get('done')
+
+
+def test_cancel_terminates_running_children(registry):
+    control = DrawControl()
+    threading.Timer(3, control.cancel).start()
+    t0 = time.monotonic()
+    with pytest.raises(DrawCancelled) as exc:
+        draw_groups_parallel(registry, ['duro', 'facil'], engine='backtracking', max_workers=2, control=control)
+    assert time.monotonic() - t0 < 10
+    assert exc.value.partial == {'duro': 'cancelado', 'facil': 'hecho'}
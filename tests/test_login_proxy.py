@@ -0,0 +1,36 @@
+import importlib, os, sys
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # La app lee y crea sus ficheros de datos en el directorio actual
+    monkeypatch.chdir(tmp_path)
+    os.symlink(os.path.join(ROOT, 'soccerWiki.json'), tmp_path / 'soccerWiki.json')
+    monkeypatch.setenv('PROXY_HOPS', '1')
+    monkeypatch.setenv('HASH_PER_IP', '1')
+    sys.modules.pop('app', None)
+    app_module = importlib.import_module('app')
+    app_module.storage.upsert_user({"username": 'ana', "password_hash": generate_password_hash('secreta')})
+    yield app_module, app_module.app.test_client()
+    sys.modules.pop('app', None)
+
+
+def login(client, ip):
+    return client.post('/login', data={"username": 'ana', "password": 'secreta'},
+                       headers={'X-Forwarded-For': ip})
+
+
+def test_per_ip_limit_uses_the_forwarded_client_ip(client):
+    app_module, c = client
+    app_module.hasher._admit('203.0.113.1')  # un hash de esa IP en curso
+    try:
+        assert login(c, '203.0.113.1').status_code == 429
+        assert login(c, '198.51.100.7').status_code == 302
+    finally:
+        app_module.hasher._release('203.0.113.1')
+    assert login(c, '203.0.113.1').status_code == 302
@@ -0,0 +1,76 @@
+import json, os
+
+import pytest
+
+from selection_store import SelectionStore, TeamTakenError
+
+TS = '2026-01-01T00:00:00Z'
+
+
+def _store(tmp_path, **kwargs):
+    return SelectionStore(str(tmp_path / 'selected_teams.json'), journal=True, **kwargs)
+
+
+def test_journal_round_trip(tmp_path):
+    st = _store(tmp_path)
+    st.set('ana', '1', TS)
+    st.set('luis', '2', TS)
+    st.set('ana', '3', TS)  # cambio: libera el 1
+    assert os.path.getsize(tmp_path / 'selected_teams.json.journal') > 0
+
+    fresh = _store(tmp_path)
+    assert fresh.by_user('ana')['equipo_id'] == '3'
+    assert fresh.by_team('1') is None
+    assert fresh.by_team('2')['user'] == 'luis'
+    with pytest.raises(TeamTakenError):
+        fresh.set('pepe', '3', TS)
+
+
+def test_other_instance_sees_appended_claims(tmp_path):
+    a, b = _store(tmp_path), _store(tmp_path)
+    assert b.items() == []
+    a.set('ana', '1', TS)
+    assert b.by_team('1')['user'] == 'ana'
+    with pytest.raises(TeamTakenError):
+        b.set('luis', '1', TS)
+
+
+def test_compaction_moves_journal_into_snapshot(tmp_path):
+    st = _store(tmp_path, compact_bytes=1 << 30)
+    other = _store(tmp_path)
+    for i in range(20):
+        st.set(f"u{i}", str(i), TS)
+    other.items()  # ya ha leído el journal antes de compactar
+    st.compact()
+
+    assert os.path.getsize(tmp_path / 'selected_teams.json.journal') == 0
+    snapshot = json.loads((tmp_path / 'selected_teams.json').read_text())
+    assert {it['user']: it['equipo_id'] for it in snapshot} == {f"u{i}": str(i) for i in range(20)}
+    # Tras la compactación siguen llegando elecciones nuevas, también a otros procesos
+    st.set('nuevo', '99', TS)
+    assert other.by_team('99')['user'] == 'nuevo'
+    assert len(other.items()) == 21
+    assert len(_store(tmp_path).items()) == 21
+
+
+def test_background_compaction_past_threshold(tmp_path):
+    st = _store(tmp_path, compact_bytes=200)
+    for i in range(10):
+        st.set(f"u{i}", str(i), TS)
+    st.compact()  # espera a que termine cualquier compactación en curso
+    assert os.path.getsize(tmp_path / 'selected_teams.json.journal') < 200
+    assert len(_store(tmp_path).items()) == 10
+
+
+def test_torn_journal_line_is_ignored_and_truncated(tmp_path):
+    st = _store(tmp_path)
+    st.set('ana', '1', TS)
+    with open(tmp_path / 'selected_teams.json.journal', 'ab') as f:
+        f.write(b'{"user": "luis", "equipo_id": "2"')  # caída a mitad de línea
+
+    fresh = _store(tmp_path)
+    assert fresh.by_team('2') is None
+    fresh.set('pepe', '3', TS)
+    lines = (tmp_path / 'selected_teams.json.journal').read_bytes().splitlines()
+    assert [json.loads(line)['user'] for line in lines] == ['ana', 'pepe']
+    assert {it['user'] for it in _store(tmp_path).items()} == {'ana', 'pepe'}
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+import draw_engine
+from draw_engine import DrawCancelled, DrawControl, compute_draw, is_single_cycle
+
+
+def no_way_back(n):
+    """Dos mitades sin aristas de la segunda a la primera: nadie cierra el ciclo."""
+    half = n // 2
+    return [(b, a) for b in range(half, n) for a in range(half)]
+
+
+def test_search_fallback_finds_a_valid_cycle(monkeypatch):
+    monkeypatch.setattr(draw_engine, 'SINGLE_CYCLE_REPAIR_ROUNDS', 0)
+    users = [f"u{i}" for i in range(60)]
+    forbidden = [(users[i], users[(i + k) % 60]) for i in range(60) for k in (1, 2, 7)]
+    assign = compute_draw(users, forbidden, single_cycle=True)
+    assert assign is not None and is_single_cycle(assign)
+    assert not set(assign.items()) & set(forbidden)
+
+
+def test_control_deadline_is_enforced_in_repair_and_search():
+    users = [f"u{i}" for i in range(1000)]
+    forbidden = [(users[g], users[r]) for g, r in no_way_back(1000)]
+    control = DrawControl(deadline=time.monotonic() + 0.3)
+    t0 = time.monotonic()
+    with pytest.raises(DrawCancelled):
+        compute_draw(users, forbidden, single_cycle=True, control=control)
+    assert time.monotonic() - t0 < 1.0
+
+
+def test_own_time_budget_gives_up_without_cancelling():
+    users = [f"u{i}" for i in range(200)]
+    forbidden = {users[g]: set() for g in range(200)}
+    for g, r in no_way_back(200):
+        forbidden[users[g]].add(users[r])
+    t0 = time.monotonic()
+    assert draw_engine._single_cycle_assignment(users, forbidden, DrawControl(), time_budget=0.3) is None
+    assert time.monotonic() - t0 < 1.0
@@ -0,0 +1,35 @@
+import json
+
+from storage import JsonStorage, SqliteStorage, migrate_json_to_sqlite
+
+
+def _json_storage(tmp_path, **kwargs):
+    return JsonStorage(str(tmp_path / 'users.json'), str(tmp_path / 'selected_teams.json'),
+                       str(tmp_path / 'draw.json'), **kwargs)
+
+
+def test_migrate_sqlite_keeps_journal_claims(tmp_path, monkeypatch):
+    monkeypatch.delenv('SELECTIONS_JOURNAL', raising=False)
+    st = _json_storage(tmp_path, journal=True)
+    st.save_users([{"username": f"u{i}", "password_hash": "x"} for i in range(5)])
+    for i in range(5):
+        st.set_selection(f"u{i}", str(100 + i), '2026-01-01T00:00:00Z')
+    # Las elecciones siguen solo en el journal: el snapshot está vacío
+    assert json.loads((tmp_path / 'selected_teams.json').read_text()) == []
+
+    db = str(tmp_path / 'santa.db')
+    counts = migrate_json_to_sqlite(db, str(tmp_path / 'users.json'), str(tmp_path / 'selected_teams.json'),
+                                    str(tmp_path / 'draw.json'))
+    assert counts['selections'] == 5
+    assert {it['user']: it['equipo_id'] for it in SqliteStorage(db).selections()} == \
+        {f"u{i}": str(100 + i) for i in range(5)}
+
+
+def test_selection_lookups_return_copies(tmp_path):
+    st = _json_storage(tmp_path)
+    st.set_selection('ana', '7', '2026-01-01T00:00:00Z')
+    st.selection_by_user('ana')['equipo_id'] = '8'
+    st.selection_by_team('7')['user'] = 'otro'
+    assert st.selection_by_user('ana')['equipo_id'] == '7'
+    assert st.selection_by_team('7')['user'] == 'ana'
+    assert st.selection_by_team('8') is None
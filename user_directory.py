@@ -0,0 +1,101 @@
+import os, threading
+
+from fileio import FileLock, atomic_write_json, read_json
+
+
+class UserDirectory:
+    """
+    Caché de users.json indexada por nombre de usuario. El fichero solo se
+    vuelve a leer si cambia su mtime/tamaño/inodo o su generación (p.ej. lo
+    escribió manage_users.py u otro worker); las escrituras propias
+    actualizan la caché al momento. El administrador (primer usuario) queda
+    precalculado. Las escrituras van con el cerrojo entre procesos y releen
+    antes de modificar: no se pierden cambios de otros procesos.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._flock = FileLock(path)
+        self._users: list[dict] = []
+        self._by_name: dict[str, dict] = {}
+        self._admin: str | None = None
+        self._stamp = None
+        self._loaded = False
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino, self._flock.generation()
+
+    def _index(self, users: list[dict]):
+        self._users = [u for u in users if isinstance(u, dict) and u.get('username')]
+        self._by_name = {u['username']: u for u in self._users}
+        self._admin = self._users[0]['username'] if self._users else None
+
+    def _refresh(self):
+        stamp = self._file_stamp()
+        if self._loaded and stamp == self._stamp:
+            return
+        users = []
+        if stamp is not None:
+            try:
+                data = read_json(self.path)
+                users = data if isinstance(data, list) else []
+            except Exception:
+                users = []
+        self._index(users)
+        self._stamp = stamp
+        self._loaded = True
+
+    # --- Lecturas ---
+    def users(self) -> list[dict]:
+        with self._lock:
+            self._refresh()
+            return [dict(u) for u in self._users]
+
+    def usernames(self) -> list[str]:
+        with self._lock:
+            self._refresh()
+            return [u['username'] for u in self._users]
+
+    def get(self, username: str) -> dict | None:
+        with self._lock:
+            self._refresh()
+            u = self._by_name.get(username)
+            return dict(u) if u else None
+
+    def admin(self) -> str | None:
+        with self._lock:
+            self._refresh()
+            return self._admin
+
+    # --- Escrituras ---
+    def replace_all(self, users: list[dict]):
+        with self._lock, self._flock:
+            atomic_write_json(self.path, users)
+            self._flock.bump()
+            self._index([dict(u) for u in users])
+            self._stamp = self._file_stamp()
+            self._loaded = True
+
+    def update(self, fn) -> list[dict]:
+        """Lee, modifica y guarda sin que otro proceso escriba en medio: fn(usuarios) devuelve la lista nueva."""
+        with self._lock, self._flock:
+            self._refresh()
+            users = fn([dict(u) for u in self._users])
+            self.replace_all(users)
+            return users
+
+    def upsert(self, user: dict):
+        def apply(users):
+            for i, u in enumerate(users):
+                if u['username'] == user['username']:
+                    users[i] = dict(user)
+                    break
+            else:
+                users.append(dict(user))
+            return users
+        self.update(apply)